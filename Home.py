@@ -2,8 +2,13 @@
 
 import streamlit as st
 
-from common.tables import StatisticsTables
+from common.workbook_cache import workbook_cache
+from common.instrumentation_panel import InstrumentationPanel
 from common.log_page import LogsPage
+from common.occurrences_page import OccurrencesPage
+from common.precursors_page import PrecursorsPage
+from common.page_dispatcher import PageDispatcher
+from common.precompute import derived_views_precomputer
 from common.log_statistics_page import (
     mA_StatisticsPage,
     kV_StatisticsPage,
@@ -16,52 +21,111 @@ from common.log_statistics_page import (
 
 st.set_page_config(page_title="MaximusLogViewer", layout="wide")
 
+instrumentation_panel = InstrumentationPanel()
+instrumentation_panel.start("Home")
+
 st.write('# MaximusLogViewer')
 
 log_viewer_script_download = r'https://github.com/CarlosOliveiraKonica/MaximusLogViewer/releases/tag/v0.0.6'
-uploaded_file = st.file_uploader(
-    'Selecione o arquivo EXCEL exportado pelo script do MaximusLogViewer. Caso necessário, baixe-o [aqui](%s).' % log_viewer_script_download,
-    type=[".xlsx"],
+raw_logs_mode = st.sidebar.checkbox("Ler os logs brutos do gerador (sem o arquivo EXCEL)", value=False)
+fleet_mode = not raw_logs_mode and st.sidebar.checkbox("Modo frota (comparar vários geradores)", value=False)
+incremental_mode = not raw_logs_mode and not fleet_mode and st.sidebar.checkbox(
+    "Modo incremental (acrescentar somente os logs novos a um conjunto de dados salvo)", value=False
 )
+if incremental_mode:
+    dataset_name = st.sidebar.text_input("Nome do conjunto de dados (ex.: número de série do gerador):")
 
-if uploaded_file:
-    st.write(uploaded_file.name)
-    
-    statistics = StatisticsTables()
-    statistics.set_file(uploaded_file)
+if raw_logs_mode:
+    uploaded_files = st.file_uploader(
+        'Selecione os arquivos de log do gerador, ou um arquivo ZIP com a pasta de logs.',
+        type=[".zip", ".log", ".txt", ".csv"],
+        accept_multiple_files=True,
+    )
+    st.caption(
+        "Formato assumido dos logs brutos: texto delimitado (; , tab ou |) com uma linha de cabeçalho "
+        "cujas colunas têm os nomes das abas de histórico do EXCEL (Falha, Warning, mA, kV, ms, Exposição...)."
+    )
+elif fleet_mode:
+    uploaded_files = st.file_uploader(
+        'Selecione os arquivos EXCEL exportados pelo script do MaximusLogViewer, um por gerador. Caso necessário, baixe-o [aqui](%s).' % log_viewer_script_download,
+        type=[".xlsx"],
+        accept_multiple_files=True,
+    )
+else:
+    uploaded_file = st.file_uploader(
+        'Selecione o arquivo EXCEL exportado pelo script do MaximusLogViewer. Caso necessário, baixe-o [aqui](%s).' % log_viewer_script_download,
+        type=[".xlsx"],
+    )
+    uploaded_files = [uploaded_file] if uploaded_file else []
 
-    statistics_tab, log_analysis_tab = st.tabs(["Estatísticas", "Análise de Logs"])
-    
-    with log_analysis_tab:
-        logs_page = LogsPage(statistics.log_table, uploaded_file)
-        logs_page.show_page()
+if uploaded_files:
+    st.write(", ".join(uploaded_file.name for uploaded_file in uploaded_files))
     
-    with statistics_tab:    
-    
-        mA_tab, kV_tab, ms_tab, failure_tab, warning_tab, exposition_tab = st.tabs(
-            ["mA", "kV", "ms", "Falha", "Warning", "Exposição"]
-        )
-    
-        with mA_tab:
-            mA_page = mA_StatisticsPage(statistics.mA_table, statistics.log_table)
-            mA_page.show_page()
-
-        with kV_tab:
-            kV_page = kV_StatisticsPage(statistics.kV_table, statistics.log_table)
-            kV_page.show_page()
+    if raw_logs_mode:
+        statistics = workbook_cache.get_raw_logs_statistics(uploaded_files)
+    elif fleet_mode:
+        statistics = workbook_cache.get_fleet_statistics(uploaded_files)
+    elif incremental_mode and dataset_name:
+        statistics = workbook_cache.get_dataset_statistics(uploaded_files[0], dataset_name)
+    else:
+        statistics = workbook_cache.get_statistics(uploaded_files[0])
+    derived_views_precomputer.submit(statistics)
 
-        with ms_tab:
-            ms_page = ms_StatisticsPage(statistics.ms_table, statistics.log_table)
-            ms_page.show_page()
+    lazy_rendering = st.sidebar.checkbox("Calcular somente a aba selecionada", value=True)
 
-        with failure_tab:
-            failure_page = Failure_StatisticsPage(statistics.failure_table, statistics.log_table)
-            failure_page.show_page()
+    statistics_dispatcher = PageDispatcher("statistics_page")
+    statistics_dispatcher.add_page(
+        "mA",
+        lambda: mA_StatisticsPage(statistics.mA_table, statistics.log_table).show_page(),
+        key_prefixes=(statistics.mA_table.get_sheet_name(),),
+    )
+    statistics_dispatcher.add_page(
+        "kV",
+        lambda: kV_StatisticsPage(statistics.kV_table, statistics.log_table).show_page(),
+        key_prefixes=(statistics.kV_table.get_sheet_name(),),
+    )
+    statistics_dispatcher.add_page(
+        "ms",
+        lambda: ms_StatisticsPage(statistics.ms_table, statistics.log_table).show_page(),
+        key_prefixes=(statistics.ms_table.get_sheet_name(),),
+    )
+    statistics_dispatcher.add_page(
+        "Falha",
+        lambda: Failure_StatisticsPage(statistics.failure_table, statistics.log_table).show_page(),
+        key_prefixes=(statistics.failure_table.get_sheet_name(),),
+    )
+    statistics_dispatcher.add_page(
+        "Warning",
+        lambda: Warning_StatisticsPage(statistics.warning_table, statistics.log_table).show_page(),
+        key_prefixes=(statistics.warning_table.get_sheet_name(),),
+    )
+    statistics_dispatcher.add_page(
+        "Exposição",
+        lambda: Exposition_StatisticsPage(statistics.exposition_table, statistics.log_table).show_page(),
+        key_prefixes=(statistics.exposition_table.get_sheet_name(),),
+    )
 
-        with warning_tab:
-            warning_page = Warning_StatisticsPage(statistics.warning_table, statistics.log_table)
-            warning_page.show_page()
+    main_dispatcher = PageDispatcher("main_page")
+    main_dispatcher.add_page(
+        "Estatísticas",
+        lambda: statistics_dispatcher.show(lazy_rendering),
+        key_prefixes=statistics_dispatcher.get_key_prefixes(),
+    )
+    main_dispatcher.add_page(
+        "Análise de Logs",
+        lambda: LogsPage(statistics.log_table, statistics.workbook).show_page(),
+        key_prefixes=(LogsPage.KEY_PREFIX,),
+    )
+    main_dispatcher.add_page(
+        "Ocorrências",
+        lambda: OccurrencesPage(statistics.get_occurrences_index(), statistics.log_table).show_page(),
+        key_prefixes=(OccurrencesPage.KEY_PREFIX,),
+    )
+    main_dispatcher.add_page(
+        "Precursores",
+        lambda: PrecursorsPage(statistics).show_page(),
+        key_prefixes=(PrecursorsPage.KEY_PREFIX,),
+    )
+    main_dispatcher.show(lazy_rendering)
 
-        with exposition_tab:
-            exposition_page = Exposition_StatisticsPage(statistics.exposition_table, statistics.log_table)
-            exposition_page.show_page()
+instrumentation_panel.show()
@@ -0,0 +1,194 @@
+"""File useful to measure, without a browser, the time and memory spent by the app on a synthetic export.
+
+Usage, from the root of the project:
+    python -m benchmarks.run_benchmarks --label my_change
+    python -m benchmarks.run_benchmarks --label my_change --compare benchmarks/results/baseline.json
+
+Streamlit is used "bare" (not through 'streamlit run'), so the widgets return their
+default values and nothing is drawn, while all the data processing of the pages runs.
+The stages are the ones recorded by the instrumentation of the app (see 'common/instrumentation.py').
+"""
+
+import argparse
+import datetime
+import io
+import json
+import logging
+import os
+import platform
+import statistics as statistics_module
+import subprocess
+
+from benchmarks.synthetic_export import SyntheticExport
+from common.instrumentation import stage_tracer
+from common.log_page import LogsPage
+from common.log_statistics_page import (
+    mA_StatisticsPage,
+    kV_StatisticsPage,
+    ms_StatisticsPage,
+    Failure_StatisticsPage,
+    Warning_StatisticsPage,
+    Exposition_StatisticsPage,
+)
+from common.tables import StatisticsTables
+
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+STATISTICS_PAGES = [
+    (mA_StatisticsPage, "mA_table"),
+    (kV_StatisticsPage, "kV_table"),
+    (ms_StatisticsPage, "ms_table"),
+    (Failure_StatisticsPage, "failure_table"),
+    (Warning_StatisticsPage, "warning_table"),
+    (Exposition_StatisticsPage, "exposition_table"),
+]
+
+
+def get_results(traces: list) -> list:
+    """Summarize the stages of 'traces', one trace per repetition.
+
+    A stage run many times in the same repetition is numbered ('#2', '#3', ...) in the order it ran.
+    """
+    stages_measures = {}
+    for trace in traces:
+        occurrences = {}
+        for stage in trace["stages"]:
+            occurrences[stage["stage"]] = occurrences.get(stage["stage"], 0) + 1
+            stage_name = stage["stage"]
+            if occurrences[stage["stage"]] > 1:
+                stage_name += " #{}".format(occurrences[stage["stage"]])
+            stages_measures.setdefault(stage_name, []).append(stage)
+
+    results = []
+    for stage_name, measures in stages_measures.items():
+        seconds = statistics_module.median(measure["seconds"] for measure in measures)
+        rows = measures[0]["rows"] or 0
+        results.append({
+            "stage": stage_name,
+            "repetitions": len(measures),
+            "median_seconds": seconds,
+            "min_seconds": min(measure["seconds"] for measure in measures),
+            "peak_memory_bytes": max(measure["peak_bytes"] for measure in measures),
+            "rows": rows,
+            "rows_per_second": rows / seconds if seconds > 0 else None,
+        })
+    return results
+
+
+def run_benchmarks(synthetic_export: SyntheticExport, repetitions: int) -> list:
+    xlsx_bytes = io.BytesIO()
+    synthetic_export.write(xlsx_bytes)
+
+    traces = []
+    for _ in range(repetitions):
+        stage_tracer.start_trace("benchmarks", trace_memory=True)
+        try:
+            # A new workbook per repetition, so nothing is reused from the previous one
+            statistics = StatisticsTables()
+            with stage_tracer.stage("StatisticsTables.set_file"):
+                statistics.set_file(io.BytesIO(xlsx_bytes.getvalue()))
+
+            for page_class, table_name in STATISTICS_PAGES:
+                page_class(getattr(statistics, table_name), statistics.log_table).show_page()
+
+            logs_page = LogsPage(statistics.log_table, statistics.workbook)
+            logs_page.show_log_filter()
+            logs_page.special_filter_selection = "Nenhum"
+            log_history = logs_page.log_table_selected
+            logs_page.show_filtered_log_dataframe()
+            failure_codes = log_history.get_column_view("Falha").dropna().unique()
+            if len(failure_codes):
+                logs_page.special_filter_selection = "Falha"
+                logs_page.special_filter_sub_selection = failure_codes[0]
+                logs_page.number_of_back_lines = 5
+                logs_page.number_of_forward_lines = 5
+                with stage_tracer.stage("LogsPage[Falha]"):
+                    logs_page.show_filtered_log_dataframe()
+                logs_page.streaming_mode = True
+                with stage_tracer.stage("LogsPage[Falha, blocos]"):
+                    logs_page.show_filtered_log_dataframe()
+        finally:
+            traces.append(stage_tracer.stop_trace())
+
+    return get_results(traces)
+
+
+def get_version() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def print_results(results: list, base_results: list = None) -> None:
+    base_seconds = {result["stage"]: result.get("median_seconds") for result in base_results or []}
+    print("{:<62} {:>10} {:>12} {:>14} {:>9}".format("Etapa", "Tempo (s)", "Memória (MB)", "Linhas/s", "Relação"))
+    for result in results:
+        if "median_seconds" not in result:
+            continue
+        ratio = ""
+        if base_seconds.get(result["stage"]):
+            ratio = "{:.2f}x".format(result["median_seconds"] / base_seconds[result["stage"]])
+        print("{:<62} {:>10.4f} {:>12.1f} {:>14} {:>9}".format(
+            result["stage"],
+            result["median_seconds"],
+            result["peak_memory_bytes"] / 1024 ** 2,
+            "{:.0f}".format(result["rows_per_second"]) if result["rows_per_second"] else "",
+            ratio,
+        ))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks of the MaximusLogViewer front end on a synthetic export.")
+    parser.add_argument("--logs", type=int, default=10, help="number of logs")
+    parser.add_argument("--failure-codes", type=int, default=50, help="number of distinct Falha codes")
+    parser.add_argument("--warning-codes", type=int, default=30, help="number of distinct Warning codes")
+    parser.add_argument("--exposure-rows", type=int, default=2000, help="number of distinct exposure settings")
+    parser.add_argument("--history-length", type=int, default=20000, help="number of lines of each log history")
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", default=None, help="name of the results file (default: date and version)")
+    parser.add_argument("--compare", default=None, help="results file to compare with")
+    arguments = parser.parse_args()
+
+    # Streamlit warns about every widget used out of 'streamlit run'
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    synthetic_export = SyntheticExport(
+        arguments.logs, arguments.failure_codes, arguments.warning_codes, arguments.exposure_rows,
+        arguments.history_length, arguments.seed,
+    )
+    results = run_benchmarks(synthetic_export, arguments.repetitions)
+
+    version = get_version()
+    report = {
+        "version": version,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": dict(synthetic_export.get_parameters(), repetitions=arguments.repetitions, seed=arguments.seed),
+        "results": results,
+    }
+    os.makedirs(RESULTS_DIRECTORY, exist_ok=True)
+    label = arguments.label or "{}_{}".format(datetime.datetime.now().strftime("%Y%m%d_%H%M%S"), version or "local")
+    results_file = os.path.join(RESULTS_DIRECTORY, label + ".json")
+    with open(results_file, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=2, ensure_ascii=False)
+
+    base_results = None
+    if arguments.compare:
+        with open(arguments.compare, "r", encoding="utf-8") as base_file:
+            base_report = json.load(base_file)
+        if base_report.get("parameters") != report["parameters"]:
+            print("Atenção: os parâmetros diferem dos de {}".format(arguments.compare))
+        base_results = base_report["results"]
+    print_results(results, base_results)
+    print("Resultados salvos em {}".format(results_file))
+
+
+if __name__ == "__main__":
+    main()
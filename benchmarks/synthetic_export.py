@@ -0,0 +1,119 @@
+"""File useful to create synthetic workbooks with the layout of the MaximusLogViewer exports."""
+
+import numpy as np
+import pandas as pd
+
+from common.tables import LogLegendTable, StatisticsTables
+
+
+class SyntheticExport:
+    """Random export of 'number_of_logs' logs, with the same sheets of a MaximusLogViewer export.
+
+    The legend is the first sheet, followed by the history sheet of every log (so the
+    history of the log of index 'i' is the sheet of position 'i'), and then the statistics
+    sheets. The statistics sheets are the counts of the values of the histories.
+    """
+
+    MA_VALUES = [10, 50, 100, 125, 160, 220, 280, 320, 360, 400, 450, 500, 630, 800]
+    KV_VALUES = [40.0, 50.0, 60.0, 70.0, 81.0, 90.0, 102.0, 109.0, 125.0, 133.0, 150.0]
+    MS_VALUES = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+    INDUCTORS = ["A", "B"]
+
+    def __init__(
+        self,
+        number_of_logs: int = 10,
+        number_of_failure_codes: int = 50,
+        number_of_warning_codes: int = 30,
+        number_of_exposure_rows: int = 2000,
+        history_length: int = 20000,
+        seed: int = 0,
+    ) -> None:
+        self._number_of_logs = number_of_logs
+        self._number_of_failure_codes = number_of_failure_codes
+        self._number_of_warning_codes = number_of_warning_codes
+        self._number_of_exposure_rows = number_of_exposure_rows
+        self._history_length = history_length
+        self._random = np.random.default_rng(seed)
+
+    def get_parameters(self) -> dict:
+        return {
+            "number_of_logs": self._number_of_logs,
+            "number_of_failure_codes": self._number_of_failure_codes,
+            "number_of_warning_codes": self._number_of_warning_codes,
+            "number_of_exposure_rows": self._number_of_exposure_rows,
+            "history_length": self._history_length,
+        }
+
+    def get_sheets(self) -> dict:
+        """Return the sheets of the export (sheet name -> DataFrame), in the order of the workbook."""
+        statistics = StatisticsTables()
+        logs_indexes = list(range(1, self._number_of_logs + 1))
+        exposures = self.__get_exposures()
+        histories = {log_index: self.__get_history(exposures) for log_index in logs_indexes}
+
+        sheets = {statistics.log_table.get_sheet_name(): pd.DataFrame({
+            LogLegendTable.COLUMN_INDEXES: logs_indexes,
+            LogLegendTable.COLUMN_FILES: ["Log_{:04d}.txt".format(log_index) for log_index in logs_indexes],
+        })}
+        for log_index in logs_indexes:
+            sheets[str(log_index)] = histories[log_index]
+        for table in statistics.get_tables()[1:]:
+            sheets[table.get_sheet_name()] = SyntheticExport.__get_statistics_sheet(table, histories)
+        return sheets
+
+    def write(self, xlsx_file) -> None:
+        with pd.ExcelWriter(xlsx_file) as writer:
+            for sheet_name, dataframe in self.get_sheets().items():
+                dataframe.to_excel(writer, sheet_name=sheet_name, index=False)
+
+    def __get_exposures(self) -> pd.DataFrame:
+        """Distinct exposure settings, the values of the 'Exposição' sheet."""
+        number_of_rows = self._number_of_exposure_rows
+        exposures = pd.DataFrame({
+            "Exposição": np.arange(1, number_of_rows + 1),
+            "mA": self._random.choice(SyntheticExport.MA_VALUES, number_of_rows),
+            "kV": self._random.choice(SyntheticExport.KV_VALUES, number_of_rows),
+            "ms": self._random.choice(SyntheticExport.MS_VALUES, number_of_rows),
+        })
+        exposures["mAs"] = exposures["mA"] * exposures["ms"] / 1000
+        exposures["kW"] = np.round(exposures["mA"] * exposures["kV"] / 1000, 3)
+        exposures["kJ"] = np.round(exposures["kW"] * exposures["ms"] / 1000, 3)
+        exposures["Ganho mA"] = self._random.choice([1, 2], number_of_rows)
+        exposures["Indutor"] = self._random.choice(SyntheticExport.INDUCTORS, number_of_rows)
+        return exposures
+
+    def __get_history(self, exposures: pd.DataFrame) -> pd.DataFrame:
+        history_length = self._history_length
+        history = exposures.iloc[self._random.integers(0, len(exposures), history_length)].reset_index(drop=True)
+        history.insert(0, "Data", pd.Timestamp("2023-01-01") + pd.to_timedelta(
+            np.cumsum(self._random.integers(1, 600, history_length)), unit="s"
+        ))
+        history["Falha"] = SyntheticExport.__get_codes(self._random, "F", self._number_of_failure_codes, history_length, 0.02)
+        history["Warning"] = SyntheticExport.__get_codes(self._random, "W", self._number_of_warning_codes, history_length, 0.05)
+        return history
+
+    @staticmethod
+    def __get_codes(random: np.random.Generator, prefix: str, number_of_codes: int, length: int, probability: float) -> np.ndarray:
+        codes = np.array(["{}{:03d}".format(prefix, code) for code in range(1, number_of_codes + 1)], dtype=object)
+        values = np.full(length, None, dtype=object)
+        events_mask = random.random(length) < probability
+        values[events_mask] = random.choice(codes, int(events_mask.sum()))
+        return values
+
+    @staticmethod
+    def __get_statistics_sheet(table, histories: dict) -> pd.DataFrame:
+        main_columns = [table.get_key_column()] + table.get_sub_key_columns()
+        total_column = table.get_total_column()
+        logs_counts = {}
+        for log_index, history in histories.items():
+            history = history[history[table.get_key_column()].notna()]
+            if table.get_sheet_name() in ["Falha", "Warning"]:
+                history = history.assign(**{main_columns[1]: "Descrição de " + history[table.get_key_column()]})
+            logs_counts[log_index] = history.groupby(main_columns).size()
+        dataframe = pd.concat(logs_counts, axis="columns").fillna(0).astype(np.int64).reset_index()
+        dataframe.columns = main_columns + list(histories.keys())
+        dataframe[total_column] = dataframe[list(histories.keys())].sum(axis="columns")
+
+        total_line = {column: dataframe[column].sum() for column in list(histories.keys()) + [total_column]}
+        total_line[table.get_key_column()] = total_column
+        return pd.concat([dataframe, pd.DataFrame([total_line])], ignore_index=True)
@@ -0,0 +1,83 @@
+"""File useful to answer filters over one column without scanning it again."""
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnValueIndex:
+    """Sorted distinct values of one column and the row positions of each of them.
+
+    NaN values are not indexed. When the values can not be sorted (e.g. numbers
+    mixed with texts) they are kept in order of first appearance.
+    """
+
+    def __init__(self, column_values: pd.Series) -> None:
+        codes, uniques = pd.factorize(column_values, sort=False)
+        uniques = list(uniques)
+        try:
+            sorted_uniques_order = sorted(range(len(uniques)), key=lambda position: uniques[position])
+        except TypeError:
+            sorted_uniques_order = list(range(len(uniques)))
+
+        # Renumber the codes so they follow the sorted values order
+        new_codes = np.empty(len(uniques), dtype=np.int64)
+        new_codes[sorted_uniques_order] = np.arange(len(uniques))
+        self._codes = np.where(codes >= 0, new_codes[codes], -1) if len(uniques) else codes.astype(np.int64)
+        self._values = [uniques[position] for position in sorted_uniques_order]
+        self._codes_by_value = {value: code for code, value in enumerate(self._values)}
+
+        # Row positions grouped by code: positions of 'code' are '_positions[_starts[code]:_starts[code+1]]'
+        valid_positions = np.flatnonzero(self._codes >= 0)
+        valid_codes = self._codes[valid_positions]
+        self._positions = valid_positions[np.argsort(valid_codes, kind="stable")]
+        self._starts = np.searchsorted(np.sort(valid_codes), np.arange(len(self._values) + 1))
+        self._number_of_rows = len(self._codes)
+
+        # Numeric values sorted apart, so ranges are found by binary search even in mixed columns
+        numeric_codes = [
+            code for code, value in enumerate(self._values)
+            if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+        ]
+        numeric_values = np.array([self._values[code] for code in numeric_codes], dtype=np.float64)
+        numeric_order = np.argsort(numeric_values, kind="stable")
+        self._numeric_values = numeric_values[numeric_order]
+        self._numeric_codes = np.array(numeric_codes, dtype=np.int64)[numeric_order]
+        self._numeric_values_are_integers = bool(np.all(self._numeric_values == np.round(self._numeric_values)))
+
+    def get_values(self) -> list:
+        return self._values.copy()
+
+    def get_numeric_range(self) -> tuple:
+        """Return the smallest and the largest numeric values, or None if there are no numeric values."""
+        if len(self._numeric_values) == 0:
+            return None
+        return self._numeric_values[0].item(), self._numeric_values[-1].item()
+
+    def numeric_values_are_integers(self) -> bool:
+        return self._numeric_values_are_integers
+
+    def get_values_in_range(self, min_value: float, max_value: float) -> list:
+        """Return, in ascending order, the numeric values between 'min_value' and 'max_value' (both included)."""
+        first_position = np.searchsorted(self._numeric_values, min_value, side="left")
+        last_position = np.searchsorted(self._numeric_values, max_value, side="right")
+        return [self._values[code] for code in self._numeric_codes[first_position:last_position]]
+
+    def get_codes(self, values: list) -> np.ndarray:
+        return np.array(
+            [self._codes_by_value[value] for value in values if value in self._codes_by_value], dtype=np.int64
+        )
+
+    def get_row_positions(self, values: list) -> np.ndarray:
+        """Return, in ascending order, the positions of the rows holding any of 'values'."""
+        positions_list = [
+            self._positions[self._starts[code]:self._starts[code + 1]] for code in self.get_codes(values)
+        ]
+        if not positions_list:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(positions_list))
+
+    def get_rows_mask(self, values: list) -> np.ndarray:
+        """Return a boolean array, one item per row, telling which rows hold any of 'values'."""
+        rows_mask = np.zeros(self._number_of_rows, dtype=bool)
+        rows_mask[self.get_row_positions(values)] = True
+        return rows_mask
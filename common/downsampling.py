@@ -0,0 +1,47 @@
+"""File useful to plot long series without sending all their points to the browser."""
+
+import numpy as np
+
+
+class LTTBDownsampler:
+    """Largest-Triangle-Three-Buckets downsampling of a line to at most 'number_of_points' points.
+
+    The first and the last points are kept, and the points between them are split in
+    buckets of the same size. From each bucket the point kept is the one forming the
+    largest triangle with the point kept from the previous bucket and the mean of the
+    next bucket, so the peaks and the shape of the line are preserved.
+    """
+
+    DEFAULT_NUMBER_OF_POINTS = 2000
+
+    def __init__(self, number_of_points: int = DEFAULT_NUMBER_OF_POINTS) -> None:
+        self._number_of_points = max(number_of_points, 3)
+
+    def get_positions(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Return the ascending positions of the points of ('x', 'y') to be plotted. 'x' must be ascending."""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        number_of_points = len(x)
+        if number_of_points <= self._number_of_points:
+            return np.arange(number_of_points)
+
+        # 'number_of_buckets' buckets between the first and the last points
+        number_of_buckets = self._number_of_points - 2
+        edges = np.linspace(1, number_of_points - 1, number_of_buckets + 1).astype(np.int64)
+        next_edges = np.append(edges[2:], number_of_points)
+        positions = np.empty(self._number_of_points, dtype=np.int64)
+        positions[0] = 0
+        positions[-1] = number_of_points - 1
+        previous_position = 0
+        for bucket in range(number_of_buckets):
+            start, stop = edges[bucket], edges[bucket + 1]
+            next_start, next_stop = edges[bucket + 1], next_edges[bucket]
+            next_mean_x = x[next_start:next_stop].mean()
+            next_mean_y = y[next_start:next_stop].mean()
+            areas = np.abs(
+                (x[previous_position] - next_mean_x) * (y[start:stop] - y[previous_position])
+                - (x[previous_position] - x[start:stop]) * (next_mean_y - y[previous_position])
+            )
+            previous_position = start + int(np.argmax(areas))
+            positions[bucket + 1] = previous_position
+        return positions
@@ -0,0 +1,112 @@
+"""File useful to follow the Falha and Warning counts of one log along the time."""
+
+import numpy as np
+import pandas as pd
+
+from common.downsampling import LTTBDownsampler
+from common.memory_usage import get_memory_usage
+
+
+class EventsRateSeries:
+    """Falha and Warning lines of one log history counted per time bucket (an hour or a day).
+
+    The history is read chunk by chunk (a single chunk when it is already in memory),
+    and the lines of each chunk are bucketed at once by their timestamp. Buckets with
+    no line are kept with a zero count, so the series is continuous. Lines without a
+    valid timestamp are not counted.
+    """
+
+    EVENTS_COLUMNS = ["Falha", "Warning"]
+    BUCKETS_SECONDS = {"Hora": 3600, "Dia": 86400}
+    TIMESTAMP_COLUMNS_NAMES = ["Data", "Data/Hora", "Data e Hora", "Timestamp", "Date", "Datetime", "Hora", "Time"]
+    MIN_VALID_TIMESTAMPS_RATIO = 0.9
+
+    def __init__(self, chunks, bucket_seconds: int) -> None:
+        """'chunks' are consecutive DataFrames of the history."""
+        self._bucket_seconds = bucket_seconds
+        self._timestamp_column = None
+        self._downsampled = {}
+        chunks_counts = []
+        for chunk in chunks:
+            if self._timestamp_column is None:
+                self._timestamp_column = EventsRateSeries.get_timestamp_column(chunk)
+                if self._timestamp_column is None:
+                    break
+            chunks_counts.append(self.__get_chunk_counts(chunk))
+
+        if not chunks_counts:
+            chunks_counts = [pd.DataFrame(
+                {column: np.zeros(0) for column in EventsRateSeries.EVENTS_COLUMNS}, index=np.zeros(0, dtype=np.int64)
+            )]
+        counts = pd.concat(chunks_counts)
+        counts = counts.groupby(level=0).sum()
+        if len(counts):
+            counts = counts.reindex(np.arange(counts.index.min(), counts.index.max() + 1), fill_value=0)
+        self._bucket_starts = pd.to_datetime(counts.index.to_numpy(dtype=np.int64) * bucket_seconds, unit="s")
+        self._counts = {column: counts[column].to_numpy(dtype=np.int64) for column in EventsRateSeries.EVENTS_COLUMNS}
+
+    @staticmethod
+    def get_timestamp_column(dataframe: pd.DataFrame):
+        """Return the column of 'dataframe' holding the timestamps of the lines (None if not found).
+
+        Date-time columns come first, then the text columns with a usual name, then any text
+        column, as long as most of its values are timestamps.
+        """
+        for column in dataframe.columns:
+            if pd.api.types.is_datetime64_any_dtype(dataframe[column].dtype):
+                return column
+        text_columns = [
+            column for column in dataframe.columns
+            if column not in EventsRateSeries.EVENTS_COLUMNS and dataframe[column].dtype == object
+        ]
+        text_columns.sort(key=lambda column: column not in EventsRateSeries.TIMESTAMP_COLUMNS_NAMES)
+        for column in text_columns:
+            sample = dataframe[column].dropna().head(100)
+            if len(sample) == 0:
+                continue
+            valid_timestamps = EventsRateSeries.__to_timestamps(sample).notna().sum()
+            if valid_timestamps >= EventsRateSeries.MIN_VALID_TIMESTAMPS_RATIO * len(sample):
+                return column
+        return None
+
+    def get_timestamp_column_name(self):
+        return self._timestamp_column
+
+    def get_memory_usage(self) -> int:
+        return get_memory_usage([self._bucket_starts, self._counts, self._downsampled])
+
+    def get_bucket_starts(self) -> pd.DatetimeIndex:
+        return self._bucket_starts
+
+    def get_counts(self, column: str) -> np.ndarray:
+        return self._counts[column]
+
+    def get_downsampled(self, column: str, number_of_points: int = LTTBDownsampler.DEFAULT_NUMBER_OF_POINTS) -> tuple:
+        """Return the bucket starts and the counts of 'column' reduced to at most 'number_of_points' points."""
+        key = (column, number_of_points)
+        if key not in self._downsampled:
+            counts = self._counts[column]
+            positions = LTTBDownsampler(number_of_points).get_positions(np.arange(len(counts)), counts)
+            self._downsampled[key] = (self._bucket_starts[positions], counts[positions])
+        return self._downsampled[key]
+
+    def __get_chunk_counts(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        timestamps = EventsRateSeries.__to_timestamps(chunk[self._timestamp_column])
+        valid_mask = timestamps.notna().to_numpy()
+        buckets = timestamps.to_numpy(dtype="datetime64[ns]")[valid_mask].astype(np.int64) // (self._bucket_seconds * 10 ** 9)
+        unique_buckets, buckets_positions = np.unique(buckets, return_inverse=True)
+        chunk_counts = {}
+        for column in EventsRateSeries.EVENTS_COLUMNS:
+            if column in chunk.columns:
+                column_values = chunk[column]
+                events_mask = (column_values.notna() & ~column_values.isin(["", " "])).to_numpy(dtype=bool)[valid_mask]
+                chunk_counts[column] = np.bincount(buckets_positions, weights=events_mask, minlength=len(unique_buckets))
+            else:
+                chunk_counts[column] = np.zeros(len(unique_buckets))
+        return pd.DataFrame(chunk_counts, index=unique_buckets)
+
+    @staticmethod
+    def __to_timestamps(column_values: pd.Series) -> pd.Series:
+        if pd.api.types.is_datetime64_any_dtype(column_values.dtype):
+            return column_values
+        return pd.to_datetime(column_values, errors="coerce", dayfirst=True)
@@ -2,22 +2,64 @@
 
 import pandas as pd
 
+from common.instrumentation import stage_tracer
+from common.workbook import Workbook
+
 
 class ExcelReader:
     def __init__(self, sheet_name: str) -> None:
         self._xlsx_file = ""
         self._sheet_name = sheet_name
-        self._dataframe = pd.DataFrame()
+        self._workbook = None
 
+    @stage_tracer.traced()
     def set_file(self, xlsx_file: str) -> None:
-        self._xlsx_file = xlsx_file
-        self._dataframe = pd.read_excel(
-            self._xlsx_file,
-            sheet_name=self._sheet_name
-        )
+        self.set_workbook(Workbook(xlsx_file))
+
+    def set_workbook(self, workbook: Workbook) -> None:
+        self._xlsx_file = workbook.get_file()
+        self._workbook = workbook
+
+    def get_dataframe(self, columns: list = None) -> pd.DataFrame:
+        """Return a copy of the sheet, restricted to 'columns' (all of them if omitted)."""
+        if self._workbook is None:
+            return pd.DataFrame()
+        if columns is None:
+            return self._workbook.get_sheet(self._sheet_name).copy()
+        return self._workbook.get_sheet(self._sheet_name, columns)
+
+    def get_dataframe_view(self, columns: list = None, rows_mask: pd.Series = None) -> pd.DataFrame:
+        """Return the sheet restricted to 'columns' and 'rows_mask', without intermediate copies.
 
-    def get_dataframe(self) -> pd.DataFrame:
-        return self._dataframe.copy()
+        When nothing is restricted, the DataFrame shared by every table of the
+        workbook is returned, so it must not be modified.
+        """
+        if self._workbook is None:
+            return pd.DataFrame()
+        return self._workbook.get_sheet(self._sheet_name, columns, rows_mask)
+
+    def get_column_view(self, column) -> pd.Series:
+        """Return one column of the sheet without copying it. It must not be modified."""
+        if self._workbook is None:
+            return pd.Series(dtype=object, name=column)
+        return self._workbook.get_column(self._sheet_name, column)
+
+    def get_columns(self) -> list:
+        if self._workbook is None:
+            return []
+        return self._workbook.get_columns(self._sheet_name)
 
     def get_sheet_name(self) -> str:
         return self._sheet_name
+
+    def get_derived_view(self, key, builder):
+        """Return the value computed by 'builder()' for 'key', computing it only once per sheet of the workbook."""
+        if self._workbook is None:
+            return builder()
+        return self._workbook.get_derived_view((self._sheet_name, key), builder)
+
+    def get_state_view(self, key, builder):
+        """Return the value computed by 'builder()' for 'key', a state of the filters of the sheet (see 'Workbook.get_state_view')."""
+        if self._workbook is None:
+            return builder()
+        return self._workbook.get_state_view((self._sheet_name, key), builder)
@@ -0,0 +1,51 @@
+"""File useful to answer the X/Y aggregations of the expositions without grouping again."""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from common.memory_usage import get_memory_usage
+
+
+class ExposurePivotCube:
+    """Counts of every log summed over each pair of exposure dimensions.
+
+    All the pairs are aggregated at once when the cube is built, so changing the
+    chart axes or the data source is a lookup. Each log column is kept separate.
+    Rows with a missing value in any of the two dimensions of a pair are not counted in it.
+    """
+
+    def __init__(self, dataframe: pd.DataFrame, dimensions: list, logs_columns: list) -> None:
+        self._dimensions = list(dimensions)
+        self._logs_columns = list(logs_columns)
+        logs_counts = dataframe[self._logs_columns].apply(pd.to_numeric, errors="coerce").fillna(0)
+        dimensions_values = {
+            dimension: pd.to_numeric(dataframe[dimension], errors="coerce") if dimension in dataframe.columns
+            else pd.Series(np.nan, index=dataframe.index)
+            for dimension in self._dimensions
+        }
+        self._pairs = {}
+        for x_dimension, y_dimension in itertools.combinations(self._dimensions, 2):
+            pair_dataframe = pd.concat(
+                [dimensions_values[x_dimension].rename(x_dimension), dimensions_values[y_dimension].rename(y_dimension), logs_counts],
+                axis="columns",
+            )
+            self._pairs[(x_dimension, y_dimension)] = pair_dataframe.groupby(
+                [x_dimension, y_dimension], dropna=True, sort=True, as_index=False
+            )[self._logs_columns].sum()
+
+    def get_memory_usage(self) -> int:
+        return get_memory_usage(self._pairs)
+
+    def get_dimensions(self) -> list:
+        return self._dimensions.copy()
+
+    def get_logs_columns(self) -> list:
+        return self._logs_columns.copy()
+
+    def get_pair(self, x_dimension: str, y_dimension: str) -> pd.DataFrame:
+        """Return the counts of every log per distinct ('x_dimension', 'y_dimension') values. It must not be modified."""
+        if (x_dimension, y_dimension) in self._pairs:
+            return self._pairs[(x_dimension, y_dimension)]
+        return self._pairs[(y_dimension, x_dimension)]
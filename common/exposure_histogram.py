@@ -0,0 +1,75 @@
+"""File useful to count the expositions in a grid of X/Y bins."""
+
+import numpy as np
+
+from common.memory_usage import get_memory_usage
+
+
+class ExposureHistogram:
+    """2D histogram of the counts of one log over two exposure columns.
+
+    Every axis is split in bins of fixed width, centered on its minimum value. A bin
+    width of zero (or less) means the smallest gap between the distinct values of the axis.
+    When the grid would have more than 'max_cells' cells, both bin widths are
+    enlarged by the same factor, so the size of the chart sent to the browser is bounded.
+    """
+
+    DEFAULT_MAX_CELLS = 10000
+
+    def __init__(
+        self, x_values, y_values, counts, x_bin_width: float = 0, y_bin_width: float = 0,
+        max_cells: int = DEFAULT_MAX_CELLS,
+    ) -> None:
+        x_values = np.asarray(x_values, dtype=np.float64)
+        y_values = np.asarray(y_values, dtype=np.float64)
+        counts = np.asarray(counts, dtype=np.float64)
+        valid_mask = ~(np.isnan(x_values) | np.isnan(y_values) | np.isnan(counts))
+        x_values, y_values, counts = x_values[valid_mask], y_values[valid_mask], counts[valid_mask]
+
+        self._x_bin_width = x_bin_width if x_bin_width > 0 else ExposureHistogram.__get_smallest_gap(x_values)
+        self._y_bin_width = y_bin_width if y_bin_width > 0 else ExposureHistogram.__get_smallest_gap(y_values)
+        self._x_origin = x_values.min() - self._x_bin_width / 2 if len(x_values) else 0.0
+        self._y_origin = y_values.min() - self._y_bin_width / 2 if len(y_values) else 0.0
+
+        x_codes, y_codes = self.__get_codes(x_values, y_values)
+        while len(counts) and (x_codes.max() + 1) * (y_codes.max() + 1) > max_cells:
+            enlarge_factor = np.sqrt((x_codes.max() + 1) * (y_codes.max() + 1) / max_cells)
+            self._x_bin_width *= enlarge_factor
+            self._y_bin_width *= enlarge_factor
+            self._x_origin = x_values.min() - self._x_bin_width / 2
+            self._y_origin = y_values.min() - self._y_bin_width / 2
+            x_codes, y_codes = self.__get_codes(x_values, y_values)
+
+        self._number_of_x_bins = int(x_codes.max()) + 1 if len(counts) else 0
+        self._number_of_y_bins = int(y_codes.max()) + 1 if len(counts) else 0
+        number_of_cells = self._number_of_x_bins * self._number_of_y_bins
+        cells = y_codes * self._number_of_x_bins + x_codes
+        shape = (self._number_of_y_bins, self._number_of_x_bins)
+        self._counts = np.bincount(cells, weights=counts, minlength=number_of_cells).reshape(shape)
+        self._filled_cells_mask = np.bincount(cells, minlength=number_of_cells).reshape(shape) > 0
+
+    def get_memory_usage(self) -> int:
+        return get_memory_usage([self._counts, self._filled_cells_mask])
+
+    def get_bin_widths(self) -> tuple:
+        return self._x_bin_width, self._y_bin_width
+
+    def get_x_centers(self) -> np.ndarray:
+        return self._x_origin + (np.arange(self._number_of_x_bins) + 0.5) * self._x_bin_width
+
+    def get_y_centers(self) -> np.ndarray:
+        return self._y_origin + (np.arange(self._number_of_y_bins) + 0.5) * self._y_bin_width
+
+    def get_counts(self, empty_value: float = np.nan) -> np.ndarray:
+        """Return the counts as a (Y bins, X bins) array, with 'empty_value' in the bins without expositions."""
+        return np.where(self._filled_cells_mask, self._counts, empty_value)
+
+    def __get_codes(self, x_values: np.ndarray, y_values: np.ndarray) -> tuple:
+        x_codes = np.floor((x_values - self._x_origin) / self._x_bin_width).astype(np.int64)
+        y_codes = np.floor((y_values - self._y_origin) / self._y_bin_width).astype(np.int64)
+        return x_codes, y_codes
+
+    @staticmethod
+    def __get_smallest_gap(values: np.ndarray) -> float:
+        gaps = np.diff(np.unique(values))
+        return float(gaps.min()) if len(gaps) else 1.0
@@ -0,0 +1,188 @@
+"""File useful to analyze the exports of many Maximus generators together."""
+
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from common.sidecar import SidecarStore
+from common.tables import LogLegendTable, StatisticsTables
+from common.upload_spool import UploadSpool
+from common.workbook import Workbook
+
+
+def read_sheets(xlsx_file, sheet_names: list) -> dict:
+    """Parse 'sheet_names' of 'xlsx_file' in a single pass. Runs inside the ingestion worker processes."""
+    if isinstance(xlsx_file, bytes):
+        xlsx_file = io.BytesIO(xlsx_file)
+    elif isinstance(xlsx_file, str):
+        xlsx_file = UploadSpool.open(xlsx_file)
+    with xlsx_file:
+        return pd.read_excel(xlsx_file, sheet_name=sheet_names)
+
+
+class FleetWorkbook(Workbook):
+    """Workbook that merges the statistics sheets of the exports of many generators.
+
+    The logs of every generator get new sequential indexes, and the legend gets a
+    generator column, so the merged sheets have the same layout as a single export.
+    The per-log history sheets are read, on demand, from the workbook of their generator.
+    """
+
+    def __init__(self, generators_workbooks: dict, content_hash: str = "") -> None:
+        super().__init__(None, content_hash)
+        self._generators_workbooks = generators_workbooks
+        self._logs_locations = {}
+
+    @staticmethod
+    def ingest(
+        generators_files: dict, content_hashes: dict = None, fleet_hash: str = "", max_workers: int = None
+    ) -> "FleetWorkbook":
+        """Parse the statistics sheets of every file of 'generators_files' (generator name -> file bytes,
+        or path of the file on disk) in parallel worker processes, and merge them.
+        """
+        content_hashes = content_hashes or {}
+        sheet_names = [table.get_sheet_name() for table in StatisticsTables().get_tables()]
+        generators_names = list(generators_files.keys())
+        if max_workers is None:
+            max_workers = min(len(generators_names), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            generators_sheets = list(executor.map(
+                read_sheets,
+                [generators_files[generator_name] for generator_name in generators_names],
+                [sheet_names] * len(generators_names),
+            ))
+
+        generators_workbooks = {}
+        for generator_name, sheets in zip(generators_names, generators_sheets):
+            content_hash = content_hashes.get(generator_name, "")
+            sidecar_store = SidecarStore(content_hash) if content_hash else None
+            generator_file = generators_files[generator_name]
+            if isinstance(generator_file, bytes):
+                generator_file = io.BytesIO(generator_file)
+            workbook = Workbook(generator_file, content_hash, sidecar_store)
+            for sheet_name, dataframe in sheets.items():
+                workbook.add_sheet(sheet_name, dataframe)
+            generators_workbooks[generator_name] = workbook
+
+        fleet_workbook = FleetWorkbook(generators_workbooks, fleet_hash)
+        fleet_workbook.merge_sheets()
+        return fleet_workbook
+
+    def get_generators_names(self) -> list:
+        return list(self._generators_workbooks.keys())
+
+    def merge_sheets(self) -> None:
+        statistics = StatisticsTables()
+        logs_indexes_maps = self.__merge_legend_sheets(statistics.log_table)
+        for table in statistics.get_tables()[1:]:
+            self.__merge_statistics_sheets(table, logs_indexes_maps)
+
+    def load_sheets(self, sheet_names: list) -> None:
+        super().load_sheets([sheet_name for sheet_name in sheet_names if sheet_name not in self._logs_locations])
+
+    def set_sheet_schema(self, sheet_name, schema) -> None:
+        if sheet_name in self._logs_locations:
+            generator_name, log_index = self._logs_locations[sheet_name]
+            self._generators_workbooks[generator_name].set_sheet_schema(log_index, schema)
+            return
+        super().set_sheet_schema(sheet_name, schema)
+
+    def get_columns(self, sheet_name) -> list:
+        if sheet_name in self._logs_locations:
+            generator_name, log_index = self._logs_locations[sheet_name]
+            return self._generators_workbooks[generator_name].get_columns(log_index)
+        return super().get_columns(sheet_name)
+
+    def get_sheet(self, sheet_name, columns: list = None, rows_mask: pd.Series = None) -> pd.DataFrame:
+        if sheet_name in self._logs_locations:
+            generator_name, log_index = self._logs_locations[sheet_name]
+            return self._generators_workbooks[generator_name].get_sheet(log_index, columns, rows_mask)
+        return super().get_sheet(sheet_name, columns, rows_mask)
+
+    def get_column(self, sheet_name, column) -> pd.Series:
+        if sheet_name in self._logs_locations:
+            generator_name, log_index = self._logs_locations[sheet_name]
+            return self._generators_workbooks[generator_name].get_column(log_index, column)
+        return super().get_column(sheet_name, column)
+
+    def read_sheets_columns(self, sheet_names: list, columns: list) -> dict:
+        generators_sheet_names = {}
+        for sheet_name in sheet_names:
+            if sheet_name in self._logs_locations:
+                generator_name, log_index = self._logs_locations[sheet_name]
+                generators_sheet_names.setdefault(generator_name, {})[log_index] = sheet_name
+        sheets_columns = super().read_sheets_columns(
+            [sheet_name for sheet_name in sheet_names if sheet_name not in self._logs_locations], columns
+        )
+        for generator_name, logs_sheet_names in generators_sheet_names.items():
+            generator_sheets_columns = self._generators_workbooks[generator_name].read_sheets_columns(list(logs_sheet_names), columns)
+            for log_index, dataframe in generator_sheets_columns.items():
+                sheets_columns[logs_sheet_names[log_index]] = dataframe
+        return {sheet_name: sheets_columns[sheet_name] for sheet_name in sheet_names}
+
+    def get_sheet_location(self, sheet_name) -> tuple:
+        if sheet_name in self._logs_locations:
+            generator_name, log_index = self._logs_locations[sheet_name]
+            return self._generators_workbooks[generator_name].get_sheet_location(log_index)
+        return super().get_sheet_location(sheet_name)
+
+    def get_memory_usage(self) -> int:
+        generators_memory_usage = sum(workbook.get_memory_usage() for workbook in self._generators_workbooks.values())
+        return super().get_memory_usage() + generators_memory_usage
+
+    def __merge_legend_sheets(self, log_table: LogLegendTable) -> dict:
+        """Merge the legends, returning, per generator, the map from its logs indexes to the fleet ones."""
+        logs_indexes_maps = {}
+        legend_dataframes = []
+        next_log_index = 1
+        for generator_name, workbook in self._generators_workbooks.items():
+            legend_dataframe = workbook.get_sheet(
+                log_table.get_sheet_name(), [LogLegendTable.COLUMN_INDEXES, LogLegendTable.COLUMN_FILES]
+            )
+            logs_indexes = legend_dataframe[LogLegendTable.COLUMN_INDEXES].to_list()
+            fleet_logs_indexes = list(range(next_log_index, next_log_index + len(logs_indexes)))
+            next_log_index += len(logs_indexes)
+            logs_indexes_maps[generator_name] = dict(zip(logs_indexes, fleet_logs_indexes))
+            for log_index, fleet_log_index in zip(logs_indexes, fleet_logs_indexes):
+                self._logs_locations[fleet_log_index] = (generator_name, log_index)
+            legend_dataframes.append(pd.DataFrame({
+                LogLegendTable.COLUMN_INDEXES: fleet_logs_indexes,
+                LogLegendTable.COLUMN_FILES: [
+                    "{} / {}".format(generator_name, log_file)
+                    for log_file in legend_dataframe[LogLegendTable.COLUMN_FILES].to_list()
+                ],
+                LogLegendTable.COLUMN_GENERATORS: generator_name,
+            }))
+        self.add_sheet(log_table.get_sheet_name(), pd.concat(legend_dataframes, ignore_index=True))
+        return logs_indexes_maps
+
+    def __merge_statistics_sheets(self, table, logs_indexes_maps: dict) -> None:
+        main_columns = [table.get_key_column()] + table.get_sub_key_columns()
+        total_column = table.get_total_column()
+        generators_dataframes = []
+        for generator_name, workbook in self._generators_workbooks.items():
+            dataframe = workbook.get_sheet(table.get_sheet_name())
+            dataframe = dataframe[dataframe[table.get_key_column()] != total_column]
+            logs_indexes_map = logs_indexes_maps[generator_name]
+            logs_columns = [column for column in dataframe.columns if column in logs_indexes_map]
+            dataframe = dataframe[main_columns + logs_columns].rename(columns=logs_indexes_map)
+            generators_dataframes.append(dataframe)
+        merged_dataframe = pd.concat(generators_dataframes, ignore_index=True)
+
+        # Logs of the other generators have no count for the values of a generator
+        logs_columns = [column for column in merged_dataframe.columns if column not in main_columns]
+        merged_dataframe[logs_columns] = merged_dataframe[logs_columns].fillna(0)
+        merged_dataframe = merged_dataframe.groupby(main_columns, dropna=False, sort=False, as_index=False)[logs_columns].sum()
+        for column in logs_columns:
+            if np.all(merged_dataframe[column] == np.round(merged_dataframe[column])):
+                merged_dataframe[column] = merged_dataframe[column].astype(np.int64)
+        merged_dataframe[total_column] = merged_dataframe[logs_columns].sum(axis=1)
+
+        total_line = {column: merged_dataframe[column].sum() for column in logs_columns + [total_column]}
+        total_line[table.get_key_column()] = total_column
+        merged_dataframe = pd.concat([merged_dataframe, pd.DataFrame([total_line])], ignore_index=True)
+        self.add_sheet(table.get_sheet_name(), merged_dataframe)
@@ -0,0 +1,140 @@
+"""File useful to append newer exports of the same generator to a persisted dataset."""
+
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from common.sidecar import SidecarStore
+from common.tables import LogLegendTable, StatisticsTables
+from common.workbook import Workbook
+
+
+class IncrementalDataset:
+    """Statistics and log histories of one generator, persisted in the sidecar format.
+
+    Every new export repeats the old logs plus a few new ones. The logs are matched
+    by their 'Arquivo' in the legend, so only the log columns and the per-log sheets
+    of the new logs are parsed and merged into the persisted sheets, and the TOTAL
+    column and line are updated with the sums of the new logs only.
+    """
+
+    DATASETS_DIRECTORY = os.path.join(SidecarStore.ROOT_DIRECTORY, "datasets")
+
+    _lock = threading.Lock()
+
+    def __init__(self, dataset_name: str, root_directory: str = None) -> None:
+        if root_directory is None:
+            root_directory = IncrementalDataset.DATASETS_DIRECTORY
+        self._dataset_name = dataset_name
+        self._dataset_hash = IncrementalDataset.get_dataset_hash(dataset_name)
+        self._root_directory = root_directory
+        self._sidecar_store = SidecarStore(self._dataset_hash, root_directory)
+
+    @staticmethod
+    def get_dataset_hash(dataset_name: str) -> str:
+        return hashlib.sha256(dataset_name.encode()).hexdigest()
+
+    def get_dataset_name(self) -> str:
+        return self._dataset_name
+
+    def get_workbook(self) -> Workbook:
+        """Return the dataset as it is now. Its sheets are not changed by the later appends."""
+        return Workbook(None, self._dataset_hash, SidecarStore(self._dataset_hash, self._root_directory))
+
+    def append(self, xlsx_file) -> Workbook:
+        """Merge the logs of 'xlsx_file' not in the dataset yet, and return the updated dataset."""
+        statistics = StatisticsTables()
+        legend_sheet_name = statistics.log_table.get_sheet_name()
+        with IncrementalDataset._lock:
+            excel_file = pd.ExcelFile(xlsx_file)
+            export_legend = pd.read_excel(excel_file, sheet_name=legend_sheet_name)
+            logs_indexes_map = self.__get_new_logs_indexes_map(export_legend)
+            if not logs_indexes_map:
+                return self.get_workbook()
+
+            # Statistics sheets and new per-log sheets are parsed in a single pass
+            statistics_sheet_names = [table.get_sheet_name() for table in statistics.get_tables()[1:]]
+            export_sheets = pd.read_excel(
+                excel_file, sheet_name=statistics_sheet_names + list(logs_indexes_map.keys())
+            )
+            for export_log_index, log_index in logs_indexes_map.items():
+                self._sidecar_store.write_sheet(log_index, export_sheets[export_log_index], replace=True)
+            for table in statistics.get_tables()[1:]:
+                self.__append_statistics_sheet(table, export_sheets[table.get_sheet_name()], logs_indexes_map)
+            self.__append_legend_sheet(legend_sheet_name, export_legend, logs_indexes_map)
+        return self.get_workbook()
+
+    def __get_new_logs_indexes_map(self, export_legend: pd.DataFrame) -> dict:
+        """Return the map from the export indexes of the new logs to their dataset indexes."""
+        export_logs_indexes = export_legend[LogLegendTable.COLUMN_INDEXES].to_list()
+        export_logs_files = export_legend[LogLegendTable.COLUMN_FILES].to_list()
+        if not self._sidecar_store.has_sheet(StatisticsTables().log_table.get_sheet_name()):
+            return dict(zip(export_logs_indexes, export_logs_indexes))
+
+        legend = self._sidecar_store.read_columns(
+            StatisticsTables().log_table.get_sheet_name(), [LogLegendTable.COLUMN_INDEXES, LogLegendTable.COLUMN_FILES]
+        )
+        known_logs_files = set(legend[LogLegendTable.COLUMN_FILES].to_list())
+        next_log_index = int(legend[LogLegendTable.COLUMN_INDEXES].max()) + 1 if len(legend) else 1
+        logs_indexes_map = {}
+        for export_log_index, log_file in zip(export_logs_indexes, export_logs_files):
+            if log_file not in known_logs_files:
+                logs_indexes_map[export_log_index] = next_log_index
+                known_logs_files.add(log_file)
+                next_log_index += 1
+        return logs_indexes_map
+
+    def __append_legend_sheet(self, sheet_name: str, export_legend: pd.DataFrame, logs_indexes_map: dict) -> None:
+        new_legend = export_legend[export_legend[LogLegendTable.COLUMN_INDEXES].isin(logs_indexes_map.keys())].copy()
+        new_legend[LogLegendTable.COLUMN_INDEXES] = new_legend[LogLegendTable.COLUMN_INDEXES].map(logs_indexes_map)
+        if self._sidecar_store.has_sheet(sheet_name):
+            new_legend = pd.concat([self._sidecar_store.read_columns(sheet_name), new_legend], ignore_index=True)
+        self._sidecar_store.write_sheet(sheet_name, new_legend.reset_index(drop=True), replace=True)
+
+    def __append_statistics_sheet(self, table, export_dataframe: pd.DataFrame, logs_indexes_map: dict) -> None:
+        sheet_name = table.get_sheet_name()
+        if not self._sidecar_store.has_sheet(sheet_name):
+            # First ingest: the export is the dataset
+            self._sidecar_store.write_sheet(sheet_name, export_dataframe)
+            return
+
+        key_column = table.get_key_column()
+        main_columns = [key_column] + table.get_sub_key_columns()
+        total_column = table.get_total_column()
+
+        new_logs_columns = [column for column in export_dataframe.columns if column in logs_indexes_map]
+        new_dataframe = export_dataframe[export_dataframe[key_column] != total_column]
+        new_dataframe = new_dataframe[main_columns + new_logs_columns].rename(columns=logs_indexes_map)
+        new_logs_columns = [logs_indexes_map[column] for column in new_logs_columns]
+        # Values seen only by the old logs bring nothing new
+        new_dataframe = new_dataframe[new_dataframe[new_logs_columns].fillna(0).ne(0).any(axis="columns")]
+
+        dataframe = self._sidecar_store.read_columns(sheet_name)
+        total_line_mask = (dataframe[key_column] == total_column).to_numpy()
+        total_line = dataframe[total_line_mask].iloc[0].to_dict() if total_line_mask.any() else {}
+        dataframe = dataframe[~total_line_mask]
+        old_logs_columns = [column for column in dataframe.columns if column not in main_columns + [total_column]]
+
+        merged_dataframe = dataframe.merge(new_dataframe, on=main_columns, how="outer", sort=False, indicator=True)
+        # Rows only on one side have no count for the logs of the other side
+        new_rows_mask = merged_dataframe["_merge"] == "right_only"
+        merged_dataframe.loc[new_rows_mask, old_logs_columns + [total_column]] = 0
+        merged_dataframe.loc[merged_dataframe["_merge"] == "left_only", new_logs_columns] = 0
+        merged_dataframe = merged_dataframe[main_columns + old_logs_columns + new_logs_columns + [total_column]]
+
+        new_logs_sums = merged_dataframe[new_logs_columns].sum(axis="columns")
+        merged_dataframe[total_column] = merged_dataframe[total_column].fillna(0) + new_logs_sums
+        for column in old_logs_columns + new_logs_columns + [total_column]:
+            column_values = merged_dataframe[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            if not np.isnan(column_values).any() and np.all(column_values == np.round(column_values)):
+                merged_dataframe[column] = column_values.astype(np.int64)
+
+        for column in new_logs_columns:
+            total_line[column] = merged_dataframe[column].sum()
+        total_line[total_column] = np.nansum([total_line.get(total_column, 0), new_logs_sums.sum()])
+        total_line[key_column] = total_column
+        merged_dataframe = pd.concat([merged_dataframe, pd.DataFrame([total_line])], ignore_index=True)
+        self._sidecar_store.write_sheet(sheet_name, merged_dataframe, replace=True)
@@ -0,0 +1,144 @@
+"""File useful to measure the time, rows and memory spent by each stage of the pages."""
+
+import contextlib
+import datetime
+import functools
+import json
+import threading
+import time
+import tracemalloc
+
+
+class StageTracer:
+    """Wall time, rows processed and allocated memory of the stages run while a trace is started.
+
+    A trace belongs to the thread that started it (the thread of a Streamlit rerun),
+    so the stages run by other sessions or by background threads are not recorded,
+    and a stage costs a single lookup when no trace is started.
+
+    Stages can be nested. The memory is only measured when the trace is started with
+    'trace_memory', as 'tracemalloc' slows the code down. It is traced for the whole
+    process, so the memory of a stage also counts what other threads allocated meanwhile.
+    """
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._memory_traces = 0
+        self._tracemalloc_started = False
+        self._lock = threading.Lock()
+
+    def start_trace(self, name: str, trace_memory: bool = False) -> None:
+        """Start recording the stages run by the current thread, dropping any trace not stopped."""
+        self.__stop_memory_trace(getattr(self._local, "trace", None))
+        if trace_memory:
+            with self._lock:
+                if self._memory_traces == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._tracemalloc_started = True
+                self._memory_traces += 1
+        self._local.trace = {
+            "name": name,
+            "started_at": datetime.datetime.now().isoformat(timespec="milliseconds"),
+            "trace_memory": trace_memory,
+            "stages": [],
+        }
+        self._local.start_time = time.perf_counter()
+        self._local.running_stages = []
+
+    def stop_trace(self) -> dict:
+        """Stop recording and return the trace of the current thread (None if no trace was started)."""
+        trace = getattr(self._local, "trace", None)
+        if trace is None:
+            return None
+        trace["seconds"] = time.perf_counter() - self._local.start_time
+        self.__stop_memory_trace(trace)
+        self._local.trace = None
+        return trace
+
+    def is_tracing(self) -> bool:
+        return getattr(self._local, "trace", None) is not None
+
+    def set_rows(self, rows: int) -> None:
+        """Set the number of rows processed by the innermost running stage."""
+        if self.is_tracing() and self._local.running_stages:
+            self._local.running_stages[-1]["record"]["rows"] = int(rows)
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows: int = None):
+        """Record the code run inside the 'with' block as the stage 'name'."""
+        trace = getattr(self._local, "trace", None)
+        if trace is None:
+            yield
+            return
+        running_stages = self._local.running_stages
+        record = {
+            "stage": name,
+            "depth": len(running_stages),
+            "start_seconds": time.perf_counter() - self._local.start_time,
+            "seconds": None,
+            "rows": rows,
+            "allocated_bytes": None,
+            "peak_bytes": None,
+            "error": None,
+        }
+        trace["stages"].append(record)
+        running_stage = {"record": record}
+        if trace["trace_memory"]:
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            if running_stages:
+                running_stages[-1]["peak_memory"] = max(running_stages[-1]["peak_memory"], peak_memory)
+            tracemalloc.reset_peak()
+            running_stage["start_memory"] = current_memory
+            running_stage["peak_memory"] = current_memory
+        running_stages.append(running_stage)
+        start_time = time.perf_counter()
+        try:
+            yield
+        except BaseException as exception:
+            record["error"] = type(exception).__name__
+            raise
+        finally:
+            record["seconds"] = time.perf_counter() - start_time
+            running_stages.pop()
+            if trace["trace_memory"]:
+                current_memory, peak_memory = tracemalloc.get_traced_memory()
+                running_stage["peak_memory"] = max(running_stage["peak_memory"], peak_memory)
+                if running_stages:
+                    running_stages[-1]["peak_memory"] = max(running_stages[-1]["peak_memory"], running_stage["peak_memory"])
+                record["allocated_bytes"] = current_memory - running_stage["start_memory"]
+                record["peak_bytes"] = running_stage["peak_memory"] - running_stage["start_memory"]
+
+    def traced(self, rows=None):
+        """Decorator recording each call of a method as the stage '<class name>.<method name>'.
+
+        'rows', if given, is called with the instance after the method, and returns the rows it processed.
+        """
+        def decorator(method):
+            @functools.wraps(method)
+            def traced_method(instance, *args, **kwargs):
+                if not self.is_tracing():
+                    return method(instance, *args, **kwargs)
+                with self.stage(type(instance).__name__ + "." + method.__name__):
+                    result = method(instance, *args, **kwargs)
+                    if rows is not None:
+                        self.set_rows(rows(instance))
+                    return result
+            return traced_method
+        return decorator
+
+    @staticmethod
+    def get_trace_file_contents(traces: list) -> str:
+        """Return 'traces' as the contents of a JSON trace file."""
+        return json.dumps({"traces": traces}, indent=2, ensure_ascii=False, default=str)
+
+    def __stop_memory_trace(self, trace: dict) -> None:
+        if trace is None or not trace["trace_memory"]:
+            return
+        with self._lock:
+            self._memory_traces -= 1
+            if self._memory_traces == 0 and self._tracemalloc_started:
+                tracemalloc.stop()
+                self._tracemalloc_started = False
+
+
+stage_tracer = StageTracer()
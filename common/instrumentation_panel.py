@@ -0,0 +1,67 @@
+"""File useful to show, in the sidebar, the time spent by each stage of the last reruns."""
+
+import datetime
+
+import pandas as pd
+import streamlit as st
+
+from common.instrumentation import stage_tracer
+
+
+class InstrumentationPanel:
+    """Optional debug panel of the sidebar.
+
+    When enabled, every rerun is traced from 'start' to 'show', and the stages of the
+    last 'MAX_TRACES' reruns of the session can be downloaded as a JSON trace file,
+    to be compared offline.
+    """
+
+    ENABLED_KEY = "instrumentation_enabled"
+    MEMORY_KEY = "instrumentation_memory"
+    TRACES_KEY = "instrumentation_traces"
+    MAX_TRACES = 20
+
+    def start(self, name: str) -> None:
+        """Start tracing the rerun, if the panel was enabled by the user."""
+        if st.session_state.get(InstrumentationPanel.ENABLED_KEY, False):
+            stage_tracer.start_trace(name, trace_memory=st.session_state.get(InstrumentationPanel.MEMORY_KEY, False))
+
+    def show(self) -> None:
+        """Stop tracing the rerun and show the panel."""
+        trace = stage_tracer.stop_trace()
+        traces = st.session_state.setdefault(InstrumentationPanel.TRACES_KEY, [])
+        if trace is not None:
+            traces.append(trace)
+            del traces[:-InstrumentationPanel.MAX_TRACES]
+
+        with st.sidebar.expander("Depuração: tempo das etapas"):
+            enabled = st.checkbox("Medir as etapas das páginas", value=False, key=InstrumentationPanel.ENABLED_KEY)
+            st.checkbox(
+                "Medir também a memória alocada (mais lento)", value=False, key=InstrumentationPanel.MEMORY_KEY,
+                disabled=not enabled,
+            )
+            if not enabled:
+                return
+            if trace is not None:
+                st.caption("Última execução: {:.0f} ms".format(trace["seconds"] * 1000))
+                st.dataframe(InstrumentationPanel.__get_trace_dataframe(trace))
+            if traces:
+                st.download_button(
+                    "Baixar as últimas {} execuções (JSON)".format(len(traces)),
+                    data=stage_tracer.get_trace_file_contents(traces),
+                    file_name="rastreamento_{}.json".format(datetime.datetime.now().strftime("%Y%m%d_%H%M%S")),
+                    mime="application/json",
+                )
+
+    @staticmethod
+    def __get_trace_dataframe(trace: dict) -> pd.DataFrame:
+        stages = trace["stages"]
+        dataframe = pd.DataFrame({
+            "Etapa": ["· " * stage["depth"] + stage["stage"] for stage in stages],
+            "Tempo (ms)": [stage["seconds"] * 1000 for stage in stages],
+            "Linhas": pd.array([stage["rows"] for stage in stages], dtype="Int64"),
+        })
+        if trace["trace_memory"]:
+            dataframe["Memória alocada (KB)"] = [stage["allocated_bytes"] / 1024 for stage in stages]
+            dataframe["Pico de memória (KB)"] = [stage["peak_bytes"] / 1024 for stage in stages]
+        return dataframe
@@ -0,0 +1,34 @@
+"""File useful to select the lines around the matches of a log history filter."""
+
+import numpy as np
+
+
+class ContextWindow:
+    """Window of lines kept before and after each matching line of a log history."""
+
+    def __init__(self, number_of_back_lines: int = 1, number_of_forward_lines: int = 0) -> None:
+        self._number_of_back_lines = max(int(number_of_back_lines), 0)
+        self._number_of_forward_lines = max(int(number_of_forward_lines), 0)
+
+    def get_number_of_back_lines(self) -> int:
+        return self._number_of_back_lines
+
+    def get_number_of_forward_lines(self) -> int:
+        return self._number_of_forward_lines
+
+    def get_rows_mask(self, matches_mask: np.ndarray) -> np.ndarray:
+        """Return a boolean array telling which rows are matches or lie inside the window of a match.
+
+        Each match opens an interval of rows. The intervals are added as +1/-1 steps
+        and accumulated, so the cost is linear in the number of rows whatever the window size.
+        """
+        matches_mask = np.asarray(matches_mask, dtype=bool)
+        number_of_rows = len(matches_mask)
+        matches_positions = np.flatnonzero(matches_mask)
+        starts = np.maximum(matches_positions - self._number_of_back_lines, 0)
+        ends = np.minimum(matches_positions + self._number_of_forward_lines + 1, number_of_rows)
+        steps = np.bincount(starts, minlength=number_of_rows + 1) - np.bincount(ends, minlength=number_of_rows + 1)
+        return np.cumsum(steps[:number_of_rows]) > 0
+
+    def get_rows_positions(self, matches_mask: np.ndarray) -> np.ndarray:
+        return np.flatnonzero(self.get_rows_mask(matches_mask))
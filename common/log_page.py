@@ -1,25 +1,59 @@
 """File useful to display an special page for Log History Analysis."""
 
+import numpy as np
 import pandas as pd
+import plotly.graph_objects as go
 import streamlit as st
 
-from common.tables import LogLegendTable, TableInterface
+from common.events_rate import EventsRateSeries
+from common.instrumentation import stage_tracer
+from common.log_context import ContextWindow
+from common.log_stream import LogHistoryStream
+from common.page_dispatcher import LastPageResults
+from common.paged_table_view import PagedTableView
+from common.tables import LogHistoryTable, LogLegendTable
+from common.workbook import Workbook
 
 
 class LogsPage:
-    def __init__(self, log_table: LogLegendTable, uploaded_file: str) -> None:
+
+    KEY_PREFIX = "log_history"
+    STREAMING_PREVIEW_ROWS = 1000
+
+    def __init__(self, log_table: LogLegendTable, workbook: Workbook) -> None:
         self._log_table = log_table
-        self._uploaded_file = uploaded_file
+        self._workbook = workbook
+        self.streaming_mode = False
+        self._last_results = LastPageResults(LogsPage.KEY_PREFIX, workbook)
+
+    def get_state_view(self, key: tuple, builder):
+        """Return the view of the workbook for 'key', reusing the last one of the page if it has the same key."""
+        return self._last_results.get(key, lambda: self._workbook.get_state_view(key, builder))
 
     def show_page_header(self) -> None:
         st.header("Análise de histórico de logs")
 
+    def show_streaming_mode_checkbox(self) -> None:
+        self.streaming_mode = st.checkbox(
+            "Ler o histórico em blocos (para históricos muito longos, sem carregá-los inteiros na memória)",
+            value=False,
+            key=LogsPage.KEY_PREFIX + "_streaming_mode",
+        )
+
+    @stage_tracer.traced()
     def show_log_filter(self) -> None:
-        self.log_selected = st.selectbox('\nLog sob análise:', self._log_table.get_logs_names())
+        self.log_selected = st.selectbox(
+            '\nLog sob análise:', self._log_table.get_logs_names(), key=LogsPage.KEY_PREFIX + "_log_selected"
+        )
         if self.log_selected:
             self.log_index_selected = self._log_table.get_log_index_by_name(self.log_selected)
-            self.log_table_selected = TableInterface(sheet_name=self.log_index_selected)
-            self.log_table_selected.set_file(self._uploaded_file)
+            self.log_table_selected = LogHistoryTable(self.log_index_selected)
+            self.log_table_selected.set_workbook(self._workbook)
+            xlsx_file, sheet_name = self._workbook.get_sheet_location(self.log_index_selected)
+            self.log_stream_selected = LogHistoryStream(xlsx_file, sheet_name)
+            if xlsx_file is None:
+                # Persisted datasets have no Excel file, their histories are already read column by column
+                self.streaming_mode = False
 
 
     def __special_filter_selection_is_failure(self) -> bool:
@@ -29,67 +63,161 @@ class LogsPage:
         return self.special_filter_selection == "Warning"  
 
 
+    @stage_tracer.traced()
     def show_failure_warning_special_filter(self) -> None:
-        log_dataframe = self.log_table_selected.get_dataframe().astype(str)
-        
         # First layer of filtering
         self.special_filter_selection = st.selectbox(
-            '\nFiltro especial para Falha e Warning (exibe também a linha anterior à opção selecionada):',
+            '\nFiltro especial para Falha e Warning (exibe também as linhas vizinhas à opção selecionada):',
             ["Nenhum", "Falha", "Warning"],
+            key=LogsPage.KEY_PREFIX + "_special_filter",
         )
         
         # Second layer of filtering
         if self.__special_filter_selection_is_failure() or self.__special_filter_selection_is_warning():
-            rows_list = self.__get_rows_list_from_column(
-                log_dataframe, self.special_filter_selection, non_duplicated=True, non_nan=True
-            )
+            if self.streaming_mode:
+                rows_list = self.get_state_view(
+                    ("log_stream_distinct_values", self.log_index_selected, self.special_filter_selection),
+                    lambda: self.log_stream_selected.get_distinct_values(self.special_filter_selection),
+                )
+            else:
+                column_values = self.log_table_selected.get_column_view(self.special_filter_selection)
+                stage_tracer.set_rows(len(column_values))
+                rows_list = self.__get_rows_list_from_column(column_values, non_duplicated=True, non_nan=True)
             user_msg = 'Filtro de ' + self.special_filter_selection
-            self.special_filter_sub_selection = st.selectbox(user_msg, rows_list)
-            self.number_of_back_lines = st.number_input('Número de linhas anteriores:', min_value=0, max_value=1, value=1)
+            self.special_filter_sub_selection = st.selectbox(
+                user_msg, rows_list, key="{}_{}_sub_selection".format(LogsPage.KEY_PREFIX, self.special_filter_selection)
+            )
+            self.number_of_back_lines = st.number_input(
+                'Número de linhas anteriores:', min_value=0, value=1, key=LogsPage.KEY_PREFIX + "_back_lines"
+            )
+            self.number_of_forward_lines = st.number_input(
+                'Número de linhas posteriores:', min_value=0, value=0, key=LogsPage.KEY_PREFIX + "_forward_lines"
+            )
 
 
-    def __get_rows_list_from_column(self, dataframe: pd.DataFrame, column: str, non_duplicated=False, non_nan=False) -> list:
+    def __get_rows_list_from_column(self, column_values: pd.Series, non_duplicated=False, non_nan=False) -> list:
         if non_nan:
-            dataframe.dropna(inplace=True)
-            dataframe.drop(dataframe[dataframe[column] == " "].index, errors='ignore', inplace = True)
-        rows_list = dataframe[column].to_list()
+            column_values = column_values.dropna()
+            column_values = column_values[~column_values.isin(["", " "])]
         if non_duplicated:
-            rows_list = list(dict.fromkeys(rows_list))
+            rows_list = list(pd.unique(column_values))
             try:
                 rows_list.sort()
             except TypeError:
                 pass
+        else:
+            rows_list = column_values.to_list()
         return rows_list
     
+    @stage_tracer.traced()
     def show_filtered_log_dataframe(self) -> None:
         st.write("\nHistórico do log selecionado")
+
+        if self.streaming_mode:
+            self.__show_streamed_log_dataframe()
+            return
         
-        log_dataframe_original = self.log_table_selected.get_dataframe().astype(str)
-        log_dataframe_original_index_list = log_dataframe_original.index.tolist()
-        
-        log_dataframe = log_dataframe_original.copy()
+        log_dataframe = self.log_table_selected.get_dataframe_view()
         
         # 'Falha' or 'Warning
         if self.__special_filter_selection_is_failure() or self.__special_filter_selection_is_warning():
-            log_dataframe = log_dataframe[log_dataframe[self.special_filter_selection].isin([self.special_filter_sub_selection])]
-            
-            filtered_index_list = log_dataframe.index.tolist()
-            additional_lines_filtered_index_list = [index-self.number_of_back_lines for index in filtered_index_list]
-            
-            merged_indexes_list = []
-            merged_indexes_list.extend(filtered_index_list)
-            merged_indexes_list.extend(additional_lines_filtered_index_list)
-            merged_indexes_list.sort()
-            
-            merged_indexes_list = [index for index in merged_indexes_list if index in log_dataframe_original_index_list]
+            column_values = self.log_table_selected.get_column_view(self.special_filter_selection)
+            matches_mask = (column_values == self.special_filter_sub_selection).to_numpy()
+            context_window = ContextWindow(self.number_of_back_lines, self.number_of_forward_lines)
+            log_dataframe = log_dataframe.iloc[context_window.get_rows_positions(matches_mask)]
             
-            log_dataframe = log_dataframe_original[log_dataframe_original.index.isin(merged_indexes_list)]
-            
-        st.write(log_dataframe)
+        self.__show_paged_log_dataframe(log_dataframe)
+
+
+    def __show_streamed_log_dataframe(self) -> None:
+        if self.__special_filter_selection_is_failure() or self.__special_filter_selection_is_warning():
+            context_window = ContextWindow(self.number_of_back_lines, self.number_of_forward_lines)
+            log_dataframe = self.get_state_view(
+                (
+                    "log_stream_filtered_dataframe",
+                    self.log_index_selected,
+                    self.special_filter_selection,
+                    self.special_filter_sub_selection,
+                    context_window.get_number_of_back_lines(),
+                    context_window.get_number_of_forward_lines(),
+                ),
+                lambda: self.log_stream_selected.get_filtered_dataframe(
+                    self.special_filter_selection, self.special_filter_sub_selection, context_window
+                ),
+            )
+        else:
+            st.caption("Exibindo as primeiras {} linhas. Utilize o filtro especial para buscar no histórico completo.".format(
+                LogsPage.STREAMING_PREVIEW_ROWS
+            ))
+            log_dataframe = self.log_stream_selected.get_head(LogsPage.STREAMING_PREVIEW_ROWS)
+        self.__show_paged_log_dataframe(log_dataframe)
+
+    def __get_failure_or_warning_mask(self, log_dataframe: pd.DataFrame) -> np.ndarray:
+        failure_or_warning_mask = np.zeros(len(log_dataframe), dtype=bool)
+        for column in ["Falha", "Warning"]:
+            if column in log_dataframe.columns:
+                column_values = log_dataframe[column]
+                failure_or_warning_mask |= (column_values.notna() & ~column_values.isin(["", " "])).to_numpy()
+        return failure_or_warning_mask
+
+    def __show_paged_log_dataframe(self, log_dataframe: pd.DataFrame) -> None:
+        stage_tracer.set_rows(len(log_dataframe))
+        view_key = "{}_{}".format(LogsPage.KEY_PREFIX, self.log_index_selected)
+        view_state = (self.streaming_mode, self.special_filter_selection)
+        if self.__special_filter_selection_is_failure() or self.__special_filter_selection_is_warning():
+            view_state += (self.special_filter_sub_selection, self.number_of_back_lines, self.number_of_forward_lines)
+        paged_view = PagedTableView(
+            log_dataframe,
+            key=view_key,
+            highlight_mask=self.__get_failure_or_warning_mask(log_dataframe),
+            get_cached_sort_order=lambda sort_key, builder: self.get_state_view(
+                ("log_history_sort_order", view_key) + view_state + sort_key, builder
+            ),
+            view_state=view_state,
+        )
+        paged_view.show()
+
+
+    @stage_tracer.traced()
+    def show_events_rate_chart(self) -> None:
+        if not st.checkbox(
+            "Exibir a quantidade de Falha e Warning ao longo do tempo", value=False, key=LogsPage.KEY_PREFIX + "_events_rate"
+        ):
+            return
+        bucket_name = st.radio(
+            "Agrupar por:", list(EventsRateSeries.BUCKETS_SECONDS.keys()), horizontal=True,
+            key=LogsPage.KEY_PREFIX + "_events_rate_bucket",
+        )
+        events_rate_series = self.get_state_view(
+            ("events_rate_series", self.log_index_selected, bucket_name), lambda: self.__get_events_rate_series(bucket_name)
+        )
+        if events_rate_series.get_timestamp_column_name() is None:
+            st.write("Nenhuma coluna de data e hora encontrada no histórico.")
+            return
+        stage_tracer.set_rows(len(events_rate_series.get_bucket_starts()))
+
+        figure = go.Figure()
+        for column in EventsRateSeries.EVENTS_COLUMNS:
+            bucket_starts, counts = events_rate_series.get_downsampled(column)
+            figure.add_trace(go.Scatter(x=bucket_starts, y=counts, mode="lines", name=column))
+        figure.update_layout(
+            xaxis_title=events_rate_series.get_timestamp_column_name(), yaxis_title="Quantidade por {}".format(bucket_name.lower())
+        )
+        st.plotly_chart(figure, use_container_width=True)
+
+    def __get_events_rate_series(self, bucket_name: str) -> EventsRateSeries:
+        if self.streaming_mode:
+            chunks = self.log_stream_selected.iter_chunks()
+        else:
+            chunks = [self.log_table_selected.get_dataframe_view()]
+        return EventsRateSeries(chunks, EventsRateSeries.BUCKETS_SECONDS[bucket_name])
 
 
+    @stage_tracer.traced()
     def show_page(self) -> None:
         self.show_page_header()
+        self.show_streaming_mode_checkbox()
         self.show_log_filter()
         self.show_failure_warning_special_filter()
         self.show_filtered_log_dataframe()
+        self.show_events_rate_chart()
@@ -6,10 +6,11 @@ import pandas as pd
 import numpy as np
 import streamlit as st
 import plotly.graph_objects as go
-import matplotlib.pyplot as plt
-
-from mpl_toolkits.mplot3d import Axes3D
 
+from common.exposure_cube import ExposurePivotCube
+from common.exposure_histogram import ExposureHistogram
+from common.instrumentation import stage_tracer
+from common.page_dispatcher import LastPageResults
 from common.tables import StatisticsTableInterface, LogLegendTable
 
 
@@ -23,7 +24,6 @@ class StatisticsPageInterface(ABC):
         # Log filter
         self._selected_logs_names = []
         self._selected_logs_indexes = []
-        self._columns_selected_per_logs = []
 
         # Key column filter
         self._key_column = self._statistics_table.get_key_column()
@@ -32,6 +32,7 @@ class StatisticsPageInterface(ABC):
         # Dataframes
         self._filtered_dataframe = pd.DataFrame()
         self._total_dataframe = pd.DataFrame()
+        self._last_results = LastPageResults(self._statistics_table.get_sheet_name(), self._statistics_table)
 
         self._selector_key = 0
 
@@ -40,6 +41,11 @@ class StatisticsPageInterface(ABC):
         st.header("Estatísticas de " + self._statistics_table.get_sheet_name())
 
 
+    def get_number_of_rows(self) -> int:
+        """Return the number of rows of the statistics table, processed by every stage of the page."""
+        return len(self._statistics_table.get_column_view(self._key_column))
+
+
     def next_selector_key(self):
         """Workaround to solve DuplicatedWidgetID exception from Streamlit.
         This will generate unique IDs for selection widgets based on 'sheet_name'.
@@ -48,14 +54,86 @@ class StatisticsPageInterface(ABC):
         return self._statistics_table.get_sheet_name() + str(self._selector_key)
 
 
+    def get_state_view(self, key: tuple, builder):
+        """Return the view of the table for 'key' (a state of the filters), reusing the last one of the page if it has the same key."""
+        return self._last_results.get(key, lambda: self._statistics_table.get_state_view(key, builder))
+
+
+    MULTI_SELECT_FILTER = "multi_select"
+    RANGE_SELECT_FILTER = "range_select"
+
+    def get_column_filters(self, valid_values_option: bool = True) -> list:
+        """Return the filters of the columns, as (filter kind, keyword arguments) pairs, in the order they are shown.
+
+        'valid_values_option' is the option of the checkbox shared by all the filters, when the page has one.
+        """
+        return [(StatisticsPageInterface.MULTI_SELECT_FILTER, {})]
+
+    def show_column_filters(self) -> None:
+        self.show_filters(self.get_column_filters())
+
+    def show_filters(self, column_filters: list) -> None:
+        for filter_kind, filter_arguments in column_filters:
+            if filter_kind == StatisticsPageInterface.MULTI_SELECT_FILTER:
+                self.show_column_multi_select_filter(**filter_arguments)
+            else:
+                self.show_column_range_select_filter(**filter_arguments)
+
+    def select_default_filters(self) -> None:
+        """Select, without showing any widget, what the filters select before being changed: every log
+        and, in every column filter, the values kept by the valid values checkbox.
+        """
+        self._selected_logs_names = self._log_table.get_logs_names()
+        self._selected_logs_indexes = self._log_table.get_log_indexes_by_names(self._selected_logs_names)
+        for filter_kind, filter_arguments in self.get_column_filters():
+            valid_values_only = bool(filter_arguments.get("show_valid_checkbox") or filter_arguments.get("forced_checkbox_value"))
+            if filter_kind == StatisticsPageInterface.MULTI_SELECT_FILTER:
+                column_name, _, rows_list = self.__get_multi_select_options(
+                    filter_arguments.get("column_name"), filter_arguments.get("valid_selection_list", []), valid_values_only
+                )
+                self.__final_routine_for_column_filter(column_name, rows_list)
+            else:
+                column_name = self.__get_column_name(filter_arguments.get("column_name"))
+                numeric_range = self.__get_range_select_bounds(
+                    column_name, filter_arguments.get("valid_range_min"), filter_arguments.get("valid_range_max"), valid_values_only
+                )
+                column_index = self._statistics_table.get_column_index(column_name)
+                if numeric_range is not None:
+                    self.__final_routine_for_column_filter(column_name, column_index.get_values_in_range(*numeric_range))
+                elif column_index.get_numeric_range() is not None:
+                    self.__final_routine_for_column_filter(column_name, [])
+
+    def compute_default_views(self) -> None:
+        """Compute, without showing anything, the views of the page with its filters not changed yet."""
+        self.select_default_filters()
+        self.get_total_dataframe()
+        self.get_bar_chart_dataframe()
+        self.get_pie_chart_values(self.get_default_log_sub_selection())
+
+    @stage_tracer.traced(rows=lambda page: page.get_number_of_rows())
     def show_log_filter(self) -> None:
-        log_selection = st.multiselect('\nLogs sob análise:', self._log_table.get_logs_names(), key=self.next_selector_key())
+        logs_names = self._log_table.get_logs_names()
+        if self._log_table.has_generators():
+            generators_selection = st.multiselect(
+                '\nGeradores sob análise:', self._log_table.get_generators_names(), key=self.next_selector_key()
+            )
+            if generators_selection:
+                logs_names = self._log_table.get_logs_names_by_generators(generators_selection)
+        log_selection = st.multiselect('\nLogs sob análise:', logs_names, key=self.next_selector_key())
         if log_selection:
             self._selected_logs_names = log_selection
         else:
-            self._selected_logs_names = self._log_table.get_logs_names()
+            self._selected_logs_names = logs_names
         self._selected_logs_indexes = self._log_table.get_log_indexes_by_names(self._selected_logs_names)
-        self._columns_selected_per_logs = self._statistics_table.get_all_columns_including_logs(self._selected_logs_indexes)
+
+
+    def get_filter_state(self) -> tuple:
+        """Return a hashable description of the selected logs and of the values selected in every filter."""
+        rows_selected = tuple(
+            (column_name, tuple(rows_selected_from_column))
+            for column_name, rows_selected_from_column in self._rows_selected_from_column_dict.items()
+        )
+        return tuple(self._selected_logs_indexes), rows_selected
 
 
     def __get_column_name(self, column_name: str) -> str:
@@ -78,8 +156,7 @@ class StatisticsPageInterface(ABC):
         return rows_list
 
 
-    def __add_total_row_to_rows_selected_dict(self, column_name: str, rows_selected: list) -> None:
-        rows_selected.append("TOTAL")
+    def __add_rows_selected_to_dict(self, column_name: str, rows_selected: list) -> None:
         self._rows_selected_from_column_dict[column_name] = rows_selected
 
 
@@ -88,15 +165,31 @@ class StatisticsPageInterface(ABC):
         user_message = self.__get_user_message_to_filter(column_name)
         rows_list = self.__get_rows_list_from_column(column_name)
         return column_name, user_message, rows_list
+
+    def __get_multi_select_options(self, column_name: str, valid_selection_list: list, valid_values_only: bool) -> tuple:
+        column_name, user_message, rows_list = self.__initial_routine_for_column_filter(column_name)
+        if valid_values_only:
+            rows_list = [row for row in rows_list if row in valid_selection_list]
+        return column_name, user_message, rows_list
+
+    def __get_range_select_bounds(self, column_name: str, valid_range_min, valid_range_max, valid_values_only: bool):
+        """Return the (min, max) values of the range filter of 'column_name' (None when there are no values)."""
+        column_index = self._statistics_table.get_column_index(column_name)
+        numeric_range = column_index.get_numeric_range()
+        if numeric_range is not None and valid_values_only:
+            numeric_range = column_index.get_values_in_range(valid_range_min, valid_range_max)
+            numeric_range = (numeric_range[0], numeric_range[-1]) if numeric_range else None
+        return numeric_range
             
     def __final_routine_for_column_filter(self, column_name: str, rows_selected_from_column: list) -> None:
-        self.__add_total_row_to_rows_selected_dict(column_name, rows_selected_from_column)
+        self.__add_rows_selected_to_dict(column_name, rows_selected_from_column)
 
 
     def show_valid_values_checkbox(self):
         return st.checkbox("Filtrar somente valores válidos", value=True, key=self.next_selector_key())
 
 
+    @stage_tracer.traced(rows=lambda page: page.get_number_of_rows())
     def show_column_multi_select_filter(
         self, column_name=None, valid_selection_list=[], show_valid_checkbox=None, forced_checkbox_value=None
         ) -> None:
@@ -105,15 +198,16 @@ class StatisticsPageInterface(ABC):
         If 'column_name' is omitted, then uses the 'key_column'.
         If 'valid_selection_list' is ommited, then the 'valid values filter' is also omitted.
         """
-        column_name, user_message, rows_list = self.__initial_routine_for_column_filter(column_name)
         valid_checkbox_option = None
         if show_valid_checkbox:
             valid_checkbox_option = self.show_valid_values_checkbox()
-        if valid_checkbox_option or forced_checkbox_value:
-            rows_list = [row for row in rows_list if row in valid_selection_list]
+        column_name, user_message, rows_list = self.__get_multi_select_options(
+            column_name, valid_selection_list, bool(valid_checkbox_option or forced_checkbox_value)
+        )
         rows_selected_from_column = st.multiselect(user_message, rows_list, rows_list, key=self.next_selector_key())
         self.__final_routine_for_column_filter(column_name, rows_selected_from_column)
 
+    @stage_tracer.traced(rows=lambda page: page.get_number_of_rows())
     def show_column_range_select_filter(
         self, column_name=None, valid_range_min=None, valid_range_max=None, show_valid_checkbox=None, forced_checkbox_value=None
         ) -> None:
@@ -122,123 +216,123 @@ class StatisticsPageInterface(ABC):
         If 'column_name' is omitted, then uses the 'key_column'.
         If 'valid_range_min' or 'valid_range_max' are ommited, then the 'valid values filter' is also omitted.
         """
-        column_name, user_message, rows_list = self.__initial_routine_for_column_filter(column_name)
+        column_name = self.__get_column_name(column_name)
+        user_message = self.__get_user_message_to_filter(column_name)
+        column_index = self._statistics_table.get_column_index(column_name)
         valid_checkbox_option = None
         if show_valid_checkbox:
             valid_checkbox_option = self.show_valid_values_checkbox()
-        if valid_checkbox_option or forced_checkbox_value:
-            rows_list = [row for row in rows_list if (isinstance(row, int)) or (isinstance(row, float))]
-            rows_list = [row for row in rows_list if (row >= valid_range_min) and (row <= valid_range_max)]
-        min_value = int(min(rows_list))
-        max_value = int(max(rows_list))
-        range_value = list(range(min_value, max_value+1))
-        min_value, max_value = st.select_slider(user_message, options=range_value, value=(min_value, max_value), key=self.next_selector_key())
-        rows_selected_from_column = [value for value in rows_list if value >= min_value and value <= max_value]
+        numeric_range = self.__get_range_select_bounds(
+            column_name, valid_range_min, valid_range_max, bool(valid_checkbox_option or forced_checkbox_value)
+        )
+        if numeric_range is None:
+            if column_index.get_numeric_range() is None:
+                # Column without values (e.g. not logged by the raw logs), so there is nothing to filter
+                st.caption("{}: sem valores".format(user_message))
+                return
+            # No valid values left, so no row is selected
+            st.caption("{}: sem valores válidos".format(user_message))
+            self.__final_routine_for_column_filter(column_name, [])
+            return
+        min_value, max_value = numeric_range
+        if min_value < max_value:
+            if column_index.numeric_values_are_integers():
+                min_value, max_value = int(min_value), int(max_value)
+            else:
+                min_value, max_value = float(min_value), float(max_value)
+            min_value, max_value = st.slider(
+                user_message, min_value=min_value, max_value=max_value, value=(min_value, max_value), key=self.next_selector_key()
+            )
+        rows_selected_from_column = column_index.get_values_in_range(min_value, max_value)
         self.__final_routine_for_column_filter(column_name, rows_selected_from_column)
 
 
-    def __remove_total_column(self) -> pd.DataFrame:
-        return self._total_dataframe.drop("TOTAL", axis="columns", errors="ignore")
-
-    def __add_total_column(self) -> pd.DataFrame:
-        logs_dataframe = self._total_dataframe[self._selected_logs_indexes]
-        self._total_dataframe.loc[:,["TOTAL"]] = logs_dataframe.sum(numeric_only=True, axis=1)
-        return self._total_dataframe
-
-    def __remove_total_line(self) -> pd.DataFrame:
-        self._total_dataframe = self._total_dataframe.drop(self._total_dataframe[self._total_dataframe[self._key_column] == "TOTAL"].index)
-        return self._total_dataframe
-
-    def __add_total_line(self) -> pd.DataFrame:
-        total_line_dataframe = self.__get_total_line_dataframe()
-        self._total_dataframe = pd.concat([self._total_dataframe, total_line_dataframe], ignore_index=True)
-        self._total_dataframe.fillna(pd.NA, inplace=True)
-        return self._total_dataframe
-
-
-    def __get_total_line_dataframe(self) -> pd.DataFrame:
-        columns_list = self._selected_logs_indexes
-        columns_list.append(self._statistics_table.get_total_column())
-        data_list = [[self._total_dataframe[column].sum()] for column in columns_list]
-        columns_list.insert(0, self._key_column)
-        data_list.insert(0, pd.NA)
-        return pd.DataFrame(dict(zip(columns_list, data_list)))
-
-
-
-    def __get_dataframe_filtered_by_rows_and_columns(
-        self, 
-        dataframe: pd.DataFrame, 
-        col_to_select_rows: str, 
-        rows_list: list, 
-    ) -> pd.DataFrame:
-        if rows_list:
-            return dataframe[dataframe[col_to_select_rows].isin(rows_list)]
-        else:
-            return dataframe
-
-
+    @stage_tracer.traced(rows=lambda page: len(page._total_dataframe))
     def show_log_and_statistics_table(self) -> None:
         left_col_width = 3
         right_col_width = 7
         left_col, right_col = st.columns([left_col_width, right_col_width])
         with left_col:
             st.write("\nLegenda de logs")
-            log_dataframe = self._log_table.get_dataframe()
             log_dataframe = self._log_table.get_dataframe_filtered_by_logs_indexes(self._selected_logs_indexes)
             st.write(log_dataframe.astype(str))
         with right_col:
             st.write("\nTabela de quantidade por {}".format(self._statistics_table.get_sheet_name()))
-            filtered_dataframe = self._statistics_table.get_dataframe_filtered_by_columns(self._columns_selected_per_logs)
-            for column, rows_selected in self._rows_selected_from_column_dict.items():
-                filtered_dataframe = self.__get_dataframe_filtered_by_rows_and_columns(
-                    filtered_dataframe,
-                    col_to_select_rows=column,
-                    rows_list=rows_selected,
-                )
-            self._total_dataframe = filtered_dataframe.copy()
-            self._total_dataframe = self.__remove_total_column()
-            self._total_dataframe = self.__add_total_column()
-            self._total_dataframe = self.__remove_total_line()
-            self._total_dataframe = self.__add_total_line()
-            st.dataframe(self._total_dataframe)
+            st.dataframe(self.get_total_dataframe())
+
+    def get_total_dataframe(self) -> pd.DataFrame:
+        """Return the statistics table filtered and totalized for the selected logs and values, computed once per filter state."""
+        self._total_dataframe = self.get_state_view(
+            ("totalized_dataframe", self.get_filter_state()),
+            lambda: self._statistics_table.get_totalized_dataframe(
+                self._rows_selected_from_column_dict, self._selected_logs_indexes
+            ),
+        )
+        return self._total_dataframe
 
 
     def show_log_sub_selection(self) -> str:
+        selection = st.selectbox('\nSelecione a fonte de dados:', self.__get_log_sub_selection_list(), key=self.next_selector_key())
+        return self.__get_log_sub_selection_source(selection)
+
+    def get_default_log_sub_selection(self):
+        """Return the data source selected before any change: the first selected log."""
+        return self.__get_log_sub_selection_source(self.__get_log_sub_selection_list()[0])
+
+    def __get_log_sub_selection_list(self) -> list:
         selection_with_total = self._selected_logs_names.copy()
         selection_with_total.append("TOTAL")
-        selection = st.selectbox('\nSelecione a fonte de dados:', selection_with_total, key=self.next_selector_key())
+        return selection_with_total
+
+    def __get_log_sub_selection_source(self, selection: str):
         if selection != "TOTAL":
             return self._log_table.get_log_index_by_name(selection)
         else:
             return selection
 
+    @stage_tracer.traced(rows=lambda page: len(page._total_dataframe))
     def show_bar_chart(self) -> None:
         st.write("\nGráfico de barras: quantidade por {}".format(self._statistics_table.get_sheet_name()))
-        chart_dataframe = self._total_dataframe.copy()
-        chart_dataframe = chart_dataframe.dropna()
+        st.bar_chart(self.get_bar_chart_dataframe())
+
+    def get_bar_chart_dataframe(self) -> pd.DataFrame:
+        return self.get_state_view(
+            ("bar_chart_dataframe", self.get_filter_state()), self.__get_bar_chart_dataframe
+        )
+
+    def __get_bar_chart_dataframe(self) -> pd.DataFrame:
+        chart_dataframe = self._total_dataframe.dropna()
         chart_dataframe = chart_dataframe.rename(columns={self._key_column: 'index'})
         chart_dataframe = chart_dataframe.drop("TOTAL", axis="columns", errors="ignore")
         chart_dataframe = chart_dataframe.drop(self._statistics_table.get_sub_key_columns(), axis="columns", errors="ignore")
-        chart_dataframe = chart_dataframe.set_index('index')
-        st.bar_chart(chart_dataframe)
+        return chart_dataframe.set_index('index')
 
+    @stage_tracer.traced(rows=lambda page: len(page._total_dataframe))
     def show_pie_chart(self) -> None:
         log_selected = self.show_log_sub_selection()
 
         # Chart
-        chart_dataframe = self._total_dataframe.copy()
-        chart_dataframe = chart_dataframe.dropna()
-        chart_dataframe = chart_dataframe.drop(chart_dataframe[chart_dataframe[self._key_column] == "TOTAL"].index)
+        labels, values = self.get_pie_chart_values(log_selected)
         figure = go.Figure(
             go.Pie(
-                labels = chart_dataframe[self._key_column].to_list(),
-                values = chart_dataframe[log_selected].to_list(),
+                labels = labels,
+                values = values,
                 automargin = False
             )
         )
         st.plotly_chart(figure, use_container_width=True)
 
+    def get_pie_chart_values(self, log_selected) -> tuple:
+        return self.get_state_view(
+            ("pie_chart_values", self.get_filter_state(), log_selected),
+            lambda: self.__get_pie_chart_values(log_selected),
+        )
+
+    def __get_pie_chart_values(self, log_selected) -> tuple:
+        chart_dataframe = self._total_dataframe.dropna()
+        chart_dataframe = chart_dataframe.drop(chart_dataframe[chart_dataframe[self._key_column] == "TOTAL"].index)
+        return chart_dataframe[self._key_column].to_list(), chart_dataframe[log_selected].to_list()
+
 
 class mA_StatisticsPage(StatisticsPageInterface):
     
@@ -247,13 +341,17 @@ class mA_StatisticsPage(StatisticsPageInterface):
     def __init__(self, statistics_table: StatisticsTableInterface, log_table: LogLegendTable) -> None:
         super().__init__(statistics_table, log_table)
 
+    def get_column_filters(self, valid_values_option: bool = True) -> list:
+        return [(StatisticsPageInterface.MULTI_SELECT_FILTER, dict(
+            valid_selection_list=mA_StatisticsPage.MA_VALID_SELECTION_LIST,
+            show_valid_checkbox=True,
+        ))]
+
+    @stage_tracer.traced(rows=lambda page: page.get_number_of_rows())
     def show_page(self) -> None:
         self.show_page_header()
         self.show_log_filter()
-        self.show_column_multi_select_filter(
-            valid_selection_list=mA_StatisticsPage.MA_VALID_SELECTION_LIST,
-            show_valid_checkbox=True,
-        )
+        self.show_column_filters()
         self.show_log_and_statistics_table()
         self.show_bar_chart()
         self.show_pie_chart()
@@ -267,14 +365,18 @@ class kV_StatisticsPage(StatisticsPageInterface):
     def __init__(self, statistics_table: StatisticsTableInterface, log_table: LogLegendTable) -> None:
         super().__init__(statistics_table, log_table)
 
-    def show_page(self) -> None:
-        self.show_page_header()
-        self.show_log_filter()
-        self.show_column_range_select_filter(
+    def get_column_filters(self, valid_values_option: bool = True) -> list:
+        return [(StatisticsPageInterface.RANGE_SELECT_FILTER, dict(
             valid_range_min=kV_StatisticsPage.KV_VALID_RANGE_MIN,
             valid_range_max=kV_StatisticsPage.KV_VALID_RANGE_MAX,
             show_valid_checkbox=True,
-        )
+        ))]
+
+    @stage_tracer.traced(rows=lambda page: page.get_number_of_rows())
+    def show_page(self) -> None:
+        self.show_page_header()
+        self.show_log_filter()
+        self.show_column_filters()
         self.show_log_and_statistics_table()
         self.show_bar_chart()
         self.show_pie_chart()
@@ -288,14 +390,18 @@ class ms_StatisticsPage(StatisticsPageInterface):
     def __init__(self, statistics_table: StatisticsTableInterface, log_table: LogLegendTable) -> None:
         super().__init__(statistics_table, log_table)
 
-    def show_page(self) -> None:
-        self.show_page_header()
-        self.show_log_filter()
-        self.show_column_range_select_filter(
+    def get_column_filters(self, valid_values_option: bool = True) -> list:
+        return [(StatisticsPageInterface.RANGE_SELECT_FILTER, dict(
             valid_range_min=ms_StatisticsPage.MS_VALID_RANGE_MIN,
             valid_range_max=ms_StatisticsPage.MS_VALID_RANGE_MAX,
             show_valid_checkbox=True,
-        )
+        ))]
+
+    @stage_tracer.traced(rows=lambda page: page.get_number_of_rows())
+    def show_page(self) -> None:
+        self.show_page_header()
+        self.show_log_filter()
+        self.show_column_filters()
         self.show_log_and_statistics_table()
         self.show_bar_chart()
         self.show_pie_chart()
@@ -306,10 +412,11 @@ class Failure_StatisticsPage(StatisticsPageInterface):
     def __init__(self, statistics_table: StatisticsTableInterface, log_table: LogLegendTable) -> None:
         super().__init__(statistics_table, log_table)
 
+    @stage_tracer.traced(rows=lambda page: page.get_number_of_rows())
     def show_page(self) -> None:
         self.show_page_header()
         self.show_log_filter()
-        self.show_column_multi_select_filter()
+        self.show_column_filters()
         self.show_log_and_statistics_table()
         self.show_bar_chart()
         self.show_pie_chart()
@@ -320,10 +427,11 @@ class Warning_StatisticsPage(StatisticsPageInterface):
     def __init__(self, statistics_table: StatisticsTableInterface, log_table: LogLegendTable) -> None:
         super().__init__(statistics_table, log_table)
 
+    @stage_tracer.traced(rows=lambda page: page.get_number_of_rows())
     def show_page(self) -> None:
         self.show_page_header()
         self.show_log_filter()
-        self.show_column_multi_select_filter()
+        self.show_column_filters()
         self.show_log_and_statistics_table()
         self.show_bar_chart()
         self.show_pie_chart()
@@ -353,50 +461,70 @@ class Exposition_StatisticsPage(StatisticsPageInterface):
     X_INDEX_DEFAULT = 3 # mAs
     Y_INDEX_DEFAULT = 1 # kV
 
+    CHART_KIND_HEATMAP = "Mapa de calor"
+    CHART_KIND_SURFACE = "Superfície 3D"
+    CHART_KINDS = [CHART_KIND_HEATMAP, CHART_KIND_SURFACE]
+    MAX_CHART_CELLS = ExposureHistogram.DEFAULT_MAX_CELLS
+
     def __init__(self, statistics_table: StatisticsTableInterface, log_table: LogLegendTable) -> None:
         super().__init__(statistics_table, log_table)
 
+    def get_column_filters(self, valid_values_option: bool = True) -> list:
+        return [
+            (StatisticsPageInterface.MULTI_SELECT_FILTER, dict(
+                column_name=Exposition_StatisticsPage.MA_COLUMN,
+                valid_selection_list=mA_StatisticsPage.MA_VALID_SELECTION_LIST,
+                forced_checkbox_value=valid_values_option,
+            )),
+            (StatisticsPageInterface.RANGE_SELECT_FILTER, dict(
+                column_name=Exposition_StatisticsPage.KV_COLUMN,
+                valid_range_min=kV_StatisticsPage.KV_VALID_RANGE_MIN,
+                valid_range_max=kV_StatisticsPage.KV_VALID_RANGE_MAX,
+                forced_checkbox_value=valid_values_option,
+            )),
+            (StatisticsPageInterface.RANGE_SELECT_FILTER, dict(
+                column_name=Exposition_StatisticsPage.MS_COLUMN,
+                valid_range_min=ms_StatisticsPage.MS_VALID_RANGE_MIN,
+                valid_range_max=ms_StatisticsPage.MS_VALID_RANGE_MAX,
+                forced_checkbox_value=valid_values_option,
+            )),
+            (StatisticsPageInterface.RANGE_SELECT_FILTER, dict(
+                column_name=Exposition_StatisticsPage.MAS_COLUMN,
+                valid_range_min=0,
+                valid_range_max=500,
+                forced_checkbox_value=valid_values_option,
+            )),
+            (StatisticsPageInterface.RANGE_SELECT_FILTER, dict(
+                column_name=Exposition_StatisticsPage.KW_COLUMN,
+                valid_range_min=0,
+                valid_range_max=64,
+                forced_checkbox_value=valid_values_option,
+            )),
+            (StatisticsPageInterface.RANGE_SELECT_FILTER, dict(
+                column_name=Exposition_StatisticsPage.KJ_COLUMN,
+                valid_range_min=0,
+                valid_range_max=300, # I need to double check this value
+                forced_checkbox_value=valid_values_option,
+            )),
+            (StatisticsPageInterface.MULTI_SELECT_FILTER, dict(column_name=Exposition_StatisticsPage.MA_GAIN_COLUMN)),
+            (StatisticsPageInterface.MULTI_SELECT_FILTER, dict(column_name=Exposition_StatisticsPage.INDUCTOR_COLUMN)),
+        ]
+
+    def show_column_filters(self) -> None:
+        self.show_filters(self.get_column_filters(self.show_valid_values_checkbox()))
+
+    def compute_default_views(self) -> None:
+        self.select_default_filters()
+        self.get_total_dataframe()
+        x_selected = Exposition_StatisticsPage.X_Y_AXES_SELECTION_LIST[Exposition_StatisticsPage.X_INDEX_DEFAULT]
+        y_selected = Exposition_StatisticsPage.X_Y_AXES_SELECTION_LIST[Exposition_StatisticsPage.Y_INDEX_DEFAULT]
+        self.get_exposure_histogram(self.get_default_log_sub_selection(), x_selected, y_selected, 0.0, 0.0)
+
+    @stage_tracer.traced(rows=lambda page: page.get_number_of_rows())
     def show_page(self) -> None:
         self.show_page_header()
         self.show_log_filter()
-        valid_values_checkbox_option = self.show_valid_values_checkbox()
-        self.show_column_multi_select_filter(
-            column_name=Exposition_StatisticsPage.MA_COLUMN,
-            valid_selection_list=mA_StatisticsPage.MA_VALID_SELECTION_LIST,
-            forced_checkbox_value=valid_values_checkbox_option,
-        )
-        self.show_column_range_select_filter(
-            column_name=Exposition_StatisticsPage.KV_COLUMN,
-            valid_range_min=kV_StatisticsPage.KV_VALID_RANGE_MIN,
-            valid_range_max=kV_StatisticsPage.KV_VALID_RANGE_MAX,
-            forced_checkbox_value=valid_values_checkbox_option,
-        )
-        self.show_column_range_select_filter(
-            column_name=Exposition_StatisticsPage.MS_COLUMN,
-            valid_range_min=ms_StatisticsPage.MS_VALID_RANGE_MIN,
-            valid_range_max=ms_StatisticsPage.MS_VALID_RANGE_MAX,
-            forced_checkbox_value=valid_values_checkbox_option,
-        )
-        self.show_column_range_select_filter(
-            column_name=Exposition_StatisticsPage.MAS_COLUMN,
-            valid_range_min=0,
-            valid_range_max=500,
-            forced_checkbox_value=valid_values_checkbox_option,
-        )
-        self.show_column_range_select_filter(
-            column_name=Exposition_StatisticsPage.KW_COLUMN,
-            valid_range_min=0,
-            valid_range_max=64,
-            forced_checkbox_value=valid_values_checkbox_option,
-        )
-        self.show_column_range_select_filter(
-            column_name=Exposition_StatisticsPage.KJ_COLUMN,
-            valid_range_min=0,
-            valid_range_max=300, # I need to double check this value
-            forced_checkbox_value=valid_values_checkbox_option,
-        )
-        self.show_column_multi_select_filter(column_name=Exposition_StatisticsPage.MA_GAIN_COLUMN)
-        self.show_column_multi_select_filter(column_name=Exposition_StatisticsPage.INDUCTOR_COLUMN)
+        self.show_column_filters()
         self.show_log_and_statistics_table()
         self.show_3D_bar_chart()
 
@@ -420,6 +548,55 @@ class Exposition_StatisticsPage(StatisticsPageInterface):
         return x_selected == y_selected
         
 
+    def show_histogram_bin_widths_selection(self, x_selected: str, y_selected: str) -> tuple:
+        x_col, y_col, kind_col = st.columns(3)
+        with x_col:
+            x_bin_width = st.number_input(
+                'Largura das faixas de {} (0 = automática):'.format(x_selected), min_value=0.0, value=0.0, key=self.next_selector_key()
+            )
+        with y_col:
+            y_bin_width = st.number_input(
+                'Largura das faixas de {} (0 = automática):'.format(y_selected), min_value=0.0, value=0.0, key=self.next_selector_key()
+            )
+        with kind_col:
+            chart_kind = st.radio(
+                'Tipo de gráfico:', Exposition_StatisticsPage.CHART_KINDS, horizontal=True, key=self.next_selector_key()
+            )
+        return x_bin_width, y_bin_width, chart_kind
+
+    @stage_tracer.traced(rows=lambda page: len(page._total_dataframe))
+    def get_exposure_cube(self) -> ExposurePivotCube:
+        """Return the counts of the filtered expositions over every pair of axes, computed once per filter state."""
+        def build_cube() -> ExposurePivotCube:
+            df = self._total_dataframe
+            key_values = df[Exposition_StatisticsPage.EXPOSITION_COLUMN]
+            df = df[key_values.notna() & (key_values != "TOTAL")]
+            return ExposurePivotCube(
+                df, Exposition_StatisticsPage.X_Y_AXES_SELECTION_LIST, self._selected_logs_indexes + ["TOTAL"]
+            )
+
+        return self.get_state_view(("exposure_cube", self.get_filter_state()), build_cube)
+
+    @stage_tracer.traced(rows=lambda page: len(page._total_dataframe))
+    def get_exposure_histogram(
+        self, log_selected, x_selected: str, y_selected: str, x_bin_width: float, y_bin_width: float
+    ) -> ExposureHistogram:
+        """Return the histogram of the filtered expositions, computed once per filter state."""
+        def build_histogram() -> ExposureHistogram:
+            df = self.get_exposure_cube().get_pair(x_selected, y_selected)
+            return ExposureHistogram(
+                df[x_selected],
+                df[y_selected],
+                df[log_selected],
+                x_bin_width,
+                y_bin_width,
+                Exposition_StatisticsPage.MAX_CHART_CELLS,
+            )
+
+        histogram_key = ("exposure_histogram", self.get_filter_state(), log_selected, x_selected, y_selected, x_bin_width, y_bin_width)
+        return self.get_state_view(histogram_key, build_histogram)
+
+    @stage_tracer.traced(rows=lambda page: page.get_number_of_rows())
     def show_3D_bar_chart(self) -> None:
         log_selected = self.show_log_sub_selection()
         x_selected, y_selected = self.show_x_y_axes_selection()
@@ -428,27 +605,23 @@ class Exposition_StatisticsPage(StatisticsPageInterface):
             st.write("Seleção inválida. Por favor, selecione diferentes valores para os Eixos X e Y.")
         
         else:
-            # 3D chart
-            df = self._total_dataframe.copy()
-            df = df.drop(df[df[Exposition_StatisticsPage.EXPOSITION_COLUMN] == "TOTAL"].index)
-            df = df.dropna()
-            df = df.groupby([x_selected, y_selected], as_index=False).sum()
-            chart_dataframe = df
-            
-            fig = plt.figure()
-            ax = Axes3D(fig)
-            
-            x = chart_dataframe[x_selected]
-            y = chart_dataframe[y_selected]
-            z = np.zeros(len(x))
-            
-            dx = np.ones(len(x))
-            dy = np.ones(len(x))
-            dz = chart_dataframe[log_selected]
-            
-            ax.bar3d(x, y, z, dx, dy, dz, shade=True)
-            ax.set_xlabel(x_selected)
-            ax.set_ylabel(y_selected)
-            ax.set_zlabel(log_selected)
-            
-            st.pyplot(fig)
+            x_bin_width, y_bin_width, chart_kind = self.show_histogram_bin_widths_selection(x_selected, y_selected)
+            histogram = self.get_exposure_histogram(log_selected, x_selected, y_selected, x_bin_width, y_bin_width)
+            if histogram.get_counts().size == 0:
+                st.write("Sem dados para o gráfico.")
+                return
+            histogram_x_bin_width, histogram_y_bin_width = histogram.get_bin_widths()
+            if 0 < x_bin_width < histogram_x_bin_width or 0 < y_bin_width < histogram_y_bin_width:
+                st.caption("Faixas alargadas para {:g} x {:g}, para limitar o tamanho do gráfico.".format(*histogram.get_bin_widths()))
+
+            if chart_kind == Exposition_StatisticsPage.CHART_KIND_SURFACE:
+                trace = go.Surface(x=histogram.get_x_centers(), y=histogram.get_y_centers(), z=histogram.get_counts(0))
+            else:
+                trace = go.Heatmap(x=histogram.get_x_centers(), y=histogram.get_y_centers(), z=histogram.get_counts())
+            figure = go.Figure(trace)
+            figure.update_layout(
+                xaxis_title=x_selected,
+                yaxis_title=y_selected,
+                scene=dict(xaxis_title=x_selected, yaxis_title=y_selected, zaxis_title=str(log_selected)),
+            )
+            st.plotly_chart(figure, use_container_width=True)
@@ -0,0 +1,180 @@
+"""File useful to read very large log history sheets without loading them in memory."""
+
+import io
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from common.log_context import ContextWindow
+from common.upload_spool import UploadSpool
+
+
+class LogHistoryStream:
+    """Reader of one per-log history sheet in chunks of at most 'chunk_size' rows.
+
+    The sheet is read with the openpyxl read-only iterator, so the memory used
+    depends on the chunk size and not on the length of the history.
+    Rows keep their position in the sheet as index, as when the sheet is read at once.
+    """
+
+    DEFAULT_CHUNK_SIZE = 50000
+
+    def __init__(self, xlsx_file, sheet_name, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        self._xlsx_file = xlsx_file
+        self._sheet_name = sheet_name
+        self._chunk_size = chunk_size
+
+    def get_sheet_name(self):
+        return self._sheet_name
+
+    def iter_chunks(self):
+        """Yield the sheet as consecutive DataFrames of at most 'chunk_size' rows."""
+        workbook = openpyxl.load_workbook(self.__open_file(), read_only=True, data_only=True)
+        try:
+            rows = self.__get_worksheet(workbook).iter_rows(values_only=True)
+            columns = LogHistoryStream.__get_columns(next(rows, ()))
+            first_position = 0
+            chunk_rows = []
+            for row in rows:
+                chunk_rows.append(LogHistoryStream.__fit_row(row, len(columns)))
+                if len(chunk_rows) == self._chunk_size:
+                    yield LogHistoryStream.__get_chunk_dataframe(chunk_rows, columns, first_position)
+                    first_position += len(chunk_rows)
+                    chunk_rows = []
+            if chunk_rows or first_position == 0:
+                yield LogHistoryStream.__get_chunk_dataframe(chunk_rows, columns, first_position)
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def read_sheets_columns(xlsx_file, sheet_names: list, columns: list, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+        """Return the 'columns' (the ones the sheet has) of every sheet of 'sheet_names' of the opened 'xlsx_file'.
+
+        The file is opened once, and every sheet is read with the openpyxl read-only iterator,
+        keeping only the values of the asked columns, so the memory used depends on them
+        and not on the other columns of the histories.
+        """
+        workbook = openpyxl.load_workbook(xlsx_file, read_only=True, data_only=True)
+        try:
+            sheets_columns = {}
+            for sheet_name in sheet_names:
+                rows = LogHistoryStream.__get_worksheet_of(workbook, sheet_name).iter_rows(values_only=True)
+                header = LogHistoryStream.__get_columns(next(rows, ()))
+                positions = [position for position, column in enumerate(header) if column in columns]
+                kept_columns = [header[position] for position in positions]
+                chunks = []
+                chunk_rows = []
+                for row in rows:
+                    chunk_rows.append(tuple(row[position] if position < len(row) else None for position in positions))
+                    if len(chunk_rows) == chunk_size:
+                        chunks.append(LogHistoryStream.__get_columns_chunk_dataframe(chunk_rows, kept_columns))
+                        chunk_rows = []
+                if chunk_rows or not chunks:
+                    chunks.append(LogHistoryStream.__get_columns_chunk_dataframe(chunk_rows, kept_columns))
+                sheets_columns[sheet_name] = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+            return sheets_columns
+        finally:
+            workbook.close()
+
+    def get_head(self, number_of_rows: int) -> pd.DataFrame:
+        for chunk in self.iter_chunks():
+            return chunk.head(number_of_rows)
+
+    def get_distinct_values(self, column: str) -> list:
+        """Return the distinct non empty values of 'column', sorted when possible."""
+        distinct_values = {}
+        for chunk in self.iter_chunks():
+            column_values = chunk[column].dropna()
+            column_values = column_values[~column_values.isin(["", " "])]
+            distinct_values.update(dict.fromkeys(pd.unique(column_values)))
+        rows_list = list(distinct_values)
+        try:
+            rows_list.sort()
+        except TypeError:
+            pass
+        return rows_list
+
+    def get_filtered_dataframe(self, column: str, value, context_window: ContextWindow) -> pd.DataFrame:
+        """Return the rows where 'column' equals 'value', plus the lines of 'context_window' around them.
+
+        The last back lines of each chunk are carried to the next one, and the forward
+        lines of the matches at the end of a chunk are taken from the start of the next one.
+        """
+        number_of_back_lines = context_window.get_number_of_back_lines()
+        number_of_forward_lines = context_window.get_number_of_forward_lines()
+        filtered_chunks = []
+        carried_rows = None
+        last_read_position = -1
+        next_position_to_keep = 0
+        forward_lines_reach = 0
+        for chunk in self.iter_chunks():
+            if len(chunk) == 0:
+                continue
+            new_rows_mask = chunk.index.to_numpy() > last_read_position
+            last_read_position = chunk.index[-1]
+            if carried_rows is not None:
+                chunk = pd.concat([carried_rows, chunk])
+                new_rows_mask = np.concatenate([np.zeros(len(carried_rows), dtype=bool), new_rows_mask])
+            positions = chunk.index.to_numpy()
+            matches_mask = (chunk[column] == value).to_numpy()
+
+            rows_mask = context_window.get_rows_mask(matches_mask)
+            rows_mask |= new_rows_mask & (positions < forward_lines_reach)
+            rows_mask &= positions >= next_position_to_keep
+            if rows_mask.any():
+                filtered_chunks.append(chunk[rows_mask])
+                next_position_to_keep = positions[rows_mask][-1] + 1
+            if matches_mask.any():
+                forward_lines_reach = max(
+                    forward_lines_reach, positions[matches_mask][-1] + number_of_forward_lines + 1
+                )
+            carried_rows = chunk.tail(number_of_back_lines) if number_of_back_lines else None
+        if not filtered_chunks:
+            return self.get_head(0)
+        return pd.concat(filtered_chunks)
+
+    def __open_file(self):
+        if isinstance(self._xlsx_file, str):
+            return UploadSpool.open(self._xlsx_file)
+        if hasattr(self._xlsx_file, "getvalue"):
+            # Independent handle, so the shared in-memory file position is not disturbed
+            return io.BytesIO(self._xlsx_file.getvalue())
+        return self._xlsx_file
+
+    def __get_worksheet(self, workbook: openpyxl.Workbook):
+        return LogHistoryStream.__get_worksheet_of(workbook, self._sheet_name)
+
+    @staticmethod
+    def __get_worksheet_of(workbook: openpyxl.Workbook, sheet_name):
+        # As in 'pd.read_excel', integer sheet names are positions
+        if isinstance(sheet_name, int):
+            return workbook.worksheets[sheet_name]
+        return workbook[sheet_name]
+
+    @staticmethod
+    def __get_columns(header: tuple) -> list:
+        return [
+            "Unnamed: {}".format(position) if column is None else column
+            for position, column in enumerate(header)
+        ]
+
+    @staticmethod
+    def __fit_row(row: tuple, number_of_columns: int) -> tuple:
+        if len(row) < number_of_columns:
+            return row + (None,) * (number_of_columns - len(row))
+        return row[:number_of_columns]
+
+    @staticmethod
+    def __get_chunk_dataframe(chunk_rows: list, columns: list, first_position: int) -> pd.DataFrame:
+        return pd.DataFrame(
+            chunk_rows,
+            columns=columns,
+            index=pd.RangeIndex(first_position, first_position + len(chunk_rows)),
+        )
+
+    @staticmethod
+    def __get_columns_chunk_dataframe(chunk_rows: list, columns: list) -> pd.DataFrame:
+        dataframe = pd.DataFrame(chunk_rows, columns=columns)
+        # Empty cells are NaN, as when the sheet is read with 'pd.read_excel'
+        return dataframe.where(dataframe.notna(), np.nan)
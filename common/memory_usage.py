@@ -0,0 +1,28 @@
+"""File useful to estimate the memory held by the views derived from the sheets."""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+def get_memory_usage(value) -> int:
+    """Return an estimate of the number of bytes held by 'value'.
+
+    DataFrames, arrays and the containers of them are measured in depth, and the objects
+    with a 'get_memory_usage' method measure themselves. Other objects count their own size only.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        memory_usage = value.memory_usage(deep=True)
+        return int(memory_usage.sum() if isinstance(value, pd.DataFrame) else memory_usage)
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return value.nbytes + sum(sys.getsizeof(item) for item in value.ravel())
+        return value.nbytes
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(get_memory_usage(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(get_memory_usage(key) + get_memory_usage(item) for key, item in value.items())
+    if hasattr(value, "get_memory_usage"):
+        return int(value.get_memory_usage())
+    return sys.getsizeof(value)
@@ -0,0 +1,150 @@
+"""File useful to find in which logs, and in which lines, each Falha and Warning code occurs."""
+
+import numpy as np
+import pandas as pd
+
+from common.memory_usage import get_memory_usage
+
+
+class OccurrencesIndex:
+    """Inverted index of the Falha and Warning codes of all the log histories.
+
+    For each code, the postings are the (log index, row position) of the history lines
+    where it occurs, sorted by log and by line. The row positions are the ones of the
+    history sheet (as shown by the Análise de Logs page). Codes are sorted when possible,
+    and kept in order of first appearance otherwise (e.g. numbers mixed with texts).
+    """
+
+    COLUMNS = ["Falha", "Warning"]
+    LOG_COLUMN = "Log"
+    ROW_COLUMN = "Linha"
+    TRANSLATION_COLUMN = "Tradução"
+    OCCURRENCES_COLUMN = "Ocorrências"
+    NUMBER_OF_LOGS_COLUMN = "Logs"
+    FIRST_ROW_COLUMN = "Primeira linha"
+    LAST_ROW_COLUMN = "Última linha"
+
+    def __init__(self, logs_dataframes: dict, translations: dict = None) -> None:
+        """'logs_dataframes' maps each log index to the Falha/Warning columns of its history, and
+        'translations' maps each column to a {code: translation} dict.
+        """
+        self._logs_indexes = list(logs_dataframes.keys())
+        self._translations = translations or {}
+        self._postings = {
+            column: OccurrencesIndex.__get_column_postings(column, list(logs_dataframes.values()))
+            for column in OccurrencesIndex.COLUMNS
+        }
+
+    def get_memory_usage(self) -> int:
+        return get_memory_usage([self._postings, self._translations])
+
+    def get_logs_indexes(self) -> list:
+        return self._logs_indexes.copy()
+
+    def get_codes(self, column: str) -> list:
+        return self._postings[column]["codes"].copy()
+
+    def get_translation(self, column: str, code) -> str:
+        return self._translations.get(column, {}).get(code, "")
+
+    def find_codes(self, column: str, text: str) -> list:
+        """Return the codes of 'column' whose code or translation contains 'text' (ignoring the case)."""
+        text = text.strip().lower()
+        if not text:
+            return self.get_codes(column)
+        return [
+            code for code in self._postings[column]["codes"]
+            if text in str(code).lower() or text in str(self.get_translation(column, code)).lower()
+        ]
+
+    def get_number_of_occurrences(self, column: str, code) -> int:
+        start, stop = self.__get_code_slice(column, code)
+        return stop - start
+
+    def get_postings(self, column: str, code) -> pd.DataFrame:
+        """Return the log index and the row position of every line where 'code' occurs."""
+        postings = self._postings[column]
+        start, stop = self.__get_code_slice(column, code)
+        return pd.DataFrame({
+            OccurrencesIndex.LOG_COLUMN: np.asarray(self._logs_indexes, dtype=object)[postings["logs_positions"][start:stop]],
+            OccurrencesIndex.ROW_COLUMN: postings["rows"][start:stop],
+        })
+
+    def get_logs_summary(self, column: str, code) -> pd.DataFrame:
+        """Return, for each log where 'code' occurs, the number of occurrences and the first and last lines."""
+        postings = self._postings[column]
+        start, stop = self.__get_code_slice(column, code)
+        logs_positions = postings["logs_positions"][start:stop]
+        rows = postings["rows"][start:stop]
+        # The postings of a code are sorted by log, so each log is a contiguous run
+        unique_logs_positions, first_positions, counts = np.unique(logs_positions, return_index=True, return_counts=True)
+        return pd.DataFrame({
+            OccurrencesIndex.LOG_COLUMN: np.asarray(self._logs_indexes, dtype=object)[unique_logs_positions],
+            OccurrencesIndex.OCCURRENCES_COLUMN: counts,
+            OccurrencesIndex.FIRST_ROW_COLUMN: rows[first_positions],
+            OccurrencesIndex.LAST_ROW_COLUMN: rows[first_positions + counts - 1],
+        })
+
+    def get_codes_summary(self, column: str) -> pd.DataFrame:
+        """Return, for each code of 'column', its translation, the number of logs where it occurs and of occurrences."""
+        postings = self._postings[column]
+        codes = postings["codes"]
+        starts = postings["starts"]
+        logs_positions = postings["logs_positions"]
+        # A new (code, log) pair starts wherever the log changes or a new code starts
+        new_log_mask = np.ones(len(logs_positions), dtype=bool)
+        new_log_mask[1:] = logs_positions[1:] != logs_positions[:-1]
+        new_log_mask[starts[:-1]] = True
+        cumulative_new_logs = np.concatenate([[0], np.cumsum(new_log_mask)])
+        return pd.DataFrame({
+            column: codes,
+            OccurrencesIndex.TRANSLATION_COLUMN: [self.get_translation(column, code) for code in codes],
+            OccurrencesIndex.NUMBER_OF_LOGS_COLUMN: cumulative_new_logs[starts[1:]] - cumulative_new_logs[starts[:-1]],
+            OccurrencesIndex.OCCURRENCES_COLUMN: np.diff(starts),
+        })
+
+    def __get_code_slice(self, column: str, code) -> tuple:
+        postings = self._postings[column]
+        code_position = postings["codes_positions"].get(code)
+        if code_position is None:
+            return 0, 0
+        return int(postings["starts"][code_position]), int(postings["starts"][code_position + 1])
+
+    @staticmethod
+    def __get_column_postings(column: str, logs_dataframes: list) -> dict:
+        values_list = [np.empty(0, dtype=object)]
+        logs_positions_list = [np.empty(0, dtype=np.int64)]
+        rows_list = [np.empty(0, dtype=np.int64)]
+        for log_position, dataframe in enumerate(logs_dataframes):
+            if column not in dataframe.columns:
+                continue
+            column_values = dataframe[column]
+            rows = np.flatnonzero((column_values.notna() & ~column_values.isin(["", " "])).to_numpy(dtype=bool))
+            values_list.append(column_values.to_numpy(dtype=object)[rows])
+            logs_positions_list.append(np.full(len(rows), log_position, dtype=np.int64))
+            rows_list.append(rows.astype(np.int64))
+        values = np.concatenate(values_list)
+        logs_positions = np.concatenate(logs_positions_list)
+        rows = np.concatenate(rows_list)
+
+        codes_numbers, uniques = pd.factorize(values, sort=False)
+        # Numeric codes are read as floats from the histories with empty cells
+        uniques = [int(code) if isinstance(code, float) and code.is_integer() else code for code in uniques]
+        try:
+            sorted_uniques_order = sorted(range(len(uniques)), key=lambda position: uniques[position])
+        except TypeError:
+            sorted_uniques_order = list(range(len(uniques)))
+        new_codes_numbers = np.empty(len(uniques), dtype=np.int64)
+        new_codes_numbers[sorted_uniques_order] = np.arange(len(uniques))
+        codes_numbers = new_codes_numbers[codes_numbers] if len(uniques) else codes_numbers.astype(np.int64)
+
+        # Postings are gathered log by log and line by line, so a stable sort keeps them in that order
+        order = np.argsort(codes_numbers, kind="stable")
+        codes = [uniques[position] for position in sorted_uniques_order]
+        return {
+            "codes": codes,
+            "codes_positions": {code: code_position for code_position, code in enumerate(codes)},
+            "starts": np.searchsorted(codes_numbers[order], np.arange(len(codes) + 1)),
+            "logs_positions": logs_positions[order],
+            "rows": rows[order],
+        }
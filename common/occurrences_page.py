@@ -0,0 +1,89 @@
+"""File useful to display a special page for the Falha and Warning occurrences of all the logs."""
+
+import streamlit as st
+
+from common.instrumentation import stage_tracer
+from common.occurrences_index import OccurrencesIndex
+from common.paged_table_view import PagedTableView
+from common.tables import LogLegendTable
+
+
+class OccurrencesPage:
+    """Which logs, and which lines of them, have a given Falha or Warning code.
+
+    Everything is answered by the occurrences index, so no history is loaded.
+    """
+
+    KEY_PREFIX = "occurrences"
+
+    def __init__(self, occurrences_index: OccurrencesIndex, log_table: LogLegendTable) -> None:
+        self._occurrences_index = occurrences_index
+        self._log_table = log_table
+        self.column_selected = OccurrencesIndex.COLUMNS[0]
+        self.code_selected = None
+
+    def show_page_header(self) -> None:
+        st.header("Ocorrências de Falha e Warning em todos os logs")
+
+    @stage_tracer.traced()
+    def show_column_selection(self) -> None:
+        self.column_selected = st.radio(
+            "Tipo de ocorrência:", OccurrencesIndex.COLUMNS, horizontal=True, key=OccurrencesPage.KEY_PREFIX + "_column"
+        )
+
+    @stage_tracer.traced()
+    def show_codes_summary(self) -> None:
+        st.write("\nQuantidade de logs e de ocorrências por {}".format(self.column_selected))
+        st.dataframe(self._occurrences_index.get_codes_summary(self.column_selected))
+
+    @stage_tracer.traced()
+    def show_code_selection(self) -> None:
+        search_text = st.text_input(
+            "Buscar código ou tradução:", key="{}_{}_search".format(OccurrencesPage.KEY_PREFIX, self.column_selected)
+        )
+        codes = self._occurrences_index.find_codes(self.column_selected, search_text)
+        if not codes:
+            st.write("Nenhum código encontrado.")
+            self.code_selected = None
+            return
+        self.code_selected = st.selectbox(
+            "Filtro de {}:".format(self.column_selected),
+            codes,
+            format_func=self.__get_code_label,
+            key="{}_{}_code".format(OccurrencesPage.KEY_PREFIX, self.column_selected),
+        )
+
+    def __get_code_label(self, code) -> str:
+        translation = self._occurrences_index.get_translation(self.column_selected, code)
+        return "{} - {}".format(code, translation) if translation else str(code)
+
+    @stage_tracer.traced()
+    def show_logs_summary(self) -> None:
+        logs_summary = self._occurrences_index.get_logs_summary(self.column_selected, self.code_selected)
+        stage_tracer.set_rows(len(logs_summary))
+        logs_summary.insert(
+            1, LogLegendTable.COLUMN_FILES, self._log_table.get_log_names_by_indexes(logs_summary[OccurrencesIndex.LOG_COLUMN])
+        )
+        st.write("\nLogs com {} {}".format(self.column_selected, self.code_selected))
+        st.dataframe(logs_summary)
+
+    @stage_tracer.traced()
+    def show_postings(self) -> None:
+        postings = self._occurrences_index.get_postings(self.column_selected, self.code_selected)
+        stage_tracer.set_rows(len(postings))
+        st.write("\nLinhas com {} {} (utilize a Análise de Logs para ver as linhas vizinhas)".format(
+            self.column_selected, self.code_selected
+        ))
+        PagedTableView(
+            postings, key="{}_{}_postings".format(OccurrencesPage.KEY_PREFIX, self.column_selected), view_state=(self.code_selected,)
+        ).show()
+
+    @stage_tracer.traced()
+    def show_page(self) -> None:
+        self.show_page_header()
+        self.show_column_selection()
+        self.show_codes_summary()
+        self.show_code_selection()
+        if self.code_selected is not None:
+            self.show_logs_summary()
+            self.show_postings()
@@ -0,0 +1,101 @@
+"""File useful to render only the page selected by the user."""
+
+import weakref
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+
+class PageDispatcher:
+    """Group of pages shown as tabs, where only the selected page is computed.
+
+    'st.tabs' runs the code of every tab on each rerun, even the hidden ones.
+    In the lazy mode the tabs are replaced by a horizontal radio, so the
+    filtering, totals and charts of the hidden pages are skipped. The widgets
+    state of the hidden pages is kept, and the pages keep their last results
+    (see 'LastPageResults'), so they show the same result when opened again.
+    """
+
+    def __init__(self, key: str) -> None:
+        self._key = key
+        self._pages = {}
+        self._key_prefixes = {}
+
+    def add_page(self, label: str, show_page, key_prefixes: tuple = ()) -> None:
+        """Register the 'show_page' callable under 'label'.
+
+        'key_prefixes' are the prefixes of the widget keys created by the page, if any.
+        """
+        self._pages[label] = show_page
+        self._key_prefixes[label] = tuple(key_prefixes)
+
+    def get_key_prefixes(self) -> tuple:
+        """Return the prefixes of all the widget keys created by this dispatcher and its pages."""
+        key_prefixes = [self._key]
+        for page_key_prefixes in self._key_prefixes.values():
+            key_prefixes.extend(page_key_prefixes)
+        return tuple(key_prefixes)
+
+    def show(self, lazy: bool = True) -> None:
+        if lazy:
+            self.__show_selected_page()
+        else:
+            self.__show_all_pages()
+
+    def __show_all_pages(self) -> None:
+        tabs = st.tabs(list(self._pages.keys()))
+        for tab, show_page in zip(tabs, self._pages.values()):
+            with tab:
+                show_page()
+
+    def __show_selected_page(self) -> None:
+        labels = list(self._pages.keys())
+        selected_label = st.radio(
+            self._key, labels, horizontal=True, key=self._key, label_visibility="collapsed"
+        )
+        self.__keep_hidden_pages_widgets_state(selected_label)
+        self._pages[selected_label]()
+
+    def __keep_hidden_pages_widgets_state(self, selected_label: str) -> None:
+        """Workaround to avoid Streamlit from dropping the state of widgets not rendered in this rerun."""
+        hidden_key_prefixes = []
+        for label, key_prefixes in self._key_prefixes.items():
+            if label != selected_label:
+                hidden_key_prefixes.extend(key_prefixes)
+        if not hidden_key_prefixes:
+            return
+        for key in list(st.session_state.keys()):
+            if isinstance(key, str) and key.startswith(tuple(hidden_key_prefixes)):
+                st.session_state[key] = st.session_state[key]
+
+
+class LastPageResults:
+    """Last value of each view of one page (e.g. its totalized table), kept in the session.
+
+    A hidden page opened again with the same filters shows these values, without asking
+    the workbook for them (its state views may have been evicted meanwhile by other pages or sessions).
+    Only one value per view name is kept, and all of them are dropped when the page shows another data source.
+    """
+
+    def __init__(self, key_prefix: str, data_source) -> None:
+        self._key = key_prefix + "_last_results"
+        self._data_source = data_source
+
+    def get(self, view_key: tuple, get_view):
+        """Return the view 'view_key' (its first item being the view name), calling 'get_view()' only when
+        the last value of that view was computed for another key.
+        """
+        if get_script_run_ctx() is None:
+            # Outside a session (e.g. in the precompute thread), there is no page to keep results for
+            return get_view()
+        last_results = st.session_state.get(self._key)
+        if last_results is None or last_results["data_source"]() is not self._data_source:
+            last_results = {"data_source": weakref.ref(self._data_source), "views": {}}
+            st.session_state[self._key] = last_results
+        view_name = view_key[0]
+        last_view = last_results["views"].get(view_name)
+        if last_view is not None and last_view[0] == view_key:
+            return last_view[1]
+        view = get_view()
+        last_results["views"][view_name] = (view_key, view)
+        return view
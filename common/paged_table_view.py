@@ -0,0 +1,113 @@
+"""File useful to display long tables one page at a time."""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+
+class PagedTableView:
+    """Server side paging of a DataFrame, so only the visible rows are sent to the browser.
+
+    Supports sorting by a column, jumping to a row of the original table and jumping
+    to the next highlighted row (e.g. the next line with a Falha or a Warning).
+    The sort orders are computed once per table: they are kept by 'get_cached_sort_order(key, builder)',
+    or by the view itself when it is omitted.
+    The page position goes back to the first row when 'view_state' (a hashable description
+    of how the table was filtered), the sort or the page size changes.
+    """
+
+    PAGE_SIZE_OPTIONS = [50, 100, 250, 500, 1000]
+    ORIGINAL_ORDER = "(ordem original)"
+
+    def __init__(
+        self, dataframe: pd.DataFrame, key: str, highlight_mask: np.ndarray = None, get_cached_sort_order=None,
+        view_state: tuple = (),
+    ) -> None:
+        self._dataframe = dataframe
+        self._key = key
+        if highlight_mask is None:
+            highlight_mask = np.zeros(len(dataframe), dtype=bool)
+        self._highlight_mask = np.asarray(highlight_mask, dtype=bool)
+        self._sort_orders = {}
+        self._get_cached_sort_order = self.__get_cached_sort_order if get_cached_sort_order is None else get_cached_sort_order
+        self._view_state = view_state
+        self._first_row_key = key + "_first_row"
+        self._first_row_state_key = key + "_first_row_state"
+
+    def get_sort_order(self, column, ascending: bool) -> np.ndarray:
+        """Return the rows positions sorted by 'column' (the original order if 'column' is None)."""
+        if column is None:
+            return np.arange(len(self._dataframe))
+        return self._get_cached_sort_order((column, ascending), lambda: self.__compute_sort_order(column, ascending))
+
+    def __get_cached_sort_order(self, key: tuple, builder) -> np.ndarray:
+        if key not in self._sort_orders:
+            self._sort_orders[key] = builder()
+        return self._sort_orders[key]
+
+    def __compute_sort_order(self, column, ascending: bool) -> np.ndarray:
+        column_values = self._dataframe[column].reset_index(drop=True)
+        try:
+            sorted_values = column_values.sort_values(ascending=ascending, kind="stable", na_position="last")
+        except TypeError:
+            sorted_values = column_values.astype(str).sort_values(ascending=ascending, kind="stable")
+        return sorted_values.index.to_numpy()
+
+    def show(self) -> None:
+        number_of_rows = len(self._dataframe)
+        sort_col, order_col, page_size_col = st.columns(3)
+        with sort_col:
+            sort_column = st.selectbox(
+                "Ordenar por:", [PagedTableView.ORIGINAL_ORDER] + list(self._dataframe.columns), key=self._key + "_sort"
+            )
+        with order_col:
+            ascending = st.checkbox("Ordem crescente", value=True, key=self._key + "_ascending")
+        with page_size_col:
+            page_size = st.selectbox("Linhas por página:", PagedTableView.PAGE_SIZE_OPTIONS, index=1, key=self._key + "_page_size")
+        if sort_column == PagedTableView.ORIGINAL_ORDER:
+            sort_column = None
+        sort_order = self.get_sort_order(sort_column, ascending)
+
+        first_row_state = (self._view_state, sort_column, ascending, page_size)
+        if self._first_row_key not in st.session_state or st.session_state.get(self._first_row_state_key) != first_row_state:
+            st.session_state[self._first_row_key] = 0
+            st.session_state[self._first_row_state_key] = first_row_state
+
+        previous_col, next_col, highlight_col, jump_col = st.columns(4)
+        with previous_col:
+            st.button("Página anterior", key=self._key + "_previous", on_click=self.__move_first_row, args=(-page_size, number_of_rows))
+        with next_col:
+            st.button("Próxima página", key=self._key + "_next", on_click=self.__move_first_row, args=(page_size, number_of_rows))
+        with highlight_col:
+            st.button(
+                "Próxima Falha/Warning",
+                key=self._key + "_next_highlight",
+                on_click=self.__go_to_next_highlighted_row,
+                args=(sort_order,),
+            )
+        with jump_col:
+            st.number_input("Ir para a linha:", min_value=0, value=0, step=1, key=self._key + "_jump_row")
+            st.button("Ir", key=self._key + "_jump", on_click=self.__go_to_row, args=(sort_order,))
+
+        first_row = min(st.session_state.get(self._first_row_key, 0), max(number_of_rows - 1, 0))
+        last_row = min(first_row + page_size, number_of_rows)
+        st.caption("Linhas {} a {} de {}".format(first_row + 1 if number_of_rows else 0, last_row, number_of_rows))
+        st.dataframe(self._dataframe.iloc[sort_order[first_row:last_row]].astype(str))
+
+    def __move_first_row(self, number_of_rows_to_move: int, number_of_rows: int) -> None:
+        first_row = st.session_state[self._first_row_key] + number_of_rows_to_move
+        st.session_state[self._first_row_key] = min(max(first_row, 0), max(number_of_rows - 1, 0))
+
+    def __go_to_next_highlighted_row(self, sort_order: np.ndarray) -> None:
+        highlighted_rows = np.flatnonzero(self._highlight_mask[sort_order])
+        next_rows = highlighted_rows[highlighted_rows > st.session_state[self._first_row_key]]
+        if len(next_rows):
+            st.session_state[self._first_row_key] = int(next_rows[0])
+        elif len(highlighted_rows):
+            st.session_state[self._first_row_key] = int(highlighted_rows[0])
+
+    def __go_to_row(self, sort_order: np.ndarray) -> None:
+        row_label = st.session_state[self._key + "_jump_row"]
+        row_positions = np.flatnonzero(self._dataframe.index.to_numpy() == row_label)
+        if len(row_positions):
+            st.session_state[self._first_row_key] = int(np.flatnonzero(sort_order == row_positions[0])[0])
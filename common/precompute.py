@@ -0,0 +1,73 @@
+"""File useful to compute the statistics pages in background, right after an upload."""
+
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from common.log_statistics_page import (
+    mA_StatisticsPage,
+    kV_StatisticsPage,
+    ms_StatisticsPage,
+    Failure_StatisticsPage,
+    Warning_StatisticsPage,
+    Exposition_StatisticsPage,
+)
+from common.tables import StatisticsTables
+
+
+class DerivedViewsPrecomputer:
+    """Pool of background threads that compute the derived views of every statistics page in its default state.
+
+    The data methods of each page are called with the default filters, without any
+    widget, and the views they compute (totals, chart data, Exposição cube and histogram)
+    are stored in the workbook. The same views asked by the pages shown to the user are
+    then read, or waited for when not ready yet. The index of the Falha and Warning
+    occurrences of the histories is also built.
+    """
+
+    THREAD_NAME_PREFIX = "derived_views_precompute"
+    STATISTICS_PAGES = [
+        (mA_StatisticsPage, "mA_table"),
+        (kV_StatisticsPage, "kV_table"),
+        (ms_StatisticsPage, "ms_table"),
+        (Failure_StatisticsPage, "failure_table"),
+        (Warning_StatisticsPage, "warning_table"),
+        (Exposition_StatisticsPage, "exposition_table"),
+    ]
+
+    def __init__(self, max_workers: int = 2) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=DerivedViewsPrecomputer.THREAD_NAME_PREFIX)
+        self._submitted_workbooks = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def submit(self, statistics: StatisticsTables) -> list:
+        """Start computing the pages of 'statistics', once per workbook. Return the futures of the pages."""
+        with self._lock:
+            if statistics.workbook in self._submitted_workbooks:
+                return []
+            self._submitted_workbooks.add(statistics.workbook)
+        futures = [
+            self._executor.submit(DerivedViewsPrecomputer.__compute_page, page_class, getattr(statistics, table_name), statistics.log_table)
+            for page_class, table_name in DerivedViewsPrecomputer.STATISTICS_PAGES
+        ]
+        futures.append(self._executor.submit(DerivedViewsPrecomputer.__compute_occurrences_index, statistics))
+        return futures
+
+    @staticmethod
+    def __compute_page(page_class, statistics_table, log_table) -> None:
+        try:
+            page_class(statistics_table, log_table).compute_default_views()
+        except Exception:
+            # The page shown to the user computes the views again and reports the error
+            logging.getLogger(__name__).debug("Precomputation of %s failed", page_class.__name__, exc_info=True)
+
+    @staticmethod
+    def __compute_occurrences_index(statistics: StatisticsTables) -> None:
+        try:
+            statistics.get_occurrences_index()
+        except Exception:
+            logging.getLogger(__name__).debug("Precomputation of the occurrences index failed", exc_info=True)
+
+
+derived_views_precomputer = DerivedViewsPrecomputer()
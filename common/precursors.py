@@ -0,0 +1,175 @@
+"""File useful to find the events and exposure parameters that usually come before each failure."""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from common.memory_usage import get_memory_usage
+
+
+def mine_log_precursors(history: pd.DataFrame, target_column: str, precursor_columns: list, window: int) -> tuple:
+    """Count the precursors of the codes of 'target_column' in one log history. Runs inside the worker processes.
+
+    Return the number of occurrences of each code, and, per precursor column, the number
+    of occurrences of each code having each value in the 'window' lines before it.
+    A value repeated in the window of an occurrence is counted once.
+    """
+    target_positions = np.flatnonzero(PrecursorMiner.get_events_mask(history, target_column))
+    target_codes, target_values = pd.factorize(history[target_column].to_numpy(dtype=object)[target_positions])
+    occurrences = pd.Series(np.bincount(target_codes, minlength=len(target_values)), index=pd.Index(target_values, dtype=object))
+
+    # Line before each occurrence, one column per shift: (occurrences, window)
+    preceding_positions = target_positions[:, np.newaxis] - np.arange(1, window + 1)[np.newaxis, :]
+    valid_mask = preceding_positions >= 0
+    preceding_positions = np.where(valid_mask, preceding_positions, 0)
+
+    precursors_counts = {}
+    for column in precursor_columns:
+        if column not in history.columns:
+            continue
+        values_codes, values = pd.factorize(history[column].where(PrecursorMiner.get_events_mask(history, column)))
+        number_of_values = max(len(values), 1)
+        window_codes = np.where(valid_mask, values_codes[preceding_positions], -1)
+        # Sorting each window puts the repeated values side by side, so only the first one is counted
+        window_codes.sort(axis=1)
+        first_value_mask = window_codes >= 0
+        first_value_mask[:, 1:] &= window_codes[:, 1:] != window_codes[:, :-1]
+        pairs_target_codes = np.broadcast_to(target_codes[:, np.newaxis], window_codes.shape)[first_value_mask]
+        pairs_keys = pairs_target_codes.astype(np.int64) * number_of_values + window_codes[first_value_mask]
+        unique_pairs_keys, counts = np.unique(pairs_keys, return_counts=True)
+        precursors_counts[column] = pd.Series(counts, index=pd.MultiIndex.from_arrays([
+            np.asarray(target_values, dtype=object)[unique_pairs_keys // number_of_values],
+            np.asarray(values, dtype=object)[unique_pairs_keys % number_of_values],
+        ]))
+    return occurrences, precursors_counts
+
+
+class PrecursorAnalysis:
+    """Most frequent precursors of each code of 'target_column', over all the logs."""
+
+    CODE_COLUMN = "Código"
+    OCCURRENCES_COLUMN = "Ocorrências"
+    PRECEDED_OCCURRENCES_COLUMN = "Ocorrências precedidas"
+    PERCENTAGE_COLUMN = "% das ocorrências"
+
+    def __init__(self, target_column: str, window: int, occurrences: pd.Series, precursors_counts: dict) -> None:
+        self._target_column = target_column
+        self._window = window
+        self._occurrences = occurrences.sort_values(ascending=False, kind="stable")
+        self._precursors_counts = precursors_counts
+
+    def get_memory_usage(self) -> int:
+        return get_memory_usage([self._occurrences, self._precursors_counts])
+
+    def get_target_column(self) -> str:
+        return self._target_column
+
+    def get_window(self) -> int:
+        return self._window
+
+    def get_precursor_columns(self) -> list:
+        return list(self._precursors_counts.keys())
+
+    def get_codes(self) -> list:
+        """Return the codes of the target column, the most frequent first."""
+        return self._occurrences.index.to_list()
+
+    def get_numbers_of_occurrences(self) -> dict:
+        """Return the number of occurrences of each code, the most frequent first."""
+        return self._occurrences.to_dict()
+
+    def get_occurrences(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            PrecursorAnalysis.CODE_COLUMN: self._occurrences.index,
+            PrecursorAnalysis.OCCURRENCES_COLUMN: self._occurrences.to_numpy(),
+        })
+
+    def get_precursors(self, code, column: str, number_of_values: int = 10) -> pd.DataFrame:
+        """Return the 'number_of_values' values of 'column' found most often in the window before 'code'."""
+        column_counts = self._precursors_counts.get(column)
+        if column_counts is None or code not in column_counts.index.get_level_values(0):
+            return pd.DataFrame(columns=[column, PrecursorAnalysis.PRECEDED_OCCURRENCES_COLUMN, PrecursorAnalysis.PERCENTAGE_COLUMN])
+        code_counts = column_counts.xs(code, level=0).sort_values(ascending=False, kind="stable").head(number_of_values)
+        return pd.DataFrame({
+            column: code_counts.index,
+            PrecursorAnalysis.PRECEDED_OCCURRENCES_COLUMN: code_counts.to_numpy(),
+            PrecursorAnalysis.PERCENTAGE_COLUMN: np.round(100 * code_counts.to_numpy() / self._occurrences[code], 1),
+        })
+
+
+class PrecursorMiner:
+    """Batch analysis of the precursors of the failures, over every log history at once.
+
+    Only the target and the precursor columns of the histories are read, 'LOGS_PER_BATCH'
+    logs at a time, and the logs of the large batches are mined by a pool of worker processes.
+    The counts of all the logs are summed, so the lines of different logs are never taken as neighbours.
+    """
+
+    PRECURSOR_COLUMNS = ["Falha", "Warning", "Exposição", "mA", "kV", "ms", "mAs", "kW", "kJ"]
+    LOGS_PER_BATCH = 50
+    # Below this number of lines per batch, starting the worker processes takes longer than mining
+    MIN_LINES_FOR_WORKERS = 500000
+
+    def __init__(self, workbook, logs_indexes: list, max_workers: int = None) -> None:
+        self._workbook = workbook
+        self._logs_indexes = list(logs_indexes)
+        if max_workers is None:
+            max_workers = max(min(len(self._logs_indexes), os.cpu_count() or 1), 1)
+        self._max_workers = max_workers
+
+    @staticmethod
+    def get_events_mask(history: pd.DataFrame, column: str) -> np.ndarray:
+        """Return which lines of 'history' have a value in 'column'."""
+        column_values = history[column]
+        return (column_values.notna() & ~column_values.isin(["", " "])).to_numpy(dtype=bool)
+
+    def mine(self, target_column: str, window: int) -> PrecursorAnalysis:
+        precursor_columns = PrecursorMiner.PRECURSOR_COLUMNS
+        columns = [target_column] + [column for column in precursor_columns if column != target_column]
+        logs_results = []
+        executor = None
+        try:
+            for logs_histories in self.__iter_logs_histories(columns, target_column):
+                number_of_lines = sum(len(history) for history in logs_histories)
+                if self._max_workers == 1 or number_of_lines < PrecursorMiner.MIN_LINES_FOR_WORKERS:
+                    logs_results.extend(
+                        mine_log_precursors(history, target_column, precursor_columns, window) for history in logs_histories
+                    )
+                    continue
+                if executor is None:
+                    executor = ProcessPoolExecutor(max_workers=self._max_workers, mp_context=multiprocessing.get_context("spawn"))
+                logs_results.extend(executor.map(
+                    mine_log_precursors,
+                    logs_histories,
+                    [target_column] * len(logs_histories),
+                    [precursor_columns] * len(logs_histories),
+                    [window] * len(logs_histories),
+                ))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        occurrences = PrecursorMiner.__sum_counts([log_occurrences for log_occurrences, _ in logs_results])
+        precursors_counts = {}
+        for column in precursor_columns:
+            columns_counts = [log_counts[column] for _, log_counts in logs_results if column in log_counts]
+            if columns_counts:
+                precursors_counts[column] = PrecursorMiner.__sum_counts(columns_counts)
+        return PrecursorAnalysis(target_column, window, occurrences, precursors_counts)
+
+    def __iter_logs_histories(self, columns: list, target_column: str):
+        """Yield the lists of histories of each batch of logs, restricted to 'columns' (logs without 'target_column' are skipped)."""
+        for batch_start in range(0, len(self._logs_indexes), PrecursorMiner.LOGS_PER_BATCH):
+            batch_logs_indexes = self._logs_indexes[batch_start:batch_start + PrecursorMiner.LOGS_PER_BATCH]
+            logs_histories = self._workbook.read_sheets_columns(batch_logs_indexes, columns)
+            yield [history for history in logs_histories.values() if target_column in history.columns]
+
+    @staticmethod
+    def __sum_counts(counts_list: list) -> pd.Series:
+        counts_list = [counts for counts in counts_list if len(counts)]
+        if not counts_list:
+            return pd.Series(dtype=np.int64)
+        return pd.concat(counts_list).groupby(level=list(range(counts_list[0].index.nlevels)), sort=False).sum()
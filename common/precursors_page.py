@@ -0,0 +1,87 @@
+"""File useful to display a special page for the precursors of the Falha and Warning codes."""
+
+import streamlit as st
+
+from common.instrumentation import stage_tracer
+from common.occurrences_index import OccurrencesIndex
+from common.tables import StatisticsTables
+
+
+class PrecursorsPage:
+    """Most frequent events and exposure parameters in the lines before each Falha or Warning code, in all the logs."""
+
+    KEY_PREFIX = "precursors"
+    DEFAULT_WINDOW = 5
+    MAX_WINDOW = 100
+    NUMBER_OF_VALUES = 10
+
+    def __init__(self, statistics: StatisticsTables) -> None:
+        self._statistics = statistics
+        self.column_selected = OccurrencesIndex.COLUMNS[0]
+        self.window = PrecursorsPage.DEFAULT_WINDOW
+        self.precursor_analysis = None
+        self.code_selected = None
+
+    def show_page_header(self) -> None:
+        st.header("Precursores de Falha e Warning em todos os logs")
+
+    @stage_tracer.traced()
+    def show_analysis_selection(self) -> None:
+        column_col, window_col = st.columns(2)
+        with column_col:
+            self.column_selected = st.radio(
+                "Analisar os precursores de:", OccurrencesIndex.COLUMNS, horizontal=True, key=PrecursorsPage.KEY_PREFIX + "_column"
+            )
+        with window_col:
+            self.window = int(st.number_input(
+                "Número de linhas anteriores analisadas:",
+                min_value=1,
+                max_value=PrecursorsPage.MAX_WINDOW,
+                value=PrecursorsPage.DEFAULT_WINDOW,
+                key=PrecursorsPage.KEY_PREFIX + "_window",
+            ))
+        with st.spinner("Analisando os históricos de todos os logs..."):
+            self.precursor_analysis = self._statistics.get_precursor_analysis(self.column_selected, self.window)
+
+    @stage_tracer.traced()
+    def show_code_selection(self) -> None:
+        codes = self.precursor_analysis.get_codes()
+        if not codes:
+            st.write("Nenhuma ocorrência de {} nos históricos.".format(self.column_selected))
+            self.code_selected = None
+            return
+        translations = self._statistics.get_translations().get(self.column_selected, {})
+        codes_labels = {
+            code: PrecursorsPage.__get_code_label(code, translations.get(code, ""), number_of_occurrences)
+            for code, number_of_occurrences in self.precursor_analysis.get_numbers_of_occurrences().items()
+        }
+        self.code_selected = st.selectbox(
+            "Filtro de {} (os mais frequentes primeiro):".format(self.column_selected),
+            codes,
+            format_func=lambda code: codes_labels[code],
+            key="{}_{}_code".format(PrecursorsPage.KEY_PREFIX, self.column_selected),
+        )
+
+    @staticmethod
+    def __get_code_label(code, translation: str, number_of_occurrences: int) -> str:
+        label = "{} - {}".format(code, translation) if translation else str(code)
+        return "{} ({} ocorrências)".format(label, number_of_occurrences)
+
+    @stage_tracer.traced()
+    def show_precursors(self) -> None:
+        st.write("\nValores mais frequentes nas {} linhas anteriores a {} {}".format(
+            self.window, self.column_selected, self.code_selected
+        ))
+        precursor_columns = self.precursor_analysis.get_precursor_columns()
+        for columns in [precursor_columns[position:position + 3] for position in range(0, len(precursor_columns), 3)]:
+            for column, streamlit_column in zip(columns, st.columns(3)):
+                with streamlit_column:
+                    st.dataframe(self.precursor_analysis.get_precursors(self.code_selected, column, PrecursorsPage.NUMBER_OF_VALUES))
+
+    @stage_tracer.traced()
+    def show_page(self) -> None:
+        self.show_page_header()
+        self.show_analysis_selection()
+        self.show_code_selection()
+        if self.code_selected is not None:
+            self.show_precursors()
@@ -0,0 +1,231 @@
+"""File useful to build the statistics tables straight from the raw logs of a generator."""
+
+import csv
+import io
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from common.sidecar import SidecarStore
+from common.tables import LogLegendTable, StatisticsTables
+from common.upload_spool import UploadSpool
+from common.workbook import Workbook
+
+
+RAW_LOGS_EXTENSIONS = (".log", ".txt", ".csv")
+DELIMITERS = ";,\t|"
+
+
+def parse_raw_log(raw_log, chunk_size: int, sidecar_store: SidecarStore = None) -> tuple:
+    """Parse one raw log in chunks of 'chunk_size' lines. Runs inside the ingestion worker processes.
+
+    With a 'sidecar_store', each chunk of the history is written to it as soon as it is
+    parsed, so only one chunk is in memory, and the entry of the written sheet is returned
+    instead of the history. Return the history, its sidecar sheet entry, and, per statistics
+    sheet, the number of lines of each value and the number of lines holding a value.
+    """
+    if isinstance(raw_log, bytes):
+        raw_log = io.BytesIO(raw_log)
+    elif isinstance(raw_log, str):
+        raw_log = UploadSpool.open(raw_log)
+    statistics_tables = StatisticsTables().get_tables()[1:]
+    counts_chunks = {table.get_sheet_name(): [] for table in statistics_tables}
+    events_counts = {table.get_sheet_name(): 0 for table in statistics_tables}
+
+    def read_counted_chunks():
+        for chunk in RawLogsReader.read_chunks(raw_log, chunk_size):
+            for table in statistics_tables:
+                counts_chunks[table.get_sheet_name()].append(RawLogsReader.count_values(table, chunk))
+                events_counts[table.get_sheet_name()] += int(RawLogsReader.get_events_mask(table, chunk).sum())
+            yield chunk
+
+    history = None
+    sheet_entry = None
+    with raw_log:
+        if sidecar_store is None:
+            history_chunks = list(read_counted_chunks())
+            history = pd.concat(history_chunks, ignore_index=True) if history_chunks else pd.DataFrame()
+        else:
+            sheet_entry = sidecar_store.write_sheet_files(read_counted_chunks())
+
+    counts = {
+        sheet_name: pd.concat(sheet_counts).groupby(level=list(range(sheet_counts[0].index.nlevels))).sum()
+        for sheet_name, sheet_counts in counts_chunks.items() if sheet_counts
+    }
+    return history, sheet_entry, counts, events_counts
+
+
+class RawLogsReader:
+    """Ingestion of the raw logs of one generator, without the Excel export of the MaximusLogViewer script.
+
+    The format of the raw logs is not specified anywhere, so it is assumed: each raw log
+    is a delimited text file (the delimiter is guessed from the header line) with a header
+    line, one line per event, whose columns are named as the per-log history sheets of the
+    export (Falha, Warning, mA, kV, ms, Exposição, ...). Logs written otherwise are not read.
+
+    The logs are parsed in parallel worker processes, each one in chunks streamed to the
+    sidecar, and every statistics sheet counts, per log, the lines holding each value of
+    its key and sub-key columns.
+    """
+
+    DEFAULT_CHUNK_SIZE = 100000
+    # Stands for the empty sub-key values while counting, as NaN keys do not match each other
+    MISSING_SUB_KEY = "\x00"
+
+    @staticmethod
+    def get_raw_logs(uploaded_files: list, upload_spool: UploadSpool) -> dict:
+        """Return the raw logs (name -> path in 'upload_spool') of 'uploaded_files', extracting the zip files.
+
+        The logs of a zip file are named by the zip file name plus their path inside it,
+        and a name given twice gets a " (2)", " (3)", ... suffix, so no log replaces another.
+        """
+        raw_logs = {}
+        for uploaded_file in uploaded_files:
+            if uploaded_file.name.lower().endswith(".zip"):
+                with UploadSpool.open(upload_spool.spool(uploaded_file)) as zip_bytes, zipfile.ZipFile(zip_bytes) as zip_file:
+                    for file_name in zip_file.namelist():
+                        if file_name.lower().endswith(RAW_LOGS_EXTENSIONS):
+                            with zip_file.open(file_name) as raw_log:
+                                log_name = RawLogsReader.get_unique_name("{}/{}".format(uploaded_file.name, file_name), raw_logs)
+                                raw_logs[log_name] = upload_spool.spool(raw_log)
+            elif uploaded_file.name.lower().endswith(RAW_LOGS_EXTENSIONS):
+                raw_logs[RawLogsReader.get_unique_name(uploaded_file.name, raw_logs)] = upload_spool.spool(uploaded_file)
+        return raw_logs
+
+    @staticmethod
+    def get_unique_name(name: str, names) -> str:
+        """Return 'name', with a " (2)", " (3)", ... suffix if it is already in 'names'."""
+        unique_name = name
+        number = 2
+        while unique_name in names:
+            unique_name = "{} ({})".format(name, number)
+            number += 1
+        return unique_name
+
+    @staticmethod
+    def get_folder_raw_logs(folder: str) -> dict:
+        """Return the raw logs (name -> path) found in 'folder' and its sub folders."""
+        raw_logs = {}
+        for directory, _, file_names in os.walk(folder):
+            for file_name in file_names:
+                if file_name.lower().endswith(RAW_LOGS_EXTENSIONS):
+                    file_path = os.path.join(directory, file_name)
+                    raw_logs[os.path.relpath(file_path, folder)] = file_path
+        return raw_logs
+
+    @staticmethod
+    def get_delimiter(header_line: bytes) -> str:
+        header = header_line.decode("utf-8", errors="replace")
+        try:
+            return csv.Sniffer().sniff(header, delimiters=DELIMITERS).delimiter
+        except csv.Error:
+            return ","
+
+    @staticmethod
+    def read_chunks(raw_log, chunk_size: int):
+        """Yield the lines of the opened 'raw_log' as DataFrames of 'chunk_size' lines."""
+        delimiter = RawLogsReader.get_delimiter(raw_log.readline())
+        raw_log.seek(0)
+        yield from pd.read_csv(
+            raw_log,
+            sep=delimiter,
+            decimal="," if delimiter == ";" else ".",
+            chunksize=chunk_size,
+            encoding_errors="replace",
+            skipinitialspace=True,
+        )
+
+    @staticmethod
+    def get_events_mask(table, history: pd.DataFrame) -> pd.Series:
+        """Return which lines of 'history' hold a value in the key column of 'table'."""
+        if table.get_key_column() not in history.columns:
+            return pd.Series(False, index=history.index)
+        key_values = history[table.get_key_column()]
+        return key_values.notna() & ~key_values.isin(["", " "])
+
+    @staticmethod
+    def count_values(table, history: pd.DataFrame) -> pd.Series:
+        """Return the number of lines of 'history' holding each value of the main columns of 'table'.
+
+        Empty sub-key values are counted as 'MISSING_SUB_KEY'.
+        """
+        main_columns = [table.get_key_column()] + table.get_sub_key_columns()
+        dataframe = history.loc[RawLogsReader.get_events_mask(table, history)].reindex(columns=main_columns)
+        for column in table.get_sub_key_columns():
+            dataframe[column] = dataframe[column].astype(object).fillna(RawLogsReader.MISSING_SUB_KEY)
+        return dataframe.groupby(main_columns).size()
+
+    @staticmethod
+    def ingest(
+        raw_logs: dict, content_hash: str = "", max_workers: int = None, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Workbook:
+        """Parse every raw log of 'raw_logs' (name -> bytes or path) and return a workbook with the same
+        sheets of an export: the legend, the statistics sheets, and one history sheet per log.
+
+        With a 'content_hash', the histories are streamed to its sidecar by the workers and
+        are read from there column by column, otherwise they are returned whole.
+        """
+        logs_names = sorted(raw_logs.keys())
+        if max_workers is None:
+            max_workers = max(min(len(logs_names), os.cpu_count() or 1), 1)
+        sidecar_store = SidecarStore(content_hash) if content_hash else None
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            parsed_logs = list(executor.map(
+                parse_raw_log,
+                [raw_logs[log_name] for log_name in logs_names],
+                [chunk_size] * len(logs_names),
+                [sidecar_store] * len(logs_names),
+            ))
+
+        workbook = Workbook(None, content_hash, sidecar_store)
+        statistics = StatisticsTables()
+        logs_indexes = list(range(1, len(logs_names) + 1))
+        workbook.add_sheet(statistics.log_table.get_sheet_name(), pd.DataFrame({
+            LogLegendTable.COLUMN_INDEXES: logs_indexes,
+            LogLegendTable.COLUMN_FILES: logs_names,
+        }))
+        for table in statistics.get_tables()[1:]:
+            logs_counts = {
+                log_index: counts[table.get_sheet_name()]
+                for log_index, (_, _, counts, _) in zip(logs_indexes, parsed_logs)
+            }
+            logs_events_counts = {
+                log_index: events_counts[table.get_sheet_name()]
+                for log_index, (_, _, _, events_counts) in zip(logs_indexes, parsed_logs)
+            }
+            workbook.add_sheet(table.get_sheet_name(), RawLogsReader.__get_statistics_sheet(table, logs_counts, logs_events_counts))
+        for log_index, (history, sheet_entry, _, _) in zip(logs_indexes, parsed_logs):
+            if sheet_entry is None:
+                workbook.add_sheet(log_index, history)
+            else:
+                sidecar_store.register_sheet(log_index, sheet_entry, replace=True)
+        return workbook
+
+    @staticmethod
+    def __get_statistics_sheet(table, logs_counts: dict, logs_events_counts: dict) -> pd.DataFrame:
+        """Put the counts of every log side by side, checking that each log keeps its number of lines with a value."""
+        main_columns = [table.get_key_column()] + table.get_sub_key_columns()
+        total_column = table.get_total_column()
+        logs_indexes = list(logs_counts.keys())
+        if logs_counts:
+            dataframe = pd.concat(logs_counts, axis="columns").fillna(0).astype(np.int64).reset_index()
+        else:
+            dataframe = pd.DataFrame(columns=main_columns)
+        dataframe.columns = main_columns + logs_indexes
+        for column in table.get_sub_key_columns():
+            dataframe[column] = dataframe[column].replace(RawLogsReader.MISSING_SUB_KEY, np.nan).infer_objects()
+        dataframe[total_column] = dataframe[logs_indexes].sum(axis="columns").astype(np.int64)
+
+        for log_index in logs_indexes:
+            if dataframe[log_index].sum() != logs_events_counts[log_index]:
+                raise ValueError("The {} counts of the log {} do not match its history: {} lines counted, {} lines with a value".format(
+                    table.get_sheet_name(), log_index, dataframe[log_index].sum(), logs_events_counts[log_index]
+                ))
+
+        total_line = {column: dataframe[column].sum() for column in logs_indexes + [total_column]}
+        total_line[table.get_key_column()] = total_column
+        return pd.concat([dataframe, pd.DataFrame([total_line])], ignore_index=True)
@@ -0,0 +1,104 @@
+"""File useful to give the sheets compact column types when they are loaded."""
+
+import numpy as np
+import pandas as pd
+
+
+class SheetSchema:
+    """Column types of one sheet, applied when the sheet is loaded.
+
+    - CATEGORY: categorical column, for codes and texts with few distinct values.
+    - COUNT: smallest integer type holding the values (nullable when there are empty cells).
+    - NUMBER: smallest integer type when all the values are integers, float64 otherwise.
+
+    Columns not listed get 'default_type' (kept as read if None). Columns that are
+    not numeric are kept as read when a numeric type is asked for them.
+    When 'total_key_column' is given, the lines holding TOTAL in that column are
+    removed from the data and kept apart, as the total line of the sheet.
+    """
+
+    CATEGORY = "category"
+    COUNT = "count"
+    NUMBER = "number"
+
+    TOTAL_VALUE = "TOTAL"
+
+    def __init__(self, columns_types: dict, default_type: str = None, total_key_column: str = None) -> None:
+        self._columns_types = columns_types
+        self._default_type = default_type
+        self._total_key_column = total_key_column
+
+    def get_total_key_column(self) -> str:
+        return self._total_key_column
+
+    def get_column_type(self, column) -> str:
+        return self._columns_types.get(column, self._default_type)
+
+    def get_data_rows_mask(self, dataframe: pd.DataFrame) -> np.ndarray:
+        """Return a boolean array telling which rows of 'dataframe' are not total lines."""
+        if self._total_key_column is None or self._total_key_column not in dataframe.columns:
+            return np.ones(len(dataframe), dtype=bool)
+        return (dataframe[self._total_key_column] != SheetSchema.TOTAL_VALUE).to_numpy(dtype=bool)
+
+    def get_total_line(self, dataframe: pd.DataFrame, data_rows_mask: np.ndarray) -> dict:
+        total_lines = dataframe[~data_rows_mask]
+        if len(total_lines) == 0:
+            return {}
+        return total_lines.iloc[0].to_dict()
+
+    def apply(self, dataframe: pd.DataFrame, data_rows_mask: np.ndarray = None) -> pd.DataFrame:
+        """Return the rows of 'dataframe' in 'data_rows_mask' (the ones that are not total lines if omitted),
+        with the columns converted to their types.
+        """
+        if data_rows_mask is None:
+            data_rows_mask = self.get_data_rows_mask(dataframe)
+        if not data_rows_mask.all():
+            dataframe = dataframe[data_rows_mask]
+        return pd.DataFrame(
+            {column: self.convert_column(column, dataframe[column]) for column in dataframe.columns},
+            index=pd.RangeIndex(len(dataframe)),
+            columns=dataframe.columns,
+        )
+
+    def convert_column(self, column, column_values: pd.Series) -> pd.Series:
+        column_type = self.get_column_type(column)
+        column_values = column_values.reset_index(drop=True)
+        if column_type is None:
+            return column_values
+        if column_type == SheetSchema.CATEGORY:
+            return column_values.astype("category")
+        numeric_values = SheetSchema.__to_numeric(column_values)
+        if numeric_values is None:
+            return column_values
+        if column_type == SheetSchema.COUNT:
+            return SheetSchema.__to_smallest_integer(numeric_values, nullable=True)
+        return SheetSchema.__to_smallest_integer(numeric_values, nullable=False)
+
+    @staticmethod
+    def __to_numeric(column_values: pd.Series) -> pd.Series:
+        if pd.api.types.is_bool_dtype(column_values.dtype):
+            return None
+        if pd.api.types.is_numeric_dtype(column_values.dtype):
+            return column_values
+        try:
+            return pd.to_numeric(column_values)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def __to_smallest_integer(numeric_values: pd.Series, nullable: bool) -> pd.Series:
+        values = numeric_values.to_numpy(dtype=np.float64, na_value=np.nan)
+        empty_mask = np.isnan(values)
+        valid_values = values[~empty_mask]
+        if len(valid_values) and not np.all(valid_values == np.round(valid_values)):
+            return numeric_values.astype(np.float64)
+        if empty_mask.any() and not nullable:
+            return numeric_values.astype(np.float64)
+        integer_dtype = np.result_type(
+            np.min_scalar_type(int(valid_values.min()) if len(valid_values) else 0),
+            np.min_scalar_type(int(valid_values.max()) if len(valid_values) else 0),
+        )
+        if empty_mask.any():
+            nullable_dtype = "{}{}".format("UInt" if integer_dtype.kind == "u" else "Int", integer_dtype.itemsize * 8)
+            return pd.Series(values).astype(nullable_dtype)
+        return pd.Series(values.astype(integer_dtype))
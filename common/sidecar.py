@@ -0,0 +1,340 @@
+"""File useful to keep a columnar copy of the Excel sheets on disk."""
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+
+def get_private_directory(directory: str) -> str:
+    """Return 'directory', created readable by the current user only, if it can be trusted.
+
+    A directory owned by another user, or writable by other users, may hold files
+    planted there, so a new private temporary directory is returned instead.
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        # Windows: the temporary directory is already private to the user
+        return directory
+    directory_stat = os.lstat(directory)
+    if (
+        os.path.islink(directory)
+        or directory_stat.st_uid != os.getuid()
+        or directory_stat.st_mode & 0o022
+    ):
+        return tempfile.mkdtemp(prefix=os.path.basename(directory) + "_")
+    if directory_stat.st_mode & 0o077:
+        os.chmod(directory, 0o700)
+    return directory
+
+
+class SidecarStore:
+    """Columnar copy of one workbook, stored in a directory named by the workbook content hash.
+
+    Every sheet is a sub directory with one '.npy' file per column, described by
+    a 'manifest.json' file. Numeric and datetime columns are memory-mapped when read,
+    the other columns are stored as integer codes plus the JSON list of distinct values
+    (nothing is ever unpickled). Only the requested columns of a sheet are read.
+
+    Every store keeps the manifest it read, so its sheets do not change under it. A replaced
+    sheet is written to a new directory, and the old directory is removed only when no
+    open store of this process uses it anymore.
+    """
+
+    ROOT_DIRECTORY = get_private_directory(os.environ.get(
+        "MAXIMUS_SIDECAR_DIRECTORY", os.path.join(tempfile.gettempdir(), "maximus_log_viewer")
+    ))
+    MANIFEST_FILE = "manifest.json"
+    # Version 1 stored the distinct values as pickles, so its sidecars are converted again
+    MANIFEST_VERSION = 2
+
+    KIND_NUMERIC = "numeric"
+    KIND_DATETIME = "datetime"
+    KIND_CODES = "codes"
+
+    _lock = threading.Lock()
+    _open_stores = weakref.WeakSet()
+
+    def __init__(self, content_hash: str, root_directory: str = None) -> None:
+        if root_directory is None:
+            root_directory = SidecarStore.ROOT_DIRECTORY
+        self._directory = os.path.join(root_directory, content_hash)
+        with SidecarStore._lock:
+            self._manifest = self.__read_manifest()
+            SidecarStore._open_stores.add(self)
+
+    def get_directory(self) -> str:
+        return self._directory
+
+    def has_sheet(self, sheet_name) -> bool:
+        return self.__get_sheet_entry(sheet_name) is not None
+
+    def get_sheet_names(self) -> list:
+        return [sheet_entry["sheet_name"] for sheet_entry in self._manifest["sheets"]]
+
+    def get_columns(self, sheet_name) -> list:
+        return [column_entry["name"] for column_entry in self.__get_sheet_entry(sheet_name)["columns"]]
+
+    def get_number_of_rows(self, sheet_name) -> int:
+        return self.__get_sheet_entry(sheet_name)["number_of_rows"]
+
+    def read_columns(self, sheet_name, columns: list = None) -> pd.DataFrame:
+        """Read 'columns' of 'sheet_name' (all of them if omitted), keeping the sheet columns order."""
+        sheet_entry = self.__get_sheet_entry(sheet_name)
+        if sheet_entry is None:
+            raise KeyError(sheet_name)
+        column_entries = sheet_entry["columns"]
+        if columns is not None:
+            missing_columns = [column for column in columns if column not in self.get_columns(sheet_name)]
+            if missing_columns:
+                raise KeyError(missing_columns)
+            column_entries = [column_entry for column_entry in column_entries if column_entry["name"] in columns]
+        sheet_directory = os.path.join(self._directory, sheet_entry["directory"])
+        data = {
+            column_entry["name"]: self.__read_column(sheet_directory, column_entry)
+            for column_entry in column_entries
+        }
+        return pd.DataFrame(data, index=pd.RangeIndex(sheet_entry["number_of_rows"]), columns=list(data.keys()))
+
+    def write_sheet(self, sheet_name, dataframe: pd.DataFrame, replace: bool = False) -> None:
+        """Convert 'dataframe' to the columnar format and register it in the manifest.
+
+        An existing sheet is kept as is, unless 'replace' is set.
+        """
+        self.write_sheet_chunks(sheet_name, [dataframe], replace)
+
+    def write_sheet_chunks(self, sheet_name, chunks, replace: bool = False) -> None:
+        """Same as 'write_sheet', for a sheet given as consecutive DataFrames with the same columns."""
+        with SidecarStore._lock:
+            self._manifest = self.__read_manifest()
+            if self.has_sheet(sheet_name) and not replace:
+                return
+            self.__add_sheet_entry(sheet_name, self.write_sheet_files(chunks))
+
+    def write_sheet_files(self, chunks) -> dict:
+        """Write the columns of the sheet made of the consecutive DataFrames 'chunks', without registering it.
+
+        Only one chunk is in memory at a time. Nothing but a new sheet directory is written,
+        so other processes can write sheets of the same store at once. Return the sheet
+        entry to give to 'register_sheet'.
+        """
+        os.makedirs(self._directory, exist_ok=True)
+        sheet_directory = tempfile.mkdtemp(prefix="sheet_", dir=self._directory)
+        try:
+            columns = []
+            columns_parts = []
+            number_of_rows = 0
+            for chunk_position, chunk in enumerate(chunks):
+                if chunk_position == 0:
+                    columns = list(chunk.columns)
+                    columns_parts = [[] for _ in columns]
+                for position, column in enumerate(columns):
+                    columns_parts[position].append(SidecarStore.__write_column_part(
+                        sheet_directory, "column_{}_part_{}".format(position, chunk_position), chunk[column]
+                    ))
+                number_of_rows += len(chunk)
+            column_entries = [
+                SidecarStore.__merge_column_parts(sheet_directory, "column_{}".format(position), column, column_parts, number_of_rows)
+                for position, (column, column_parts) in enumerate(zip(columns, columns_parts))
+            ]
+        except Exception:
+            shutil.rmtree(sheet_directory, ignore_errors=True)
+            raise
+        return {"directory": os.path.basename(sheet_directory), "number_of_rows": number_of_rows, "columns": column_entries}
+
+    def register_sheet(self, sheet_name, sheet_entry: dict, replace: bool = False) -> None:
+        """Register in the manifest a sheet written by 'write_sheet_files' (e.g. in another process)."""
+        with SidecarStore._lock:
+            self._manifest = self.__read_manifest()
+            if self.has_sheet(sheet_name) and not replace:
+                shutil.rmtree(os.path.join(self._directory, sheet_entry["directory"]), ignore_errors=True)
+                return
+            self.__add_sheet_entry(sheet_name, sheet_entry)
+
+    def __add_sheet_entry(self, sheet_name, sheet_entry: dict) -> None:
+        replaced_sheet_entry = self.__get_sheet_entry(sheet_name)
+        if replaced_sheet_entry is not None:
+            self._manifest["sheets"].remove(replaced_sheet_entry)
+            self._manifest["replaced_directories"].append(replaced_sheet_entry["directory"])
+        self._manifest["sheets"].append(dict(sheet_entry, sheet_name=SidecarStore.__to_json_value(sheet_name)))
+        self.__remove_unused_directories()
+        self.__write_manifest()
+
+    def __remove_unused_directories(self) -> None:
+        """Remove the directories of the replaced sheets not used by the manifest of any open store."""
+        used_directories = set()
+        for store in list(SidecarStore._open_stores):
+            if store._directory == self._directory:
+                used_directories.update(sheet_entry["directory"] for sheet_entry in store._manifest["sheets"])
+        replaced_directories = []
+        for directory in self._manifest["replaced_directories"]:
+            if directory in used_directories:
+                replaced_directories.append(directory)
+            else:
+                shutil.rmtree(os.path.join(self._directory, directory), ignore_errors=True)
+        self._manifest["replaced_directories"] = replaced_directories
+
+    def __get_sheet_entry(self, sheet_name) -> dict:
+        sheet_name = SidecarStore.__to_json_value(sheet_name)
+        for sheet_entry in self._manifest["sheets"]:
+            if sheet_entry["sheet_name"] == sheet_name and type(sheet_entry["sheet_name"]) == type(sheet_name):
+                return sheet_entry
+        return None
+
+    def __get_manifest_path(self) -> str:
+        return os.path.join(self._directory, SidecarStore.MANIFEST_FILE)
+
+    def __read_manifest(self) -> dict:
+        try:
+            with open(self.__get_manifest_path(), "r", encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            manifest = {}
+        if manifest.get("version") != SidecarStore.MANIFEST_VERSION:
+            manifest = {"version": SidecarStore.MANIFEST_VERSION, "sheets": []}
+        manifest.setdefault("replaced_directories", [])
+        return manifest
+
+    def __write_manifest(self) -> None:
+        temporary_path = self.__get_manifest_path() + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(self._manifest, manifest_file, ensure_ascii=False)
+        os.replace(temporary_path, self.__get_manifest_path())
+
+    @staticmethod
+    def __to_json_value(value):
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    @staticmethod
+    def __write_column_part(directory: str, file_name: str, series: pd.Series) -> dict:
+        """Write the values of 'series', a part of a column, and return how they are stored."""
+        column_part = {"file": file_name}
+        if series.dtype.kind in "biuf":
+            column_part["kind"] = SidecarStore.KIND_NUMERIC
+            if isinstance(series.dtype, pd.api.extensions.ExtensionDtype) and series.hasnans:
+                # Nullable columns with empty cells are stored as float, the empty cells as NaN
+                column_values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                column_values = series.to_numpy(dtype=getattr(series.dtype, "numpy_dtype", series.dtype))
+            column_part["dtype"] = str(column_values.dtype)
+        elif series.dtype.kind == "M" and getattr(series.dtype, "tz", None) is None:
+            column_part["kind"] = SidecarStore.KIND_DATETIME
+            column_part["dtype"] = str(series.dtype)
+            column_values = series.to_numpy().view("int64")
+        else:
+            column_part["kind"] = SidecarStore.KIND_CODES
+            codes, uniques = pd.factorize(series.astype(object))
+            column_part["uniques"] = list(uniques)
+            column_values = codes.astype(np.int32)
+        np.save(os.path.join(directory, file_name + ".npy"), column_values)
+        return column_part
+
+    @staticmethod
+    def __merge_column_parts(directory: str, file_name: str, column, column_parts: list, number_of_rows: int) -> dict:
+        """Merge the parts of a column in its single file, one part in memory at a time, and return its entry.
+
+        Parts of different kinds (e.g. a chunk with text in a numeric column) make a column of codes.
+        """
+        column_entry = {"name": SidecarStore.__to_json_value(column), "file": file_name}
+        kinds = set(column_part["kind"] for column_part in column_parts)
+        dtypes = set(column_part["dtype"] for column_part in column_parts if "dtype" in column_part)
+        if kinds == {SidecarStore.KIND_NUMERIC}:
+            column_entry["kind"] = SidecarStore.KIND_NUMERIC
+            dtype = np.result_type(*dtypes)
+        elif kinds == {SidecarStore.KIND_DATETIME} and len(dtypes) == 1:
+            column_entry["kind"] = SidecarStore.KIND_DATETIME
+            column_entry["dtype"] = dtypes.pop()
+            dtype = np.dtype(np.int64)
+        else:
+            column_entry["kind"] = SidecarStore.KIND_CODES
+            dtype = np.dtype(np.int32)
+        path = os.path.join(directory, file_name + ".npy")
+        if len(column_parts) == 1 and column_parts[0]["kind"] == column_entry["kind"]:
+            os.replace(os.path.join(directory, column_parts[0]["file"] + ".npy"), path)
+            uniques = column_parts[0].get("uniques", [])
+        else:
+            uniques_codes = {}
+            column_values = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(number_of_rows,))
+            position = 0
+            for column_part in column_parts:
+                part_path = os.path.join(directory, column_part["file"] + ".npy")
+                part_values = np.load(part_path)
+                if column_entry["kind"] == SidecarStore.KIND_CODES:
+                    part_values = SidecarStore.__get_merged_codes(column_part, part_values, uniques_codes)
+                column_values[position:position + len(part_values)] = part_values
+                position += len(part_values)
+                os.remove(part_path)
+            column_values.flush()
+            del column_values
+            uniques = list(uniques_codes)
+
+        if column_entry["kind"] == SidecarStore.KIND_CODES:
+            with open(os.path.join(directory, file_name + "_values.json"), "w", encoding="utf-8") as values_file:
+                json.dump([SidecarStore.__to_json_unique(value) for value in uniques], values_file, ensure_ascii=False)
+        return column_entry
+
+    @staticmethod
+    def __get_merged_codes(column_part: dict, part_values: np.ndarray, uniques_codes: dict) -> np.ndarray:
+        """Return the codes of the part values among 'uniques_codes' (value -> code), completed with its new values."""
+        if column_part["kind"] == SidecarStore.KIND_CODES:
+            codes, uniques = part_values, column_part["uniques"]
+        else:
+            if column_part["kind"] == SidecarStore.KIND_DATETIME:
+                part_values = part_values.view(column_part["dtype"])
+            codes, uniques = pd.factorize(pd.Series(part_values).astype(object).to_numpy())
+        merged_codes = np.array([uniques_codes.setdefault(value, len(uniques_codes)) for value in uniques] + [-1], dtype=np.int32)
+        # Empty values (code -1) keep the code -1, the last one of 'merged_codes'
+        return merged_codes[codes]
+
+    @staticmethod
+    def __read_column(directory: str, column_entry: dict) -> np.ndarray:
+        values = np.load(os.path.join(directory, column_entry["file"] + ".npy"), mmap_mode="r")
+        if column_entry["kind"] == SidecarStore.KIND_NUMERIC:
+            return values
+        if column_entry["kind"] == SidecarStore.KIND_DATETIME:
+            return values.view(column_entry["dtype"])
+        with open(os.path.join(directory, column_entry["file"] + "_values.json"), "r", encoding="utf-8") as values_file:
+            json_uniques = json.load(values_file)
+        uniques = np.empty(len(json_uniques), dtype=object)
+        uniques[:] = [SidecarStore.__from_json_unique(value) for value in json_uniques]
+        column = np.full(len(values), np.nan, dtype=object)
+        valid_codes = values >= 0
+        column[valid_codes] = uniques[values[valid_codes]]
+        return column
+
+    @staticmethod
+    def __to_json_unique(value):
+        """Return a JSON value standing for 'value', tagging the types JSON does not have."""
+        if isinstance(value, np.generic):
+            value = value.item()
+        if value is None or isinstance(value, (str, bool, int, float)):
+            return value
+        if isinstance(value, datetime.datetime):
+            return {"datetime": pd.Timestamp(value).isoformat()}
+        if isinstance(value, datetime.date):
+            return {"date": value.isoformat()}
+        if isinstance(value, datetime.time):
+            return {"time": value.isoformat()}
+        if isinstance(value, datetime.timedelta):
+            return {"timedelta": pd.Timedelta(value).value}
+        return str(value)
+
+    @staticmethod
+    def __from_json_unique(value):
+        if not isinstance(value, dict):
+            return value
+        if "datetime" in value:
+            return pd.Timestamp(value["datetime"])
+        if "date" in value:
+            return datetime.date.fromisoformat(value["date"])
+        if "time" in value:
+            return datetime.time.fromisoformat(value["time"])
+        return pd.Timedelta(value["timedelta"])
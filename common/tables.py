@@ -1,39 +1,72 @@
 """File useful to interact with different tabs/sheets of Excel spreadsheets."""
 
+import numpy as np
 import pandas as pd
 
+from common.column_index import ColumnValueIndex
 from common.excel_reader import ExcelReader
+from common.instrumentation import stage_tracer
+from common.occurrences_index import OccurrencesIndex
+from common.precursors import PrecursorAnalysis, PrecursorMiner
+from common.schema import SheetSchema
+from common.workbook import Workbook
 
 
 class TableInterface:
-    def __init__(self, sheet_name: str) -> None:
+    def __init__(self, sheet_name: str, schema: SheetSchema = None) -> None:
         self._excel_reader = ExcelReader(sheet_name)
+        self._schema = schema
 
     def set_file(self, xlsx_file: str) -> None:
-        self._excel_reader.set_file(xlsx_file)
+        self.set_workbook(Workbook(xlsx_file))
 
-    def get_dataframe(self) -> pd.DataFrame:
-        return self._excel_reader.get_dataframe()
+    def set_workbook(self, workbook: Workbook) -> None:
+        if self._schema is not None:
+            workbook.set_sheet_schema(self.get_sheet_name(), self._schema)
+        self._excel_reader.set_workbook(workbook)
+
+    def get_schema(self) -> SheetSchema:
+        return self._schema
+
+    def get_dataframe(self, columns: list = None) -> pd.DataFrame:
+        return self._excel_reader.get_dataframe(columns)
+
+    def get_dataframe_view(self, columns: list = None, rows_mask: pd.Series = None) -> pd.DataFrame:
+        return self._excel_reader.get_dataframe_view(columns, rows_mask)
+
+    def get_column_view(self, column) -> pd.Series:
+        return self._excel_reader.get_column_view(column)
+
+    def get_columns(self) -> list:
+        return self._excel_reader.get_columns()
 
     def get_sheet_name(self) -> str:
         return self._excel_reader.get_sheet_name()
 
+    def get_derived_view(self, key, builder):
+        return self._excel_reader.get_derived_view(key, builder)
+
+    def get_state_view(self, key, builder):
+        return self._excel_reader.get_state_view(key, builder)
+
 
 class LogLegendTable(TableInterface):
 
     COLUMN_INDEXES = "Índice"
     COLUMN_FILES = "Arquivo"
+    COLUMN_GENERATORS = "Gerador"
 
     def __init__(self) -> None:
-        super().__init__("Legenda")
+        super().__init__("Legenda", SheetSchema({LogLegendTable.COLUMN_GENERATORS: SheetSchema.CATEGORY}))
         self._logs_dict = {}
         self._logs_indexes = []
         self._logs_names = []
+        self._logs_indexes_by_names = {}
+        self._logs_names_by_generators = {}
 
     def __get_logs_dict(self) -> dict:
-        logs_dataframe = self._excel_reader.get_dataframe()
-        logs_dataframe_indexes = logs_dataframe[LogLegendTable.COLUMN_INDEXES].to_list()
-        logs_dataframe_files = logs_dataframe[LogLegendTable.COLUMN_FILES].to_list()
+        logs_dataframe_indexes = self.get_column_view(LogLegendTable.COLUMN_INDEXES).to_list()
+        logs_dataframe_files = self.get_column_view(LogLegendTable.COLUMN_FILES).to_list()
         return dict(zip(logs_dataframe_indexes, logs_dataframe_files))
 
     def __get_logs_indexes(self) -> list:
@@ -42,19 +75,46 @@ class LogLegendTable(TableInterface):
     def __get_logs_names(self) -> list:
         return list(self._logs_dict.values())
 
-    def set_file(self, xlsx_file: str) -> None:
-        self._excel_reader.set_file(xlsx_file)
+    def __get_logs_indexes_by_names(self) -> dict:
+        """Reverse of the logs dict. When a name is repeated, its first index is kept."""
+        logs_indexes_by_names = {}
+        for log_index, log_name in zip(self._logs_indexes, self._logs_names):
+            logs_indexes_by_names.setdefault(log_name, log_index)
+        return logs_indexes_by_names
+
+    def __get_logs_names_by_generators(self) -> dict:
+        """Logs names of each generator, only available for legends of fleets of generators."""
+        logs_names_by_generators = {}
+        if LogLegendTable.COLUMN_GENERATORS in self.get_columns():
+            logs_generators = self.get_column_view(LogLegendTable.COLUMN_GENERATORS).to_list()
+            logs_names = self.get_column_view(LogLegendTable.COLUMN_FILES).to_list()
+            for log_generator, log_name in zip(logs_generators, logs_names):
+                logs_names_by_generators.setdefault(log_generator, []).append(log_name)
+        return logs_names_by_generators
+
+    def set_workbook(self, workbook: Workbook) -> None:
+        super().set_workbook(workbook)
         self._logs_dict = self.__get_logs_dict()
         self._logs_indexes = self.__get_logs_indexes()
         self._logs_names = self.__get_logs_names()
+        self._logs_indexes_by_names = self.__get_logs_indexes_by_names()
+        self._logs_names_by_generators = self.__get_logs_names_by_generators()
+
+    def __get_legend_columns(self) -> list:
+        columns = [LogLegendTable.COLUMN_INDEXES, LogLegendTable.COLUMN_FILES]
+        if self.has_generators():
+            columns.append(LogLegendTable.COLUMN_GENERATORS)
+        return columns
 
-    def get_dataframe(self) -> pd.DataFrame:
-        dataframe = self._excel_reader.get_dataframe()
-        return dataframe[[LogLegendTable.COLUMN_INDEXES, LogLegendTable.COLUMN_FILES]]
+    def get_dataframe(self, columns: list = None) -> pd.DataFrame:
+        if columns is None:
+            columns = self.__get_legend_columns()
+        return self._excel_reader.get_dataframe(columns)
 
     def get_dataframe_filtered_by_logs_indexes(self, logs_indexes: list) -> pd.DataFrame:
-        dataframe = self.get_dataframe()
-        return dataframe[dataframe[LogLegendTable.COLUMN_INDEXES].isin(logs_indexes)]
+        columns = self.__get_legend_columns()
+        rows_mask = self.get_column_view(LogLegendTable.COLUMN_INDEXES).isin(logs_indexes)
+        return self.get_dataframe_view(columns, rows_mask)
 
     def get_logs_dict(self) -> dict:
         return self._logs_dict.copy()
@@ -72,16 +132,57 @@ class LogLegendTable(TableInterface):
         return [self.get_log_name_by_index(log_index) for log_index in index_list]
 
     def get_log_index_by_name(self, name: str) -> int:
-        index = self._logs_names.index(name)
-        return self._logs_indexes[index]
+        try:
+            return self._logs_indexes_by_names[name]
+        except KeyError:
+            raise ValueError("{} is not a log name".format(name))
 
     def get_log_indexes_by_names(self, name_list: list) -> list:
-        return [self.get_log_index_by_name(log_name) for log_name in name_list]
+        logs_indexes_by_names = self._logs_indexes_by_names
+        missing_names = [log_name for log_name in name_list if log_name not in logs_indexes_by_names]
+        if missing_names:
+            raise ValueError("{} are not log names".format(missing_names))
+        return [logs_indexes_by_names[log_name] for log_name in name_list]
+
+    def get_logs_indexes_by_names_dict(self) -> dict:
+        return self._logs_indexes_by_names.copy()
+
+    def has_generators(self) -> bool:
+        return bool(self._logs_names_by_generators)
+
+    def get_generators_names(self) -> list:
+        return list(self._logs_names_by_generators.keys())
+
+    def get_logs_names_by_generators(self, generators_names: list) -> list:
+        logs_names = []
+        for generator_name in generators_names:
+            logs_names.extend(self._logs_names_by_generators.get(generator_name, []))
+        return logs_names
+
+
+class LogHistoryTable(TableInterface):
+    """History sheet of one log, named by the log index in the legend."""
+
+    SCHEMA = SheetSchema({
+        "Falha": SheetSchema.CATEGORY,
+        "Warning": SheetSchema.CATEGORY,
+        "kW": SheetSchema.NUMBER,
+        "kJ": SheetSchema.NUMBER,
+    })
+
+    def __init__(self, log_index: int) -> None:
+        super().__init__(log_index, LogHistoryTable.SCHEMA)
 
 
 class StatisticsTableInterface(TableInterface):
-    def __init__(self, sheet_name: str, key_column: str, sub_key_columns: list = []) -> None:
-        super().__init__(sheet_name)
+    def __init__(
+        self, sheet_name: str, key_column: str, sub_key_columns: list = [],
+        key_column_type: str = SheetSchema.NUMBER, sub_key_columns_types: dict = {},
+    ) -> None:
+        """The logs columns and the TOTAL column are counts, the TOTAL line is kept apart from the data."""
+        columns_types = {key_column: key_column_type}
+        columns_types.update(sub_key_columns_types)
+        super().__init__(sheet_name, SheetSchema(columns_types, SheetSchema.COUNT, key_column))
         self._key_column = key_column
         self._sub_key_columns = sub_key_columns
         self._total_column = "TOTAL"
@@ -91,6 +192,25 @@ class StatisticsTableInterface(TableInterface):
         self._main_columns.extend(self._sub_key_columns)
         self._main_columns.extend([self._total_column])
 
+        self._column_indexes = {}
+
+    def set_workbook(self, workbook: Workbook) -> None:
+        super().set_workbook(workbook)
+        self._column_indexes = {}
+        for column in [self._key_column] + self._sub_key_columns:
+            self.get_column_index(column)
+
+    def get_column_index(self, column: str) -> ColumnValueIndex:
+        """Return the index of distinct values of 'column', building it on the first call."""
+        column_index = self._column_indexes.get(column)
+        if column_index is None:
+            column_index = ColumnValueIndex(self.get_column_view(column))
+            self._column_indexes[column] = column_index
+        return column_index
+
+    def get_rows_mask_from_column(self, column: str, rows_list: list) -> np.ndarray:
+        return self.get_column_index(column).get_rows_mask(rows_list)
+
     def get_key_column(self) -> str:
         return self._key_column
 
@@ -101,11 +221,11 @@ class StatisticsTableInterface(TableInterface):
         return self._total_column
 
     def get_logs_columns(self) -> list:
-        columns = list(self.get_dataframe())
+        columns = self.get_columns()
         return [col for col in columns if col not in self._main_columns]
 
     def get_all_columns(self) -> list:
-        return list(self.get_dataframe())
+        return self.get_columns()
 
     def get_all_columns_including_logs(self, logs_columns: list) -> list:
         columns = [self.get_key_column()]
@@ -115,37 +235,83 @@ class StatisticsTableInterface(TableInterface):
         return columns
 
     def get_dataframe_filtered_by_columns(self, columns_list: list) -> pd.DataFrame:
-        dataframe = self.get_dataframe()
         if columns_list:
-            return dataframe[columns_list]
+            return self.get_dataframe(columns_list)
         else:
-            return dataframe
+            return self.get_dataframe()
 
     def get_dataframe_filtered_by_rows_and_column(self, rows_list: list, column: str) -> pd.DataFrame:
-        dataframe = self.get_dataframe()
         if rows_list:
-            return dataframe[dataframe[column].isin(rows_list)]
+            rows_mask = self.get_rows_mask_from_column(column, rows_list)
+            return self.get_dataframe_view(rows_mask=rows_mask)
         else:
-            return dataframe
+            return self.get_dataframe()
 
     def get_dataframe_filtered_by_rows_and_columns(self, col_to_select_rows: str, rows_list: list, columns_list: list) -> pd.DataFrame:
-        dataframe = self.get_dataframe_filtered_by_columns(columns_list)
-        if rows_list:
-            return dataframe[dataframe[col_to_select_rows].isin(rows_list)]
-        else:
-            return dataframe
+        if not rows_list:
+            return self.get_dataframe_filtered_by_columns(columns_list)
+        rows_mask = self.get_rows_mask_from_column(col_to_select_rows, rows_list)
+        return self.get_dataframe_view(columns_list or None, rows_mask)
+
+    def get_totalized_dataframe(self, rows_selected_from_column_dict: dict, logs_columns: list) -> pd.DataFrame:
+        """Return the rows holding the selected values of every column in 'rows_selected_from_column_dict',
+        restricted to the main columns and 'logs_columns', with the TOTAL column and the TOTAL line
+        computed over the selection.
+
+        All the filters are combined in a single mask, so the sheet is copied only once.
+        """
+        rows_mask = ~self.get_rows_mask_from_column(self._key_column, [self._total_column])
+        for column, rows_selected in rows_selected_from_column_dict.items():
+            rows_mask &= self.get_rows_mask_from_column(column, rows_selected)
+        rows_positions = np.flatnonzero(rows_mask)
+
+        data = {}
+        key_column_values = self.get_column_view(self._key_column).to_numpy(dtype=object)[rows_positions]
+        data[self._key_column] = np.append(key_column_values, pd.NA)
+        for column in self._sub_key_columns:
+            column_values = self.__get_column_values(column, rows_positions)
+            if np.issubdtype(column_values.dtype, np.number):
+                data[column] = np.append(column_values.astype(float), np.nan)
+            else:
+                data[column] = np.append(column_values.astype(object), pd.NA)
+
+        total_column_values = np.zeros(len(rows_positions))
+        for column in logs_columns:
+            column_values = self.__get_column_values(column, rows_positions)
+            if np.issubdtype(column_values.dtype, np.number):
+                total_column_values = total_column_values + np.nan_to_num(column_values)
+                if not np.isnan(column_values).any() and np.all(column_values == np.round(column_values)):
+                    column_values = column_values.astype(np.int64)
+                data[column] = np.append(column_values, np.nansum(column_values))
+            else:
+                data[column] = np.append(column_values, pd.NA)
+        if np.all(total_column_values == np.round(total_column_values)):
+            total_column_values = total_column_values.astype(np.int64)
+        data[self._total_column] = np.append(total_column_values, total_column_values.sum())
+
+        return pd.DataFrame(data, columns=list(data.keys()))
+
+    def __get_column_values(self, column: str, rows_positions: np.ndarray) -> np.ndarray:
+        """Return the values of 'column' at 'rows_positions', numeric columns as float64 with NaN where empty."""
+        column_values = self.get_column_view(column)
+        if pd.api.types.is_numeric_dtype(column_values.dtype) and not pd.api.types.is_bool_dtype(column_values.dtype):
+            return column_values.to_numpy(dtype=np.float64, na_value=np.nan)[rows_positions]
+        return column_values.to_numpy()[rows_positions]
 
     def get_rows_list_from_column(self, column: str, non_duplicated=False, non_nan=False) -> list:
-        dataframe = self.get_dataframe()
+        if non_duplicated and non_nan:
+            return self.get_column_index(column).get_values()
+        column_values = self.get_column_view(column)
         if non_nan:
-            dataframe.dropna(inplace=True)
-        rows_list = dataframe[column].to_list()
+            column_values = column_values.dropna()
         if non_duplicated:
-            rows_list = list(dict.fromkeys(rows_list))
+            rows_list = list(pd.unique(column_values))
             try:
                 rows_list.sort()
             except TypeError:
                 pass
+        else:
+            rows_list = column_values.to_list()
         return rows_list
 
 
@@ -166,21 +332,41 @@ class ms_Table(StatisticsTableInterface):
 
 class FailureTable(StatisticsTableInterface):
     def __init__(self) -> None:
-        super().__init__("Falha", "Falha", ["Tradução da Falha"])
+        super().__init__(
+            "Falha", "Falha", ["Tradução da Falha"], SheetSchema.CATEGORY, {"Tradução da Falha": SheetSchema.CATEGORY}
+        )
 
 
 class WarningTable(StatisticsTableInterface):
     def __init__(self) -> None:
-        super().__init__("Warning", "Warning", ["Tradução da Warning"])
+        super().__init__(
+            "Warning", "Warning", ["Tradução da Warning"], SheetSchema.CATEGORY, {"Tradução da Warning": SheetSchema.CATEGORY}
+        )
 
 
 class ExpositionTable(StatisticsTableInterface):
     def __init__(self) -> None:
-        super().__init__("Exposição", "Exposição", ["mA", "kV", "ms", "mAs", "kW", "kJ", "Ganho mA", "Indutor"])
+        super().__init__(
+            "Exposição",
+            "Exposição",
+            ["mA", "kV", "ms", "mAs", "kW", "kJ", "Ganho mA", "Indutor"],
+            SheetSchema.CATEGORY,
+            {
+                "mA": SheetSchema.NUMBER,
+                "kV": SheetSchema.NUMBER,
+                "ms": SheetSchema.NUMBER,
+                "mAs": SheetSchema.NUMBER,
+                "kW": SheetSchema.NUMBER,
+                "kJ": SheetSchema.NUMBER,
+                "Ganho mA": SheetSchema.NUMBER,
+                "Indutor": SheetSchema.CATEGORY,
+            },
+        )
 
 
 class StatisticsTables:
     def __init__(self) -> None:
+        self.workbook = None
         self.log_table = LogLegendTable()
         self.mA_table = mA_Table()
         self.kV_table = kV_Table()
@@ -189,11 +375,63 @@ class StatisticsTables:
         self.warning_table = WarningTable()
         self.exposition_table = ExpositionTable()
 
+    def get_tables(self) -> list:
+        return [
+            self.log_table,
+            self.mA_table,
+            self.kV_table,
+            self.ms_table,
+            self.failure_table,
+            self.warning_table,
+            self.exposition_table,
+        ]
+
     def set_file(self, xlsx_file: str) -> None:
-        self.log_table.set_file(xlsx_file)
-        self.mA_table.set_file(xlsx_file)
-        self.kV_table.set_file(xlsx_file)
-        self.ms_table.set_file(xlsx_file)
-        self.failure_table.set_file(xlsx_file)
-        self.warning_table.set_file(xlsx_file)
-        self.exposition_table.set_file(xlsx_file)
+        self.set_workbook(Workbook(xlsx_file))
+
+    @stage_tracer.traced()
+    def set_workbook(self, workbook: Workbook) -> None:
+        self.workbook = workbook
+        tables = self.get_tables()
+        # Schemas first, so the sheets get their types while they are loaded
+        for table in tables:
+            self.workbook.set_sheet_schema(table.get_sheet_name(), table.get_schema())
+        self.workbook.load_sheets([table.get_sheet_name() for table in tables])
+        for table in tables:
+            table.set_workbook(self.workbook)
+
+    def get_occurrences_index(self) -> OccurrencesIndex:
+        """Return the index of the Falha and Warning occurrences of every log, built once per workbook.
+
+        Only the Falha and Warning columns of the histories are read.
+        """
+        return self.workbook.get_derived_view("occurrences_index", self.__build_occurrences_index)
+
+    def get_translations(self) -> dict:
+        """Return the {code: translation} dict of the Falha and Warning columns, read from their statistics sheets once per workbook."""
+        return self.workbook.get_derived_view("translations", self.__build_translations)
+
+    def get_precursor_analysis(self, target_column: str, window: int) -> PrecursorAnalysis:
+        """Return the precursors of the codes of 'target_column' in the 'window' lines before them,
+        mined over every log history (kept while recently used).
+        """
+        return self.workbook.get_state_view(
+            ("precursor_analysis", target_column, window),
+            lambda: PrecursorMiner(self.workbook, self.log_table.get_logs_indexes()).mine(target_column, window),
+        )
+
+    def __build_occurrences_index(self) -> OccurrencesIndex:
+        with stage_tracer.stage("StatisticsTables.build_occurrences_index"):
+            logs_dataframes = self.workbook.read_sheets_columns(self.log_table.get_logs_indexes(), OccurrencesIndex.COLUMNS)
+            stage_tracer.set_rows(sum(len(dataframe) for dataframe in logs_dataframes.values()))
+            return OccurrencesIndex(logs_dataframes, self.get_translations())
+
+    def __build_translations(self) -> dict:
+        translations = {}
+        for table in [self.failure_table, self.warning_table]:
+            translation_column = table.get_sub_key_columns()[0]
+            if translation_column in table.get_columns():
+                translations[table.get_key_column()] = dict(zip(
+                    table.get_column_view(table.get_key_column()), table.get_column_view(translation_column)
+                ))
+        return translations
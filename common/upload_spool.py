@@ -0,0 +1,154 @@
+"""File useful to keep the uploaded files on disk instead of in memory."""
+
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+import threading
+import time
+
+from common.sidecar import SidecarStore
+
+
+class MappedFile(io.RawIOBase):
+    """Read-only file object over a memory map of the file at 'path'.
+
+    The pages of the file are loaded by the operating system when read, and are
+    shared by every map of the same file, so many readers do not multiply the memory used.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self._path = path
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                self._map = None
+            else:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get_path(self) -> str:
+        return self._path
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        if self._map is None:
+            return b""
+        return self._map.read(None if size is None or size < 0 else size)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def readline(self, size: int = -1) -> bytes:
+        if self._map is None:
+            return b""
+        line = self._map.readline()
+        if size is not None and 0 <= size < len(line):
+            self._map.seek(size - len(line), os.SEEK_CUR)
+            line = line[:size]
+        return line
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if self._map is not None:
+            self._map.seek(offset, whence)
+        return self.tell()
+
+    def tell(self) -> int:
+        return 0 if self._map is None else self._map.tell()
+
+    def close(self) -> None:
+        if self._map is not None and not self.closed:
+            self._map.close()
+        super().close()
+
+
+class UploadSpool:
+    """Directory where the uploaded files are written once, named by the hash of their content.
+
+    The uploads are copied chunk by chunk while they are hashed, so their bytes are never
+    copied in memory. A file already in the spool (the same upload by another session, or
+    again by the same one) is not written again. Files not used for 'MAX_AGE_SECONDS' are
+    removed when the spool is created.
+    """
+
+    ROOT_DIRECTORY = os.path.join(SidecarStore.ROOT_DIRECTORY, "uploads")
+    CHUNK_SIZE = 1024 ** 2
+    MAX_AGE_SECONDS = 7 * 24 * 3600
+
+    def __init__(self, root_directory: str = None) -> None:
+        if root_directory is None:
+            root_directory = UploadSpool.ROOT_DIRECTORY
+        self._root_directory = root_directory
+        self._lock = threading.Lock()
+        os.makedirs(self._root_directory, exist_ok=True)
+        self.remove_old_files()
+
+    @staticmethod
+    def open(path: str) -> MappedFile:
+        return MappedFile(path)
+
+    @staticmethod
+    def get_content_hash(path: str) -> str:
+        """Return the hash of the content of the spooled file at 'path'."""
+        return os.path.basename(path)
+
+    def spool(self, file_object) -> str:
+        """Copy 'file_object' (e.g. an uploaded file) to the spool and return the path of the copy.
+
+        A seekable file is hashed first, and written only if its content is not in the spool yet.
+        """
+        if hasattr(file_object, "seekable") and file_object.seekable():
+            file_object.seek(0)
+            content_hash = hashlib.sha256()
+            for chunk in iter(lambda: file_object.read(UploadSpool.CHUNK_SIZE), b""):
+                content_hash.update(chunk)
+            path = os.path.join(self._root_directory, content_hash.hexdigest())
+            with self._lock:
+                if os.path.exists(path):
+                    # Same content already spooled: it is only marked as recently used
+                    os.utime(path)
+                    return path
+            file_object.seek(0)
+
+        content_hash = hashlib.sha256()
+        spool_file = tempfile.NamedTemporaryFile(dir=self._root_directory, prefix=".spooling_", delete=False)
+        try:
+            with spool_file:
+                for chunk in iter(lambda: file_object.read(UploadSpool.CHUNK_SIZE), b""):
+                    content_hash.update(chunk)
+                    spool_file.write(chunk)
+            return self.__keep(spool_file.name, content_hash.hexdigest())
+        finally:
+            if os.path.exists(spool_file.name):
+                os.remove(spool_file.name)
+
+    def remove_old_files(self) -> None:
+        oldest_time = time.time() - UploadSpool.MAX_AGE_SECONDS
+        for file_name in os.listdir(self._root_directory):
+            path = os.path.join(self._root_directory, file_name)
+            try:
+                if os.path.getmtime(path) < oldest_time:
+                    os.remove(path)
+            except OSError:
+                # Removed meanwhile, or still mapped by a reader (Windows)
+                pass
+
+    def __keep(self, spooled_path: str, content_hash: str) -> str:
+        path = os.path.join(self._root_directory, content_hash)
+        with self._lock:
+            if os.path.exists(path):
+                # Same content already spooled: it is only marked as recently used
+                os.utime(path)
+            else:
+                os.replace(spooled_path, path)
+        return path
+
+
+upload_spool = UploadSpool()
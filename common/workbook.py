@@ -0,0 +1,308 @@
+"""File useful to share a single opened Excel workbook between many tables."""
+
+import io
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from common.instrumentation import stage_tracer
+from common.log_stream import LogHistoryStream
+from common.memory_usage import get_memory_usage
+from common.schema import SheetSchema
+from common.sidecar import SidecarStore
+from common.upload_spool import UploadSpool
+
+
+class Workbook:
+    """Session over one uploaded Excel file.
+
+    The file is opened only once and every sheet is parsed at most once,
+    so all the tables built from the same upload share the same DataFrames.
+
+    When a 'sidecar_store' is given, every parsed sheet is also converted to the
+    columnar sidecar format, and the sheets already available there are read
+    column by column from it instead of parsing the Excel file again.
+
+    Sheets with a schema get compact column types when they are loaded, and
+    their TOTAL line is kept apart from the data (see 'get_total_line').
+
+    Views derived from the sheets are shared too: the ones of the whole workbook
+    (see 'get_derived_view') are kept with it, the ones of one state of the page
+    filters (see 'get_state_view') only while they fit in 'max_state_views_bytes'.
+    """
+
+    DEFAULT_MAX_STATE_VIEWS_BYTES = 256 * 1024 ** 2
+
+    def __init__(
+        self, xlsx_file: str, content_hash: str = "", sidecar_store: SidecarStore = None,
+        max_state_views_bytes: int = DEFAULT_MAX_STATE_VIEWS_BYTES,
+    ) -> None:
+        self._xlsx_file = xlsx_file
+        self._content_hash = content_hash
+        self._sidecar_store = sidecar_store
+        self._excel_file = None
+        self._sheets = {}
+        self._complete_sheets = set()
+        self._memory_usage = 0
+        self._derived_views = {}
+        self._derived_views_memory_usage = 0
+        self._state_views = OrderedDict()
+        self._state_views_memory_usages = {}
+        self._max_state_views_bytes = max_state_views_bytes
+        self._derived_views_building_locks = {}
+        self._schemas = {}
+        self._data_rows_masks = {}
+        self._total_lines = {}
+        self._lock = threading.RLock()
+
+    def get_file(self) -> str:
+        return self._xlsx_file
+
+    def get_content_hash(self) -> str:
+        return self._content_hash
+
+    def get_sheet_names(self) -> list:
+        return list(self.__get_excel_file().sheet_names)
+
+    def load_sheets(self, sheet_names: list) -> None:
+        """Parse, in a single pass over the opened file, all the sheets not loaded yet.
+
+        The sheets available in the sidecar are not parsed, their columns are read on demand.
+        """
+        with self._lock:
+            missing_sheet_names = [
+                sheet_name for sheet_name in sheet_names
+                if sheet_name not in self._complete_sheets and not self.__is_sidecar_sheet(sheet_name)
+            ]
+            if missing_sheet_names:
+                with stage_tracer.stage("Workbook.load_sheets"):
+                    loaded_sheets = pd.read_excel(self.__get_excel_file(), sheet_name=missing_sheet_names)
+                    stage_tracer.set_rows(sum(len(dataframe) for dataframe in loaded_sheets.values()))
+                    for sheet_name, dataframe in loaded_sheets.items():
+                        self.__store_sheet(sheet_name, dataframe)
+
+    def add_sheet(self, sheet_name, dataframe: pd.DataFrame) -> None:
+        """Register a sheet already parsed elsewhere, as if it was read from the file."""
+        with self._lock:
+            if sheet_name not in self._complete_sheets:
+                self.__store_sheet(sheet_name, dataframe)
+
+    def set_sheet_schema(self, sheet_name, schema: SheetSchema) -> None:
+        """Give 'schema' to 'sheet_name'. A sheet keeps the first schema it was given."""
+        with self._lock:
+            if sheet_name in self._schemas:
+                return
+            self._schemas[sheet_name] = schema
+            dataframe = self._sheets.get(sheet_name)
+            if dataframe is None:
+                return
+            self._memory_usage -= int(dataframe.memory_usage(deep=True).sum())
+            if sheet_name in self._complete_sheets:
+                self._sheets[sheet_name] = self.__apply_schema(sheet_name, dataframe)
+                self._memory_usage += int(self._sheets[sheet_name].memory_usage(deep=True).sum())
+            else:
+                # Columns read from the sidecar before the schema are read again
+                del self._sheets[sheet_name]
+
+    def get_total_line(self, sheet_name) -> dict:
+        """Return the TOTAL line of 'sheet_name' (empty without a schema telling where it is)."""
+        with self._lock:
+            self.__get_sheet_with_columns(sheet_name, None)
+            return self._total_lines.get(sheet_name, {}).copy()
+
+    def get_sheet_location(self, sheet_name) -> tuple:
+        """Return the file, and the sheet name inside it, where 'sheet_name' is stored."""
+        return self._xlsx_file, sheet_name
+
+    def get_columns(self, sheet_name) -> list:
+        with self._lock:
+            if sheet_name not in self._complete_sheets and self.__is_sidecar_sheet(sheet_name):
+                return self._sidecar_store.get_columns(sheet_name)
+            return list(self.get_sheet(sheet_name).columns)
+
+    def get_sheet(self, sheet_name, columns: list = None, rows_mask: pd.Series = None) -> pd.DataFrame:
+        """Return 'sheet_name' restricted to 'columns' and 'rows_mask' (everything if omitted).
+
+        Without restrictions the shared DataFrame itself is returned, otherwise
+        the selection is done with a single copy.
+        """
+        with self._lock:
+            dataframe = self.__get_sheet_with_columns(sheet_name, columns)
+        if columns is None and rows_mask is None:
+            return dataframe
+        if rows_mask is None:
+            return dataframe.loc[:, columns]
+        if columns is None:
+            return dataframe.loc[rows_mask]
+        return dataframe.loc[rows_mask, columns]
+
+    def read_sheets_columns(self, sheet_names: list, columns: list) -> dict:
+        """Return the 'columns' (the ones the sheet has) of every sheet of 'sheet_names'.
+
+        The sheets already loaded, or in the sidecar, are read as usual. The other ones
+        are streamed row by row (see 'LogHistoryStream.read_sheets_columns') from an independent
+        handle of the file, without holding the workbook lock, so the other readers of the workbook
+        are not kept waiting (e.g. by a background build). Only the values of the asked columns
+        are kept, and the sheets are not stored in the workbook.
+        """
+        sheets_columns = {}
+        missing_sheet_names = []
+        for sheet_name in sheet_names:
+            with self._lock:
+                is_sheet_available = sheet_name in self._complete_sheets or self.__is_sidecar_sheet(sheet_name)
+            if is_sheet_available:
+                sheet_columns = [column for column in self.get_columns(sheet_name) if column in columns]
+                sheets_columns[sheet_name] = self.get_sheet(sheet_name, sheet_columns)
+            else:
+                missing_sheet_names.append(sheet_name)
+        if missing_sheet_names:
+            with stage_tracer.stage("Workbook.read_sheets_columns"):
+                sheets_columns.update(self.__read_sheets_columns_from_file(missing_sheet_names, columns))
+                stage_tracer.set_rows(sum(len(sheets_columns[sheet_name]) for sheet_name in missing_sheet_names))
+        return {sheet_name: sheets_columns[sheet_name] for sheet_name in sheet_names}
+
+    def __read_sheets_columns_from_file(self, sheet_names: list, columns: list) -> dict:
+        xlsx_file = self.__open_independent_file()
+        if xlsx_file is None:
+            # No independent handle of this kind of file, so the shared one is read under the lock
+            with self._lock:
+                return LogHistoryStream.read_sheets_columns(self._xlsx_file, sheet_names, columns)
+        with xlsx_file:
+            return LogHistoryStream.read_sheets_columns(xlsx_file, sheet_names, columns)
+
+    def __open_independent_file(self):
+        """Return a new handle of the file, with its own position (None if it cannot be opened again)."""
+        if isinstance(self._xlsx_file, str):
+            return UploadSpool.open(self._xlsx_file)
+        if hasattr(self._xlsx_file, "getvalue"):
+            return io.BytesIO(self._xlsx_file.getvalue())
+        return None
+
+    def get_column(self, sheet_name, column) -> pd.Series:
+        """Return 'column' of 'sheet_name' without copying it."""
+        with self._lock:
+            return self.__get_sheet_with_columns(sheet_name, [column])[column]
+
+    def is_sheet_loaded(self, sheet_name) -> bool:
+        return sheet_name in self._complete_sheets
+
+    def get_derived_view(self, key, builder):
+        """Return the value computed by 'builder()' for 'key', computing it only once per workbook.
+
+        Useful to share, between reruns and sessions, results derived from the sheets.
+        """
+        return self.__get_view(key, builder, is_state_view=False)
+
+    def get_state_view(self, key, builder):
+        """Same as 'get_derived_view', for a value of one state of the filters of a page (e.g. the table
+        totalized for the selected values).
+
+        As every interaction may create new states, only the most recently used values
+        are kept, as long as they hold less than 'max_state_views_bytes' (the last one is always kept).
+        """
+        return self.__get_view(key, builder, is_state_view=True)
+
+    def __get_view(self, key, builder, is_state_view: bool):
+        views = self._state_views if is_state_view else self._derived_views
+        with self._lock:
+            if key in views:
+                if is_state_view:
+                    self._state_views.move_to_end(key)
+                return views[key]
+            building_lock = self._derived_views_building_locks.setdefault((is_state_view, key), threading.Lock())
+
+        # A view being computed by another thread (e.g. in background) is waited for, not computed again
+        with building_lock:
+            with self._lock:
+                if key in views:
+                    return views[key]
+            view = builder()
+            view_memory_usage = get_memory_usage(view)
+            with self._lock:
+                self._derived_views_building_locks.pop((is_state_view, key), None)
+                if is_state_view:
+                    self._state_views[key] = view
+                    self._state_views_memory_usages[key] = view_memory_usage
+                    self.__evict_state_views()
+                else:
+                    self._derived_views[key] = view
+                    self._derived_views_memory_usage += view_memory_usage
+                return view
+
+    def __evict_state_views(self) -> None:
+        while len(self._state_views) > 1 and sum(self._state_views_memory_usages.values()) > self._max_state_views_bytes:
+            evicted_key, _ = self._state_views.popitem(last=False)
+            del self._state_views_memory_usages[evicted_key]
+
+    def get_memory_usage(self) -> int:
+        """Return the number of bytes held by the parsed sheets and the views derived from them."""
+        return self._memory_usage + self._derived_views_memory_usage + sum(self._state_views_memory_usages.values())
+
+    def __get_excel_file(self) -> pd.ExcelFile:
+        if self._excel_file is None:
+            if isinstance(self._xlsx_file, str):
+                self._excel_file = pd.ExcelFile(UploadSpool.open(self._xlsx_file))
+            else:
+                self._excel_file = pd.ExcelFile(self._xlsx_file)
+        return self._excel_file
+
+    def __get_sheet_with_columns(self, sheet_name, columns: list) -> pd.DataFrame:
+        if sheet_name not in self._complete_sheets and self.__is_sidecar_sheet(sheet_name):
+            self.__load_sidecar_columns(sheet_name, columns)
+        else:
+            self.load_sheets([sheet_name])
+        return self._sheets[sheet_name]
+
+    def __is_sidecar_sheet(self, sheet_name) -> bool:
+        return self._sidecar_store is not None and self._sidecar_store.has_sheet(sheet_name)
+
+    def __store_sheet(self, sheet_name, dataframe: pd.DataFrame) -> None:
+        if self._sidecar_store is not None:
+            try:
+                self._sidecar_store.write_sheet(sheet_name, dataframe)
+            except OSError:
+                # The sidecar is only an accelerator, so the app keeps working without it
+                self._sidecar_store = None
+        dataframe = self.__apply_schema(sheet_name, dataframe)
+        self._sheets[sheet_name] = dataframe
+        self._complete_sheets.add(sheet_name)
+        self._memory_usage += int(dataframe.memory_usage(deep=True).sum())
+
+    def __apply_schema(self, sheet_name, dataframe: pd.DataFrame) -> pd.DataFrame:
+        """Convert the columns of 'dataframe', a part of the sheet as stored, to the sheet schema types."""
+        schema = self._schemas.get(sheet_name)
+        if schema is None:
+            return dataframe
+        data_rows_mask = self._data_rows_masks.get(sheet_name)
+        if data_rows_mask is None:
+            data_rows_mask = schema.get_data_rows_mask(dataframe)
+            self._data_rows_masks[sheet_name] = data_rows_mask
+        self._total_lines.setdefault(sheet_name, {}).update(schema.get_total_line(dataframe, data_rows_mask))
+        return schema.apply(dataframe, data_rows_mask)
+
+    def __load_sidecar_columns(self, sheet_name, columns: list) -> None:
+        all_columns = self._sidecar_store.get_columns(sheet_name)
+        dataframe = self._sheets.get(sheet_name)
+        requested_columns = list(all_columns if columns is None else columns)
+        schema = self._schemas.get(sheet_name)
+        if schema is not None and sheet_name not in self._data_rows_masks:
+            # The TOTAL lines are found with the first columns read
+            total_key_column = schema.get_total_key_column()
+            if total_key_column in all_columns and total_key_column not in requested_columns:
+                requested_columns.append(total_key_column)
+        if dataframe is None:
+            dataframe = pd.DataFrame(index=pd.RangeIndex(self._sidecar_store.get_number_of_rows(sheet_name)))
+        missing_columns = [column for column in requested_columns if column not in dataframe.columns]
+        if missing_columns:
+            with stage_tracer.stage("Workbook.load_sidecar_columns"):
+                missing_dataframe = self.__apply_schema(sheet_name, self._sidecar_store.read_columns(sheet_name, missing_columns))
+                stage_tracer.set_rows(len(missing_dataframe))
+            if len(dataframe.columns) == 0:
+                dataframe = pd.DataFrame(index=missing_dataframe.index)
+            self._memory_usage += int(missing_dataframe.memory_usage(deep=True).sum())
+            dataframe = pd.concat([dataframe, missing_dataframe], axis="columns")
+            dataframe = dataframe[[column for column in all_columns if column in dataframe.columns]]
+            self._sheets[sheet_name] = dataframe
+        if len(dataframe.columns) == len(all_columns):
+            self._complete_sheets.add(sheet_name)
@@ -0,0 +1,185 @@
+"""File useful to keep parsed workbooks alive between Streamlit reruns and sessions."""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+from common.fleet import FleetWorkbook
+from common.incremental_dataset import IncrementalDataset
+from common.raw_logs import RawLogsReader
+from common.sidecar import SidecarStore
+from common.tables import StatisticsTables
+from common.upload_spool import UploadSpool, upload_spool
+from common.workbook import Workbook
+
+
+class WorkbookCache:
+    """LRU cache of parsed workbooks keyed by the hash of the uploaded bytes.
+
+    The uploads are spooled to disk and the workbooks read them from there, so the
+    cache never holds a copy of the uploaded bytes.
+
+    Entries are evicted, least recently used first, whenever the memory held by
+    the parsed sheets exceeds 'max_memory_bytes'. The most recent entry is always kept.
+    """
+
+    DEFAULT_MAX_MEMORY_BYTES = 2 * 1024 ** 3
+    SPOOLED_UPLOADS_KEY = "workbook_cache_spooled_uploads"
+
+    def __init__(self, max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES) -> None:
+        self._max_memory_bytes = max_memory_bytes
+        self._entries = OrderedDict()
+        self._loading_locks = {}
+        self._datasets_entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_content_hash(file_bytes: bytes) -> str:
+        return hashlib.sha256(file_bytes).hexdigest()
+
+    def get_statistics(self, uploaded_file) -> StatisticsTables:
+        """Return the statistics tables of 'uploaded_file', parsing it only on a cache miss."""
+        path = WorkbookCache.__spool_upload(uploaded_file)
+        content_hash = UploadSpool.get_content_hash(path)
+        return self.__get_or_build(
+            content_hash,
+            lambda: Workbook(path, content_hash, SidecarStore(content_hash)),
+        )
+
+    def get_fleet_statistics(self, uploaded_files: list) -> StatisticsTables:
+        """Return the statistics tables merging all 'uploaded_files', one per generator.
+
+        The generator of each file is its name without extension, with a " (2)", " (3)", ... suffix
+        (and a warning to the user) when another file has the same name.
+        """
+        generators_files = {}
+        content_hashes = {}
+        renamed_generators = []
+        for uploaded_file in uploaded_files:
+            file_generator_name = uploaded_file.name.rsplit(".", 1)[0]
+            generator_name = RawLogsReader.get_unique_name(file_generator_name, generators_files)
+            if generator_name != file_generator_name:
+                renamed_generators.append("{} -> {}".format(uploaded_file.name, generator_name))
+            generators_files[generator_name] = WorkbookCache.__spool_upload(uploaded_file)
+            content_hashes[generator_name] = UploadSpool.get_content_hash(generators_files[generator_name])
+        if renamed_generators:
+            st.warning("Arquivos com o mesmo nome foram renomeados: {}".format(", ".join(renamed_generators)))
+        fleet_hash = WorkbookCache.get_content_hash(
+            "".join(sorted(name + content_hash for name, content_hash in content_hashes.items())).encode()
+        )
+        return self.__get_or_build(
+            fleet_hash,
+            lambda: FleetWorkbook.ingest(generators_files, content_hashes, fleet_hash),
+        )
+
+    def get_raw_logs_statistics(self, uploaded_files: list) -> StatisticsTables:
+        """Return the statistics tables built from the raw logs of 'uploaded_files' (log files or zip files)."""
+        raw_logs = WorkbookCache.__spool_uploads(
+            uploaded_files, lambda uploaded_files: RawLogsReader.get_raw_logs(uploaded_files, upload_spool)
+        )
+        raw_logs_hash = WorkbookCache.get_content_hash("".join(
+            log_name + UploadSpool.get_content_hash(path) for log_name, path in sorted(raw_logs.items())
+        ).encode())
+        return self.__get_or_build(raw_logs_hash, lambda: RawLogsReader.ingest(raw_logs, raw_logs_hash))
+
+    def get_dataset_statistics(self, uploaded_file, dataset_name: str) -> StatisticsTables:
+        """Return the statistics tables of the dataset 'dataset_name' after appending the new logs of 'uploaded_file'.
+
+        The entry of the previous state of the dataset is dropped, as its sheets were replaced.
+        """
+        path = WorkbookCache.__spool_upload(uploaded_file)
+        dataset_hash = IncrementalDataset.get_dataset_hash(dataset_name)
+        entry_hash = WorkbookCache.get_content_hash((dataset_hash + UploadSpool.get_content_hash(path)).encode())
+        statistics = self.__get_or_build(
+            entry_hash,
+            lambda: WorkbookCache.__append_to_dataset(dataset_name, path),
+        )
+        with self._lock:
+            previous_entry_hash = self._datasets_entries.get(dataset_hash)
+            if previous_entry_hash != entry_hash:
+                self._entries.pop(previous_entry_hash, None)
+            self._datasets_entries[dataset_hash] = entry_hash
+        return statistics
+
+    @staticmethod
+    def __spool_uploads(uploaded_files: list, spool):
+        """Return 'spool(uploaded_files)', the spooled path, or paths (name -> path), of 'uploaded_files'.
+
+        Every rerun of a session gets the same uploaded files again, so their spooled files
+        are kept in the session state by file id and size: an upload is read, hashed and
+        written only once, and not at every widget change.
+        """
+        uploads_key = tuple(
+            (getattr(uploaded_file, "file_id", getattr(uploaded_file, "id", None)), uploaded_file.name, getattr(uploaded_file, "size", None))
+            for uploaded_file in uploaded_files
+        )
+        if any(upload_key[0] is None for upload_key in uploads_key):
+            # Not a Streamlit upload, so there is nothing telling it is the same file
+            return spool(uploaded_files)
+        spooled_uploads = st.session_state.setdefault(WorkbookCache.SPOOLED_UPLOADS_KEY, {})
+        spooled_files = spooled_uploads.get(uploads_key)
+        if spooled_files is None or not all(
+            os.path.exists(path) for path in (spooled_files.values() if isinstance(spooled_files, dict) else [spooled_files])
+        ):
+            spooled_files = spool(uploaded_files)
+            spooled_uploads[uploads_key] = spooled_files
+        return spooled_files
+
+    @staticmethod
+    def __spool_upload(uploaded_file) -> str:
+        return WorkbookCache.__spool_uploads([uploaded_file], lambda uploaded_files: upload_spool.spool(uploaded_files[0]))
+
+    @staticmethod
+    def __append_to_dataset(dataset_name: str, path: str) -> Workbook:
+        with UploadSpool.open(path) as xlsx_file:
+            return IncrementalDataset(dataset_name).append(xlsx_file)
+
+    def __get_or_build(self, content_hash: str, build_workbook) -> StatisticsTables:
+        with self._lock:
+            statistics = self.__get_entry(content_hash)
+            if statistics is not None:
+                return statistics
+            loading_lock = self._loading_locks.setdefault(content_hash, threading.Lock())
+
+        # Only one session parses a given workbook, the others wait and then share it
+        with loading_lock:
+            with self._lock:
+                statistics = self.__get_entry(content_hash)
+            if statistics is None:
+                try:
+                    statistics = StatisticsTables()
+                    statistics.set_workbook(build_workbook())
+                    with self._lock:
+                        self._entries[content_hash] = statistics
+                        self.__evict()
+                finally:
+                    # Also when the build fails, so the next attempt gets a new lock instead of leaking this one
+                    with self._lock:
+                        if self._loading_locks.get(content_hash) is loading_lock:
+                            self._loading_locks.pop(content_hash)
+        return statistics
+
+    def get_memory_usage(self) -> int:
+        return sum(statistics.workbook.get_memory_usage() for statistics in self._entries.values())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._datasets_entries.clear()
+
+    def __get_entry(self, content_hash: str) -> StatisticsTables:
+        statistics = self._entries.get(content_hash)
+        if statistics is not None:
+            self._entries.move_to_end(content_hash)
+            self.__evict()
+        return statistics
+
+    def __evict(self) -> None:
+        while len(self._entries) > 1 and self.get_memory_usage() > self._max_memory_bytes:
+            self._entries.popitem(last=False)
+
+
+workbook_cache = WorkbookCache()